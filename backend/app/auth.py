@@ -1,12 +1,16 @@
-from passlib.context import CryptContext
+import os
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.cache import TTLCache
 from app.database import get_db
+# verify_password/get_password_hash are re-exported for the scripts that import them from here
+from app.passwords import get_password_hash, verify_and_update_async, verify_password
 from app.models.database_models import User
 from app.models.schemas import TokenData
 
@@ -15,25 +19,29 @@ SECRET_KEY = "YOUR_SECRET_KEY"  # Change this to a secure value in production
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Resolved principals keyed by token subject (email), so authenticated
+# requests don't re-read the user row every time. Keep the TTL short: other
+# workers' changes are only picked up when entries expire.
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "30"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
 
 # OAuth2 with password flow
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/users/login")
 
-# Password verification
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-# Password hashing
-def get_password_hash(password):
-    return pwd_context.hash(password)
-
 # Authenticate user
-def authenticate_user(db: Session, email: str, password: str):
-    user = db.query(User).filter(User.email == email).first()
-    if not user or not verify_password(password, user.hashed_password):
+async def authenticate_user(db: AsyncSession, email: str, password: str):
+    user = await db.scalar(select(User).filter(User.email == email))
+    if not user:
+        return False
+    # bcrypt is deliberately slow; keep it off the event loop
+    valid, new_hash = await verify_and_update_async(password, user.hashed_password)
+    if not valid:
         return False
+    if new_hash:
+        # Stored hash used a different cost (or scheme); upgrade it now we know the password
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
 # Create access token
@@ -48,7 +56,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 # Get current user
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -62,11 +70,26 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         token_data = TokenData(email=email)
     except JWTError:
         raise credentials_exception
-    user = db.query(User).filter(User.email == token_data.email).first()
+    user = principal_cache.get(token_data.email)
     if user is None:
-        raise credentials_exception
+        user = await db.scalar(select(User).filter(User.email == token_data.email))
+        if user is None:
+            raise credentials_exception
+        if principal_cache.enabled:
+            # Detach so the cached instance is never tied to (or flushed by) a request's session
+            db.expunge(user)
+            principal_cache.set(token_data.email, user)
     return user
 
+# Drop cached principals as soon as this process changes or deletes the user
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_principal(mapper, connection, target):
+    principal_cache.invalidate(target.email)
+    previous_emails = inspect(target).attrs.email.history.deleted
+    for email in previous_emails:
+        principal_cache.invalidate(email)
+
 # Get current active user
 async def get_current_active_user(current_user: User = Depends(get_current_user)):
     if not current_user.is_active:
@@ -1,7 +1,16 @@
 import os
+import time
+from uuid import uuid4
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+
+from app import metrics
 
 # Get database URL from environment
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./unipool.db")
@@ -10,20 +19,143 @@ DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./unipool.db")
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-# Create engine with appropriate connection args
-connect_args = {}
-if DATABASE_URL.startswith("sqlite"):
-    connect_args = {"check_same_thread": False}
+# Pool profile for server databases: "queue" keeps connections open in each
+# worker; "pgbouncer" opens one per checkout and leaves pooling to PgBouncer in
+# transaction mode. SQLite files keep SQLAlchemy's defaults.
+DB_POOL_MODE = os.getenv("DB_POOL_MODE", "queue")
+# Connections the API may hold open on the server, shared by its worker processes
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "40"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+_per_worker = max(1, DB_MAX_CONNECTIONS // max(1, WEB_CONCURRENCY))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", str(min(10, _per_worker))))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", str(max(0, min(10, _per_worker - DB_POOL_SIZE)))))
+# Fail a checkout after this long rather than let requests pile up behind a full pool
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Replace connections older than this, before the server or a proxy drops them
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Test each connection on checkout, so one left dead by a failover is replaced, not handed out
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "10"))
+
+
+class _TimedCheckout:
+    """Records how long checkouts wait on the pool, and when they find it full."""
+
+    def _do_get(self):
+        saturated = self._max_overflow > -1 and self.checkedout() >= self.size() + self._max_overflow
+        if saturated:
+            metrics.pool_saturated.inc()
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeout:
+            metrics.pool_timeouts.inc()
+            raise
+        finally:
+            metrics.pool_checkout_wait.observe((), time.perf_counter() - started)
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(url, is_async=False):
+    """Keyword arguments for create_engine/create_async_engine under the configured pool profile."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend == "sqlite":
+        return {"connect_args": {"check_same_thread": False}}
+
+    connect_args = {}
+    if backend == "postgresql":
+        # asyncpg and libpq name the connect timeout differently
+        connect_args["timeout" if is_async else "connect_timeout"] = DB_CONNECT_TIMEOUT
+    if DB_POOL_MODE == "pgbouncer":
+        if is_async and backend == "postgresql":
+            # Prepared statements don't survive moving between server connections
+            connect_args["statement_cache_size"] = 0
+            connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid4()}__"
+        return {"poolclass": NullPool, "connect_args": connect_args}
+    if DB_POOL_MODE != "queue":
+        raise ValueError(f"Unknown DB_POOL_MODE {DB_POOL_MODE!r}; use 'queue' or 'pgbouncer'")
+    return {
+        "poolclass": TimedAsyncQueuePool if is_async else TimedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "connect_args": connect_args,
+    }
 
-engine = create_engine(DATABASE_URL, connect_args=connect_args)
+
+def build_engine(url):
+    """Sync engine for a database URL, pooled per the DB_POOL_* settings."""
+    return create_engine(url, **engine_options(url))
+
+
+# Sync engine for migrations, seed scripts and the other command-line tools
+engine = build_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async drivers used by the API for each backend
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+def get_async_url(url):
+    """Return (async URL, connect_args) for a sync DATABASE_URL."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    async_connect_args = {}
+    if backend in ASYNC_DRIVERS:
+        url = url.set(drivername=ASYNC_DRIVERS[backend])
+    if backend == "postgresql" and "sslmode" in url.query:
+        # asyncpg takes ssl=<mode> instead of libpq's sslmode query parameter
+        async_connect_args["ssl"] = url.query["sslmode"]
+        url = url.difference_update_query(["sslmode"])
+    return url, async_connect_args
+
+def build_async_engine(url):
+    """Async engine for a sync database URL, pooled per the DB_POOL_* settings."""
+    async_url, connect_args = get_async_url(url)
+    options = engine_options(url, is_async=True)
+    options["connect_args"] = {**options["connect_args"], **connect_args}
+    return create_async_engine(async_url, **options)
+
+# Async engine for the API, so requests don't hold a threadpool slot while waiting on the DB
+async_engine = build_async_engine(DATABASE_URL)
+
+class RoutingSession(Session):
+    """Session that sends reads to ``info["replica"]`` when one is set (see app/replicas.py).
+
+    Flushes and INSERT/UPDATE/DELETE statements always go to the primary, so
+    a read-only session that ends up writing still writes to the right place.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replica = self.info.get("replica")
+        if replica is not None and not self._flushing and clause is not None and not clause.is_dml:
+            return replica.engine.sync_engine
+        return super().get_bind(mapper, clause=clause, **kw)
+
+
+# Keep loaded attributes after commit: expired attributes can't lazy-load under asyncio
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, sync_session_class=RoutingSession, autoflush=False, expire_on_commit=False
+)
+
 Base = declarative_base()
 
 # Database session dependency
-def get_db():
-    db = SessionLocal()
+async def get_db():
+    db = AsyncSessionLocal()
     try:
         yield db
     finally:
-        db.close()
+        await db.close()
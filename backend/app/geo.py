@@ -0,0 +1,214 @@
+"""Geospatial helpers for ride search.
+
+Rides store a geohash of their pickup and drop-off points. Geohashes that
+share a prefix sort next to each other, so a radius search becomes a few
+indexed range scans over the 3x3 block of cells around the search point,
+followed by an exact haversine check on the (small) candidate set. This works
+the same on SQLite and Postgres without PostGIS.
+"""
+import math
+
+from sqlalchemy import and_, or_
+
+EARTH_RADIUS_KM = 6371.0088
+GEOHASH_PRECISION = 7  # ~150m x 150m cells
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def encode_geohash(lat: float, lng: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(chars) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            if lng >= mid:
+                bits = (bits << 1) | 1
+                lng_lo = mid
+            else:
+                bits <<= 1
+                lng_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                bits = (bits << 1) | 1
+                lat_lo = mid
+            else:
+                bits <<= 1
+                lat_hi = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(chars)
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+
+def _cell_size_deg(precision: int):
+    """Height and width of a geohash cell in degrees."""
+    total_bits = 5 * precision
+    lat_bits = total_bits // 2
+    lng_bits = total_bits - lat_bits
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def _precision_for_radius(lat: float, radius_km: float) -> int:
+    """Finest precision whose cells are at least radius_km on each side at this latitude."""
+    km_per_deg = math.radians(1) * EARTH_RADIUS_KM
+    cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_deg, lng_deg = _cell_size_deg(precision)
+        if lat_deg * km_per_deg >= radius_km and lng_deg * km_per_deg * cos_lat >= radius_km:
+            return precision
+    return 0
+
+
+def covering_cells(lat: float, lng: float, radius_km: float):
+    """Geohash cells that together cover every point within radius_km of (lat, lng).
+
+    Returns an empty list when the radius is too large for any prefilter to help.
+    """
+    precision = _precision_for_radius(lat, radius_km)
+    if precision == 0:
+        return []
+
+    lat_deg, lng_deg = _cell_size_deg(precision)
+    cells = set()
+    for dlat in (-1, 0, 1):
+        cell_lat = lat + dlat * lat_deg
+        if cell_lat < -90 or cell_lat > 90:
+            continue
+        for dlng in (-1, 0, 1):
+            cell_lng = (lng + dlng * lng_deg + 180) % 360 - 180
+            cells.add(encode_geohash(cell_lat, cell_lng, precision))
+    return sorted(cells)
+
+
+def _next_prefix(cell: str):
+    """The smallest geohash prefix that sorts after every geohash starting with cell, or None.
+
+    Geohash characters are digits and lowercase letters, which sort the same
+    way under byte order and the usual locale collations (unlike punctuation),
+    so [cell, _next_prefix(cell)) is the prefix range whatever the collation.
+    """
+    while cell:
+        position = _BASE32.index(cell[-1])
+        if position + 1 < len(_BASE32):
+            return cell[:-1] + _BASE32[position + 1]
+        cell = cell[:-1]
+    return None
+
+
+def _prefix_range(column, cell: str):
+    upper = _next_prefix(cell)
+    return column >= cell if upper is None else and_(column >= cell, column < upper)
+
+
+def geohash_filter(column, lat: float, lng: float, radius_km: float):
+    """SQL condition selecting rows whose geohash column lies near (lat, lng).
+
+    Each covering cell becomes a prefix range, which both SQLite and Postgres
+    answer from a plain B-tree index on the column.
+    """
+    cells = covering_cells(lat, lng, radius_km)
+    if not cells:
+        return column.isnot(None)
+    return or_(*[_prefix_range(column, cell) for cell in cells])
+
+
+# Route polylines. Rides can carry the driver's route as the Mapbox directions
+# geometry the client already fetched; it's simplified before it's stored, as
+# a few dozen points are plenty to tell whether a rider is on the way.
+ROUTE_SIMPLIFY_KM = 0.025
+
+
+def simplify_route(points, tolerance_km: float = ROUTE_SIMPLIFY_KM):
+    """Douglas-Peucker simplification of a [(lat, lng), ...] route, keeping both ends."""
+    if len(points) <= 2:
+        return list(points)
+    # An equirectangular projection is accurate to well under a metre at city scale
+    cos_lat = math.cos(math.radians(points[0][0]))
+    km_per_deg = math.radians(1) * EARTH_RADIUS_KM
+    xy = [(lng * km_per_deg * cos_lat, lat * km_per_deg) for lat, lng in points]
+
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        (ax, ay), (bx, by) = xy[first], xy[last]
+        dx, dy = bx - ax, by - ay
+        length_sq = dx * dx + dy * dy
+        farthest, farthest_dist = None, tolerance_km
+        for i in range(first + 1, last):
+            px, py = xy[i]
+            t = ((px - ax) * dx + (py - ay) * dy) / length_sq if length_sq else 0.0
+            t = min(1.0, max(0.0, t))
+            dist = math.hypot(px - ax - t * dx, py - ay - t * dy)
+            if dist > farthest_dist:
+                farthest, farthest_dist = i, dist
+        if farthest is not None:
+            keep[farthest] = True
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def encode_polyline(points, precision: int = 5) -> str:
+    """Encode [(lat, lng), ...] in the Google/Mapbox encoded polyline format."""
+    factor = 10 ** precision
+    chars = []
+    prev_lat = prev_lng = 0
+    for lat, lng in points:
+        lat, lng = round(lat * factor), round(lng * factor)
+        for delta in (lat - prev_lat, lng - prev_lng):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                chars.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chars.append(chr(value + 63))
+        prev_lat, prev_lng = lat, lng
+    return "".join(chars)
+
+
+def decode_polyline(encoded: str, precision: int = 5):
+    """Decode an encoded polyline back to [(lat, lng), ...]."""
+    factor = 10 ** precision
+    points = []
+    index = lat = lng = 0
+    while index < len(encoded):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append((lat / factor, lng / factor))
+    return points
+
+
+def encode_route(coordinates) -> str:
+    """Simplify and encode a GeoJSON-ordered [(lng, lat), ...] route for storage."""
+    return encode_polyline(simplify_route([(lat, lng) for lng, lat in coordinates]))
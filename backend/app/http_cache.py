@@ -0,0 +1,139 @@
+"""Conditional GET and a server-side response cache for public ride reads.
+
+Ride listings, search and detail are unauthenticated and polled constantly,
+so their serialized responses are cached in-process, keyed by path and query
+string, each with an ETag (hash of the body). A single ride's response also
+carries a Last-Modified from its ``updated_at``; lists and search results
+don't, since a ride dropping out of them (cancelled, full, deleted) moves no
+remaining row's timestamp and If-Modified-Since would wrongly match. A poll
+that sends a matching ``If-None-Match`` (or, for a ride, an
+``If-Modified-Since`` no older than Last-Modified) gets a bodiless 304, and a
+cache hit costs no database or serialization work.
+
+Routes that change rides or seat counts call ``invalidate_rides()`` after
+committing. Other workers only see those writes once their entries expire,
+so RIDE_CACHE_TTL_SECONDS bounds how stale a poll can be.
+
+With read replicas (see app.replicas), a user who just wrote skips the cache
+and reads the primary, and a response read from a replica within
+REPLICA_STICKY_SECONDS of the last invalidation isn't stored: the replica
+may not have the write yet, and caching its answer would serve the old rows
+to everyone, the writer included, for the whole TTL.
+"""
+import hashlib
+import os
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response
+
+from app.cache import TTLCache
+from app.replicas import REPLICA_STICKY_SECONDS
+
+RIDE_CACHE_TTL_SECONDS = float(os.getenv("RIDE_CACHE_TTL_SECONDS", "10"))
+RIDE_CACHE_SIZE = int(os.getenv("RIDE_CACHE_SIZE", "2048"))
+
+# Clients must revalidate every time; the ETag makes that cheap
+CACHE_CONTROL = "no-cache"
+
+ride_response_cache = TTLCache(maxsize=RIDE_CACHE_SIZE, ttl=RIDE_CACHE_TTL_SECONDS)
+
+# Bumped on every invalidation, so a read that raced a write can't cache its stale result
+_generation = 0
+_invalidated_at = float("-inf")
+
+
+class CachedResponse:
+    __slots__ = ("body", "media_type", "headers", "etag", "last_modified")
+
+    def __init__(self, body, media_type, headers, etag, last_modified):
+        self.body = body
+        self.media_type = media_type
+        self.headers = headers
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+def invalidate_rides():
+    """Drop every cached ride response; call after committing a ride or seat change."""
+    global _generation, _invalidated_at
+    _generation += 1
+    _invalidated_at = time.monotonic()
+    ride_response_cache.clear()
+
+
+def cache_generation():
+    return _generation
+
+
+def _cache_key(request: Request):
+    return request.url.path + "?" + "&".join(sorted(request.url.query.split("&")))
+
+
+def _http_date(value: datetime):
+    # Timestamps are stored as naive local time
+    return format_datetime(value.astimezone(timezone.utc).replace(microsecond=0), usegmt=True)
+
+
+def _not_modified(request: Request, entry: CachedResponse):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or entry.etag in tags or "W/" + entry.etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and entry.last_modified:
+        try:
+            return parsedate_to_datetime(if_modified_since) >= parsedate_to_datetime(entry.last_modified)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _to_response(request: Request, entry: CachedResponse):
+    headers = dict(entry.headers)
+    headers["ETag"] = entry.etag
+    headers["Cache-Control"] = CACHE_CONTROL
+    if entry.last_modified:
+        headers["Last-Modified"] = entry.last_modified
+    if _not_modified(request, entry):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type=entry.media_type, headers=headers)
+
+
+def cached_ride_response(request: Request):
+    """Return the cached (or 304) response for this request, or None on a miss."""
+    if getattr(request.state, "read_your_writes", False):
+        return None
+    entry = ride_response_cache.get(_cache_key(request))
+    if entry is None:
+        return None
+    return _to_response(request, entry)
+
+
+def cache_ride_response(request: Request, response: Response, last_modified: datetime = None, generation: int = None):
+    """Tag a freshly built response, remember it, and answer conditionally.
+
+    ``generation`` is the value of cache_generation() from before the rows
+    were read; if a write has invalidated the cache since, or the rows came
+    from a replica that may still lag behind the last invalidation, the
+    response is still returned but not stored.
+    """
+    headers = {
+        key: value for key, value in response.headers.items()
+        if key not in ("content-length", "content-type")
+    }
+    entry = CachedResponse(
+        body=response.body,
+        media_type=response.media_type,
+        headers=headers,
+        etag='"%s"' % hashlib.blake2b(response.body, digest_size=16).hexdigest(),
+        last_modified=_http_date(last_modified) if last_modified else None,
+    )
+    lagging = (
+        getattr(request.state, "replica", None) is not None
+        and time.monotonic() - _invalidated_at < REPLICA_STICKY_SECONDS
+    )
+    if (generation is None or generation == _generation) and not lagging:
+        ride_response_cache.set(_cache_key(request), entry)
+    return _to_response(request, entry)
@@ -0,0 +1,340 @@
+"""Ranked rider-to-ride matching over an in-memory, columnar index of rides.
+
+/api/rides/search filters; matching ranks. Given a rider's pickup and
+drop-off points and the time they want to leave, every candidate ride gets
+a score (lower is better) that blends
+
+- pickup distance and drop-off distance, relative to the search radius,
+- how far the departure is from the requested time, relative to the window,
+- price, relative to the cheapest and dearest candidate,
+- the driver's average rating,
+
+and the best ``limit`` rides are returned.
+
+Scoring a Python object per ride is far too slow at 100k rides, so the
+scheduled future rides that have coordinates are kept as NumPy arrays sorted
+by departure time. A match is a searchsorted on the time window, a
+bounding-box mask on both endpoints, vectorized haversine and scoring on
+what's left, and an argpartition for the top k. Only those few rides are
+then loaded from the database, which also re-checks status and seats, so a
+slightly stale index can cost a result but never returns an unbookable ride.
+
+Corridor matching (RideIndex.corridor) serves riders who are along the way
+rather than near either end: the index also flattens every ride's route
+(the stored polyline, or else the straight line between its endpoints) into
+one array of segments. After the same time-window cut, a per-ride bounding
+box grown by the allowed detour drops most routes, and a vectorized
+point-to-segment distance over the survivors' segments finds where the
+rider could get on and off, which must be in that order.
+
+The index is rebuilt in the background every MATCH_INDEX_TTL_SECONDS, or
+sooner (but never within MATCH_INDEX_MIN_AGE_SECONDS) once this process
+has changed rides. A rebuild of 100k rides takes about a second, so
+requests keep scoring against the old index until the new one is ready,
+and the arrays are built on a worker thread rather than the event loop.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import select
+
+from app import geo
+from app.database import AsyncSessionLocal
+from app.http_cache import cache_generation
+from app.models.database_models import Ride, User
+
+MATCH_INDEX_TTL_SECONDS = float(os.getenv("MATCH_INDEX_TTL_SECONDS", "60"))
+MATCH_INDEX_MIN_AGE_SECONDS = float(os.getenv("MATCH_INDEX_MIN_AGE_SECONDS", "15"))
+# Rows fetched per step while loading the index
+BUILD_PARTITION_ROWS = 1000
+
+# Score weights; each term is scaled to roughly 0..1 first
+WEIGHTS = {
+    "pickup": 0.35,
+    "dropoff": 0.25,
+    "time": 0.2,
+    "price": 0.1,
+    "rating": 0.1,
+}
+# Assumed for drivers nobody has rated yet
+NEUTRAL_RATING = 4.0
+
+KM_PER_DEGREE = np.radians(1.0) * geo.EARTH_RADIUS_KM
+
+logger = logging.getLogger(__name__)
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between a point and arrays of points (or two arrays), in km."""
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * geo.EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def bbox_mask(lats, lngs, lat, lng, radius_km):
+    """Cheap superset of the points within radius_km of (lat, lng)."""
+    dlat = radius_km / KM_PER_DEGREE
+    dlng = dlat / max(np.cos(np.radians(lat)), 1e-6)
+    return (np.abs(lats - lat) <= dlat) & (np.abs(lngs - lng) <= dlng)
+
+
+class RideIndex:
+    """Columns of the matchable rides, sorted by departure time."""
+
+    def __init__(self, rows, ratings, generation):
+        self.generation = generation
+        self.built_at = time.monotonic()
+        self.size = len(rows)
+        columns = list(zip(*rows)) if rows else [()] * 10
+        self.ids = np.array(columns[0], dtype=np.int64)
+        self.driver_ids = np.array(columns[1], dtype=np.int64)
+        self.departures = np.array([departure.timestamp() for departure in columns[2]], dtype=np.float64)
+        self.origin_lat = np.array(columns[3], dtype=np.float64)
+        self.origin_lng = np.array(columns[4], dtype=np.float64)
+        self.destination_lat = np.array(columns[5], dtype=np.float64)
+        self.destination_lng = np.array(columns[6], dtype=np.float64)
+        self.prices = np.array(columns[7], dtype=np.float64)
+        self.seats = np.array([row[8] for row in rows], dtype=np.int64)
+        self.ratings = np.array([ratings.get(driver_id, NEUTRAL_RATING) for driver_id in columns[1]],
+                                dtype=np.float64)
+        self._build_segments(rows)
+
+    def _build_segments(self, rows):
+        """Flatten every ride's route into one array of segments, in ride order.
+
+        Rides without a stored route get the straight line between their
+        endpoints. Points are projected to km on a plane tangent at the
+        index's median latitude, which is plenty accurate across a city.
+        """
+        self.ref_lat = float(np.median(self.origin_lat)) if self.size else 0.0
+        self.x_scale = KM_PER_DEGREE * np.cos(np.radians(self.ref_lat))
+        lats, lngs, counts = [], [], []
+        for row in rows:
+            polyline = row[9]
+            points = geo.decode_polyline(polyline) if polyline else ()
+            if len(points) < 2:
+                points = ((row[3], row[4]), (row[5], row[6]))
+            for lat, lng in points:
+                lats.append(lat)
+                lngs.append(lng)
+            counts.append(len(points))
+
+        x = np.array(lngs, dtype=np.float64) * self.x_scale
+        y = np.array(lats, dtype=np.float64) * KM_PER_DEGREE
+        point_counts = np.array(counts, dtype=np.int64)
+        point_ends = np.cumsum(point_counts)
+        # Ride i owns segments [seg_start[i], seg_start[i] + seg_count[i])
+        self.seg_count = point_counts - 1
+        self.seg_start = np.cumsum(self.seg_count) - self.seg_count
+        # A segment joins consecutive points of the same ride
+        last_points = point_ends - 1
+        starts = np.ones(x.size, dtype=bool)
+        starts[last_points] = False
+        heads = np.flatnonzero(starts)
+        self.ax, self.ay = x[heads], y[heads]
+        self.bx, self.by = x[heads + 1], y[heads + 1]
+        self.seg_len = np.hypot(self.bx - self.ax, self.by - self.ay)
+        # Distance along the ride's route at the start of each segment
+        along = np.cumsum(self.seg_len) - self.seg_len
+        if self.size:
+            along -= np.repeat(along[self.seg_start], self.seg_count)
+        self.seg_along = along
+
+        # Per-ride bounding boxes, for the corridor prefilter
+        if self.size:
+            self.min_x = np.minimum.reduceat(x, point_ends - point_counts)
+            self.max_x = np.maximum.reduceat(x, point_ends - point_counts)
+            self.min_y = np.minimum.reduceat(y, point_ends - point_counts)
+            self.max_y = np.maximum.reduceat(y, point_ends - point_counts)
+        else:
+            self.min_x = self.max_x = self.min_y = self.max_y = np.array([], dtype=np.float64)
+
+    def stale(self):
+        age = time.monotonic() - self.built_at
+        if age >= MATCH_INDEX_TTL_SECONDS:
+            return True
+        return self.generation != cache_generation() and age >= MATCH_INDEX_MIN_AGE_SECONDS
+
+    def _window(self, departure, window_minutes, seats, max_price):
+        """Slice of rides departing within the window, and the mask of those with seats and price."""
+        target = departure.timestamp()
+        window = window_minutes * 60.0
+        lo, hi = np.searchsorted(self.departures, (target - window, target + window), side="left")
+        window_slice = slice(lo, max(lo, hi))
+        mask = self.seats[window_slice] >= seats
+        if max_price is not None:
+            mask &= self.prices[window_slice] <= max_price
+        return window_slice, mask
+
+    def _rank(self, candidates, pickup, dropoff, departure, window_minutes, radius_km, limit):
+        """Score the candidates and return (positions of the best ``limit``, best first; their scores)."""
+        prices = self.prices[candidates]
+        price_range = prices.max() - prices.min()
+        scores = (
+            WEIGHTS["pickup"] * pickup / radius_km
+            + WEIGHTS["dropoff"] * dropoff / radius_km
+            + WEIGHTS["time"] * np.abs(self.departures[candidates] - departure.timestamp())
+            / (window_minutes * 60.0)
+            + WEIGHTS["price"] * ((prices - prices.min()) / price_range if price_range > 0 else 0.0)
+            + WEIGHTS["rating"] * (5.0 - self.ratings[candidates]) / 4.0
+        )
+        if candidates.size > limit:
+            top = np.argpartition(scores, limit - 1)[:limit]
+        else:
+            top = np.arange(candidates.size)
+        top = top[np.argsort(scores[top], kind="stable")]
+        return top, scores[top]
+
+    def match(self, origin, destination, departure: datetime, window_minutes, radius_km, seats=1,
+              max_price=None, limit=10):
+        """Return (ids, scores, pickup_km, dropoff_km) of the best rides, best first."""
+        window_slice, mask = self._window(departure, window_minutes, seats, max_price)
+        mask &= (
+            bbox_mask(self.origin_lat[window_slice], self.origin_lng[window_slice], *origin, radius_km)
+            & bbox_mask(self.destination_lat[window_slice], self.destination_lng[window_slice],
+                        *destination, radius_km)
+        )
+        candidates = np.flatnonzero(mask) + window_slice.start
+        if candidates.size == 0:
+            return _empty(4)
+
+        pickup = haversine_km(origin[0], origin[1], self.origin_lat[candidates], self.origin_lng[candidates])
+        dropoff = haversine_km(
+            destination[0], destination[1], self.destination_lat[candidates], self.destination_lng[candidates]
+        )
+        within = (pickup <= radius_km) & (dropoff <= radius_km)
+        candidates, pickup, dropoff = candidates[within], pickup[within], dropoff[within]
+        if candidates.size == 0:
+            return _empty(4)
+
+        top, scores = self._rank(candidates, pickup, dropoff, departure, window_minutes, radius_km, limit)
+        return self.ids[candidates[top]], scores, pickup[top], dropoff[top]
+
+    def corridor(self, origin, destination, departure: datetime, window_minutes, max_km, seats=1,
+                 max_price=None, limit=10):
+        """Rides whose route passes within ``max_km`` of the pickup and then of the drop-off.
+
+        Returns (ids, scores, pickup_km, dropoff_km, pickup_along_km, dropoff_along_km), best
+        first. The along distances are where on the route the rider can first be picked up
+        and last be dropped off; a ride only matches if the former comes before the latter.
+        """
+        px, py = origin[1] * self.x_scale, origin[0] * KM_PER_DEGREE
+        dx, dy = destination[1] * self.x_scale, destination[0] * KM_PER_DEGREE
+        window_slice, mask = self._window(departure, window_minutes, seats, max_price)
+        min_x, max_x = self.min_x[window_slice] - max_km, self.max_x[window_slice] + max_km
+        min_y, max_y = self.min_y[window_slice] - max_km, self.max_y[window_slice] + max_km
+        mask &= (
+            (min_x <= px) & (px <= max_x) & (min_y <= py) & (py <= max_y)
+            & (min_x <= dx) & (dx <= max_x) & (min_y <= dy) & (dy <= max_y)
+        )
+        candidates = np.flatnonzero(mask) + window_slice.start
+        if candidates.size == 0:
+            return _empty(6)
+
+        # Gather the candidates' segments; group i is candidates[i]'s route
+        counts = self.seg_count[candidates]
+        group_starts = np.cumsum(counts) - counts
+        segments = np.repeat(self.seg_start[candidates] - group_starts, counts) + np.arange(counts.sum())
+
+        pickup_dist, pickup_along = self._to_segments(px, py, segments)
+        dropoff_dist, dropoff_along = self._to_segments(dx, dy, segments)
+        pickup = np.minimum.reduceat(pickup_dist, group_starts)
+        dropoff = np.minimum.reduceat(dropoff_dist, group_starts)
+        first_pickup = np.minimum.reduceat(np.where(pickup_dist <= max_km, pickup_along, np.inf), group_starts)
+        last_dropoff = np.maximum.reduceat(np.where(dropoff_dist <= max_km, dropoff_along, -np.inf), group_starts)
+
+        within = (pickup <= max_km) & (dropoff <= max_km) & (first_pickup < last_dropoff)
+        candidates, pickup, dropoff = candidates[within], pickup[within], dropoff[within]
+        first_pickup, last_dropoff = first_pickup[within], last_dropoff[within]
+        if candidates.size == 0:
+            return _empty(6)
+
+        top, scores = self._rank(candidates, pickup, dropoff, departure, window_minutes, max_km, limit)
+        return (self.ids[candidates[top]], scores, pickup[top], dropoff[top],
+                first_pickup[top], last_dropoff[top])
+
+    def _to_segments(self, x, y, segments):
+        """Distance from (x, y) to each segment, and how far along its route the closest point is."""
+        ax, ay = self.ax[segments], self.ay[segments]
+        vx, vy = self.bx[segments] - ax, self.by[segments] - ay
+        length = self.seg_len[segments]
+        length_sq = length * length
+        with np.errstate(invalid="ignore", divide="ignore"):
+            t = np.where(length_sq > 0, ((x - ax) * vx + (y - ay) * vy) / length_sq, 0.0)
+        t = np.clip(t, 0.0, 1.0)
+        distance = np.hypot(x - ax - t * vx, y - ay - t * vy)
+        return distance, self.seg_along[segments] + t * length
+
+
+def _empty(width):
+    empty = np.array([], dtype=np.float64)
+    return (np.array([], dtype=np.int64),) + (empty,) * (width - 1)
+
+
+_index = None
+_rebuild = None
+
+
+async def build_index(db=None):
+    """Load the matchable rides and driver ratings into a fresh RideIndex."""
+    if db is None:
+        async with AsyncSessionLocal() as db:
+            return await build_index(db)
+    generation = cache_generation()
+    result = await db.stream(
+        select(
+            Ride.id, Ride.driver_id, Ride.departure_time, Ride.origin_lat, Ride.origin_lng,
+            Ride.destination_lat, Ride.destination_lng, Ride.price, Ride.available_seats,
+            Ride.route_polyline, User.rating_sum, User.rating_count,
+        )
+        .join(User, User.id == Ride.driver_id)
+        .filter(
+            Ride.status == "scheduled",
+            Ride.departure_time >= datetime.now(),
+            Ride.available_seats > 0,
+            Ride.origin_lat != None,
+            Ride.destination_lat != None,
+        )
+        .order_by(Ride.departure_time)
+    )
+    # In partitions, so the event loop gets a turn between them
+    rows = []
+    async for partition in result.partitions(BUILD_PARTITION_ROWS):
+        rows.extend(partition)
+    # Driver averages come from the users' rating aggregates, joined in above
+    ratings = {row[1]: row[10] / row[11] for row in rows if row[11]}
+    # Building the arrays (mostly timestamp conversion and polyline decoding)
+    # takes about a second at 100k rides; keep it off the event loop
+    return await asyncio.to_thread(RideIndex, rows, ratings, generation)
+
+
+async def _replace_index():
+    global _index, _rebuild
+    try:
+        _index = await build_index()
+    except Exception:
+        logger.exception("Rebuilding the ride match index failed")
+    finally:
+        _rebuild = None
+
+
+async def get_index(db):
+    """Return the current index; only the first call ever waits for a build."""
+    global _index, _rebuild
+    if _index is None:
+        _index = await build_index(db)
+    elif _index.stale() and _rebuild is None:
+        # Keep serving the stale index meanwhile. The fresh context keeps the
+        # rebuild's queries out of this request's metrics and query budget
+        _rebuild = asyncio.create_task(_replace_index(), context=contextvars.Context())
+    return _index
+
+
+def reset_index():
+    global _index
+    _index = None
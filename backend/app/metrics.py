@@ -0,0 +1,246 @@
+"""Request, SQL and connection-pool metrics in Prometheus text format.
+
+MetricsMiddleware (plain ASGI, so it adds no task or body buffering per
+request) times every request and labels it with the route *template*
+(``/api/rides/{ride_id}``, never the concrete path) so label cardinality
+stays bounded. SQLAlchemy engine events count the statements and the time
+spent in the database for the request that issued them, found through a
+context variable, and pool events track checkouts; the pool classes in
+app/database.py add how long checkouts wait and how often the pool is full.
+``render()`` produces the text served at ``/metrics``.
+
+Everything is recorded from the event loop thread into plain dicts, so the
+hot path is a few dict updates and a bisect per request.
+"""
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+# Upper bounds in seconds; roughly doubling from 5 ms to 10 s
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Statements per request
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+# Seconds a checkout waited for a pooled connection; almost always the first bucket
+POOL_WAIT_BUCKETS = (0.001, 0.005, 0.025, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Requests that match no route share one label instead of one per URL
+UNMATCHED_ROUTE = "unmatched"
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a label tuple."""
+
+    def __init__(self, name, help_text, labels, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, label_values, value):
+        series = self.series.get(label_values)
+        if series is None:
+            # Per-bucket counts (plus +Inf), sum, count
+            series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total, count) in sorted(self.series.items()):
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                bucket_labels = f'{labels},le="{bound}"' if labels else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {total:.6f}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter (or, with kind="gauge", a value that goes both ways) keyed by a label tuple."""
+
+    def __init__(self, name, help_text, labels=(), kind="counter"):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.kind = kind
+        # Unlabelled metrics are exported as 0 before their first update
+        self.series = {} if labels else {(): 0}
+
+    def inc(self, label_values=(), amount=1):
+        self.series[label_values] = self.series.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for label_values, value in sorted(self.series.items()):
+            labels = _labels(self.labels, label_values)
+            lines.append(f"{self.name}{{{labels}}} {value}" if labels else f"{self.name} {value}")
+        return lines
+
+
+class CacheMetrics:
+    """Hit, miss and eviction counts of the in-process TTLCaches, read when rendered."""
+
+    SERIES = (
+        ("cache_hits_total", "counter", "hits", "Lookups answered from the cache."),
+        ("cache_misses_total", "counter", "misses", "Lookups that missed the cache or found an expired entry."),
+        ("cache_evictions_total", "counter", "evictions", "Entries evicted to stay within the cache's size."),
+        ("cache_entries", "gauge", "size", "Entries currently cached."),
+    )
+
+    def __init__(self):
+        self.caches = {}
+
+    def watch(self, name, cache):
+        self.caches[name] = cache
+
+    def render(self):
+        stats = {name: cache.stats() for name, cache in sorted(self.caches.items())}
+        lines = []
+        for metric, kind, key, help_text in self.SERIES:
+            lines.extend((f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"))
+            for name, values in stats.items():
+                lines.append(f'{metric}{{cache="{name}"}} {values[key]}')
+        return lines
+
+
+def _labels(names, values):
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+
+
+request_latency = Histogram(
+    "http_request_duration_seconds", "Request latency by route.", ("method", "route"), LATENCY_BUCKETS)
+request_queries = Histogram(
+    "http_request_db_queries", "SQL statements issued per request.", ("method", "route"), QUERY_BUCKETS)
+request_db_time = Counter(
+    "http_request_db_seconds_total", "Time spent executing SQL, by route.", ("method", "route"))
+responses = Counter(
+    "http_responses_total", "Responses by route and status code.", ("method", "route", "status"))
+in_flight = Counter("http_requests_in_flight", "Requests currently being handled.", kind="gauge")
+queries = Counter("db_queries_total", "SQL statements executed, inside or outside requests.")
+query_time = Counter("db_query_seconds_total", "Time spent executing SQL statements.")
+pool_checkouts = Counter("db_pool_checkouts_total", "Connections checked out of the pool.")
+pool_checked_out = Counter("db_pool_checked_out", "Connections currently checked out.", kind="gauge")
+pool_connects = Counter("db_pool_connects_total", "New DBAPI connections opened.")
+pool_checkout_wait = Histogram(
+    "db_pool_checkout_wait_seconds", "Time a checkout waited for a pooled connection.", (), POOL_WAIT_BUCKETS)
+pool_saturated = Counter(
+    "db_pool_saturated_total", "Checkouts that found every connection in the pool in use.")
+pool_timeouts = Counter(
+    "db_pool_timeouts_total", "Checkouts that gave up waiting after DB_POOL_TIMEOUT.")
+realtime_subscribers = Counter("realtime_subscribers", "Open realtime event streams.", kind="gauge")
+realtime_events = Counter("realtime_events_total", "Ride change events published.")
+realtime_deliveries = Counter("realtime_deliveries_total", "Events queued for a subscriber.")
+realtime_dropped = Counter("realtime_dropped_total", "Subscribers disconnected for falling behind.")
+replica_reads = Counter(
+    "db_read_sessions_total", "Read-only request sessions by target (a replica, or primary).", ("target",))
+replica_healthy = Counter("db_replica_up", "1 while a read replica is taking reads.", ("replica",), kind="gauge")
+caches = CacheMetrics()
+
+METRICS = (
+    request_latency, request_queries, request_db_time, responses, in_flight,
+    queries, query_time, pool_checkouts, pool_checked_out, pool_connects,
+    pool_checkout_wait, pool_saturated, pool_timeouts,
+    realtime_subscribers, realtime_events, realtime_deliveries, realtime_dropped,
+    replica_reads, replica_healthy, caches,
+)
+
+# [statement count, seconds] for the request being handled in this context
+_request_sql = ContextVar("request_sql", default=None)
+
+
+def in_request():
+    """True while handling an HTTP request, False in startup and background tasks."""
+    return _request_sql.get() is not None
+
+
+def instrument_engine(engine):
+    """Attach query and pool listeners to a (sync) engine; pass async_engine.sync_engine for the API."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        queries.inc()
+        query_time.inc(amount=elapsed)
+        stats = _request_sql.get()
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        # after_cursor_execute doesn't fire for failed statements
+        if context.connection is not None:
+            started = context.connection.info.get("query_started")
+            if started:
+                started.pop()
+
+    @event.listens_for(engine.pool, "connect")
+    def _connect(dbapi_connection, connection_record):
+        pool_connects.inc()
+
+    @event.listens_for(engine.pool, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        pool_checkouts.inc()
+        pool_checked_out.inc()
+
+    @event.listens_for(engine.pool, "checkin")
+    def _checkin(dbapi_connection, connection_record):
+        pool_checked_out.inc(amount=-1)
+
+
+class MetricsMiddleware:
+    """Record latency, status, in-flight count and SQL work for every HTTP request."""
+
+    def __init__(self, app, exclude=("/metrics",)):
+        self.app = app
+        self.exclude = frozenset(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        stats = [0, 0.0]
+        token = _request_sql.set(stats)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            in_flight.inc(amount=-1)
+            _request_sql.reset(token)
+            # The router stores the matched route in the scope
+            route = scope.get("route")
+            labels = (scope["method"], route.path if route is not None else UNMATCHED_ROUTE)
+            request_latency.observe(labels, elapsed)
+            request_queries.observe(labels, stats[0])
+            request_db_time.inc(labels, stats[1])
+            responses.inc(labels + (str(status[0]),))
+
+
+def render():
+    """All metrics in Prometheus text exposition format."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -1,10 +1,15 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Float, Text
+from sqlalchemy import BigInteger, Column, Integer, String, Boolean, ForeignKey, Date, DateTime, Float, Text, Time, DDL, Index, event
 from sqlalchemy.orm import relationship
 from app.database import Base
+from app.geo import encode_geohash
 from datetime import datetime
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Keyset pagination order of the users list
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
@@ -13,7 +18,10 @@ class User(Base):
     hashed_password = Column(String)
     role = Column(String)  # driver, rider, both
     is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.now)
+    # Ratings received, kept up to date with every rating insert (see app/routes/ratings.py)
+    rating_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_sum = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
 
     # Relationships
@@ -22,45 +30,249 @@ class User(Base):
     ratings_given = relationship("Rating", foreign_keys="Rating.rater_id", back_populates="rater")
     ratings_received = relationship("Rating", foreign_keys="Rating.rated_id", back_populates="rated")
 
+    @property
+    def average_rating(self):
+        return self.rating_sum / self.rating_count if self.rating_count else None
+
 
 class Ride(Base):
     __tablename__ = "rides"
+    __table_args__ = (
+        # Search filters on status and orders/ranges on departure_time
+        Index("ix_rides_status_departure_time", "status", "departure_time"),
+        # Keyset pagination order of the rides list
+        Index("ix_rides_departure_time_id", "departure_time", "id"),
+        # One occurrence per schedule and departure, so materializing twice is a no-op
+        Index("ix_rides_schedule_id_departure_time", "schedule_id", "departure_time", unique=True),
+        # Delta sync of a driver's rides (see app/routes/sync.py)
+        Index("ix_rides_driver_id_change_seq", "driver_id", "change_seq"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    driver_id = Column(Integer, ForeignKey("users.id"))
+    driver_id = Column(Integer, ForeignKey("users.id"), index=True)
     origin = Column(String)
     destination = Column(String)
-    departure_time = Column(DateTime)
+    origin_lat = Column(Float, nullable=True)
+    origin_lng = Column(Float, nullable=True)
+    destination_lat = Column(Float, nullable=True)
+    destination_lng = Column(Float, nullable=True)
+    origin_geohash = Column(String(12), nullable=True, index=True)
+    destination_geohash = Column(String(12), nullable=True, index=True)
+    # The driver's simplified route as an encoded polyline (see app/geo.py)
+    route_polyline = Column(Text, nullable=True)
+    departure_time = Column(DateTime, nullable=False)
     available_seats = Column(Integer)
     price = Column(Float)
     description = Column(Text, nullable=True)
     status = Column(String, default="scheduled")  # scheduled, in_progress, completed, cancelled
-    created_at = Column(DateTime, default=datetime.now)
+    # Set on occurrences materialized from a recurring schedule (see app/recurring.py)
+    schedule_id = Column(Integer, ForeignKey("ride_schedules.id"), nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    # Set by the database on every insert and update (see CHANGE_SEQUENCE_DDL)
+    change_seq = Column(BigInteger, nullable=True)
+    changed_at = Column(DateTime(timezone=True), nullable=True)
 
     # Relationships
     driver = relationship("User", back_populates="rides_offered")
     bookings = relationship("Booking", back_populates="ride")
+    schedule = relationship("RideSchedule", back_populates="rides")
+
+
+# Keep the geohash columns in sync with the coordinates they index
+@event.listens_for(Ride, "before_insert")
+@event.listens_for(Ride, "before_update")
+def _sync_ride_geohashes(mapper, connection, target):
+    if target.origin_lat is not None and target.origin_lng is not None:
+        target.origin_geohash = encode_geohash(target.origin_lat, target.origin_lng)
+    else:
+        target.origin_geohash = None
+    if target.destination_lat is not None and target.destination_lng is not None:
+        target.destination_geohash = encode_geohash(target.destination_lat, target.destination_lng)
+    else:
+        target.destination_geohash = None
+
+
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+class RideSchedule(Base):
+    """A driver's recurring ride: a template plus the weekdays it runs on."""
+    __tablename__ = "ride_schedules"
+    __table_args__ = (
+        # The background refresh's scan for active schedules whose window needs extending
+        Index("ix_ride_schedules_is_active_materialized_until", "is_active", "materialized_until"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    driver_id = Column(Integer, ForeignKey("users.id"), index=True)
+    origin = Column(String)
+    destination = Column(String)
+    origin_lat = Column(Float, nullable=True)
+    origin_lng = Column(Float, nullable=True)
+    destination_lat = Column(Float, nullable=True)
+    destination_lng = Column(Float, nullable=True)
+    departure_time = Column(Time)  # time of day
+    weekdays = Column(Integer)  # bitmask, bit 0 = Monday
+    starts_on = Column(Date)
+    ends_on = Column(Date, nullable=True)
+    available_seats = Column(Integer)
+    price = Column(Float)
+    description = Column(Text, nullable=True)
+    is_active = Column(Boolean, default=True)
+    # Last day for which occurrences have been created as rides
+    materialized_until = Column(Date, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    # Relationships
+    driver = relationship("User")
+    rides = relationship("Ride", back_populates="schedule")
+
+    @property
+    def days(self):
+        return [day for i, day in enumerate(WEEKDAYS) if (self.weekdays or 0) & (1 << i)]
+
+
+# Free-text search index over ride origin/destination (see app/text_search.py).
+# Mirrors migration 0003 so databases built with create_all() get it too.
+RIDES_SEARCH_DDL = {
+    "sqlite": [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS rides_fts USING fts5("
+        "origin, destination, content='rides', content_rowid='id', tokenize='trigram')",
+        "CREATE TRIGGER IF NOT EXISTS rides_fts_ai AFTER INSERT ON rides BEGIN "
+        "INSERT INTO rides_fts(rowid, origin, destination) VALUES (new.id, new.origin, new.destination); END",
+        "CREATE TRIGGER IF NOT EXISTS rides_fts_ad AFTER DELETE ON rides BEGIN "
+        "INSERT INTO rides_fts(rides_fts, rowid, origin, destination) "
+        "VALUES ('delete', old.id, old.origin, old.destination); END",
+        "CREATE TRIGGER IF NOT EXISTS rides_fts_au AFTER UPDATE OF origin, destination ON rides BEGIN "
+        "INSERT INTO rides_fts(rides_fts, rowid, origin, destination) "
+        "VALUES ('delete', old.id, old.origin, old.destination); "
+        "INSERT INTO rides_fts(rowid, origin, destination) VALUES (new.id, new.origin, new.destination); END",
+    ],
+    "postgresql": [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS ix_rides_origin_trgm ON rides USING gin (origin gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_rides_destination_trgm ON rides USING gin (destination gin_trgm_ops)",
+    ],
+}
+
+for _dialect, _statements in RIDES_SEARCH_DDL.items():
+    for _statement in _statements:
+        event.listen(Ride.__table__, "after_create", DDL(_statement).execute_if(dialect=_dialect))
+# The external-content FTS table would otherwise outlive drop_all() with stale rowids
+event.listen(Ride.__table__, "after_drop", DDL("DROP TABLE IF EXISTS rides_fts").execute_if(dialect="sqlite"))
 
 
 class Booking(Base):
     __tablename__ = "bookings"
+    __table_args__ = (
+        # Delta sync of a passenger's bookings and of the bookings on a driver's rides
+        Index("ix_bookings_passenger_id_change_seq", "passenger_id", "change_seq"),
+        Index("ix_bookings_ride_id_change_seq", "ride_id", "change_seq"),
+        # Keyset pagination order of GET /api/bookings/ and /api/bookings/as-driver
+        Index("ix_bookings_passenger_id_created_at_id", "passenger_id", "created_at", "id"),
+        Index("ix_bookings_ride_id_created_at_id", "ride_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    ride_id = Column(Integer, ForeignKey("rides.id"))
-    passenger_id = Column(Integer, ForeignKey("users.id"))
+    ride_id = Column(Integer, ForeignKey("rides.id"), index=True)
+    passenger_id = Column(Integer, ForeignKey("users.id"), index=True)
     status = Column(String, default="pending")  # pending, confirmed, cancelled, completed
     seats = Column(Integer, default=1)
-    created_at = Column(DateTime, default=datetime.now)
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    # Set by the database on every insert and update (see CHANGE_SEQUENCE_DDL)
+    change_seq = Column(BigInteger, nullable=True)
+    changed_at = Column(DateTime(timezone=True), nullable=True)
 
     # Relationships
     ride = relationship("Ride", back_populates="bookings")
     passenger = relationship("User", back_populates="bookings")
 
 
+class SyncSequence(Base):
+    """Single-row counter behind the change_seq columns of rides and bookings on SQLite."""
+    __tablename__ = "sync_sequence"
+
+    id = Column(Integer, primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+
+
+# Stamp every inserted or updated ride and booking with the next change
+# sequence number and the time it was taken, in the database so bulk UPDATEs
+# (seat adjustments, schedule cancellations) are stamped too. PostgreSQL takes
+# the numbers from a sequence, which never blocks; they are handed out in
+# statement order, not commit order, so GET /api/sync only returns changes
+# stamped longer ago than its visibility window (see app/routes/sync.py).
+# SQLite has no sequences, but it runs one writer at a time, so the
+# sync_sequence row can't serialize anything that wasn't already serialized.
+# Mirrors migrations 0007 and 0011 so databases built with create_all() get it too.
+CHANGE_SEQUENCE_TABLES = ("rides", "bookings")
+
+
+def _change_sequence_ddl(dialect):
+    if dialect == "sqlite":
+        statements = []
+        for table in CHANGE_SEQUENCE_TABLES:
+            # Microseconds, to match how SQLAlchemy stores DateTime on SQLite
+            stamp = (
+                "UPDATE sync_sequence SET value = value + 1 WHERE id = 1; "
+                f"UPDATE {table} SET change_seq = (SELECT value FROM sync_sequence WHERE id = 1), "
+                "changed_at = strftime('%Y-%m-%d %H:%M:%f000', 'now') WHERE id = new.id; END"
+            )
+            statements.append(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_change_seq_ai AFTER INSERT ON {table} BEGIN {stamp}"
+            )
+            # The WHEN clause keeps the stamping UPDATE from stamping itself
+            statements.append(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_change_seq_au AFTER UPDATE ON {table} "
+                f"WHEN new.change_seq IS old.change_seq BEGIN {stamp}"
+            )
+        return statements
+    statements = [
+        "CREATE SEQUENCE IF NOT EXISTS change_seq",
+        "CREATE OR REPLACE FUNCTION stamp_change_seq() RETURNS trigger AS $$ BEGIN "
+        "NEW.change_seq := nextval('change_seq'); NEW.changed_at := clock_timestamp(); "
+        "RETURN NEW; END $$ LANGUAGE plpgsql",
+    ]
+    for table in CHANGE_SEQUENCE_TABLES:
+        statements.append(f"DROP TRIGGER IF EXISTS {table}_change_seq ON {table}")
+        statements.append(
+            f"CREATE TRIGGER {table}_change_seq BEFORE INSERT OR UPDATE ON {table} "
+            "FOR EACH ROW EXECUTE FUNCTION stamp_change_seq()"
+        )
+    return statements
+
+
+CHANGE_SEQUENCE_DDL = {dialect: _change_sequence_ddl(dialect) for dialect in ("sqlite", "postgresql")}
+
+# The counter row, then the triggers once rides and bookings exist
+event.listen(
+    SyncSequence.__table__, "after_create",
+    DDL("INSERT INTO sync_sequence (id, value) VALUES (1, 0)").execute_if(dialect="sqlite")
+)
+for _dialect, _statements in CHANGE_SEQUENCE_DDL.items():
+    for _statement in _statements:
+        # DDL() formats its statement with %, which the SQLite timestamps use
+        event.listen(
+            Booking.__table__, "after_create", DDL(_statement.replace("%", "%%")).execute_if(dialect=_dialect)
+        )
+# The sequence isn't part of the metadata, so drop_all() would leave it behind
+event.listen(
+    Booking.__table__, "after_drop", DDL("DROP SEQUENCE IF EXISTS change_seq").execute_if(dialect="postgresql")
+)
+
+
 class Rating(Base):
     __tablename__ = "ratings"
+    __table_args__ = (
+        # Keyset pagination order of a user's ratings, oldest first (see app/routes/ratings.py)
+        Index("ix_ratings_rated_id_created_at_id", "rated_id", "created_at", "id"),
+        Index("ix_ratings_ride_id", "ride_id"),
+        # One rating per rider and ride, each way
+        Index("ix_ratings_rater_id_rated_id_ride_id", "rater_id", "rated_id", "ride_id", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     rater_id = Column(Integer, ForeignKey("users.id"))
@@ -68,7 +280,8 @@ class Rating(Base):
     ride_id = Column(Integer, ForeignKey("rides.id"), nullable=True)
     rating = Column(Integer)  # 1-5 stars
     comment = Column(Text, nullable=True)
-    created_at = Column(DateTime, default=datetime.now)
+    rated_as = Column(String, nullable=True)  # driver, rider
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
 
     # Relationships
     rater = relationship("User", foreign_keys=[rater_id], back_populates="ratings_given")
@@ -1,6 +1,8 @@
-from pydantic import BaseModel, EmailStr, Field, validator
-from datetime import datetime
-from typing import Optional, List
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, validator
+from datetime import date, datetime, time
+from typing import Optional, List, Tuple
+
+from app.models.database_models import WEEKDAYS
 
 # User schemas
 class UserBase(BaseModel):
@@ -17,43 +19,131 @@ class UserLogin(BaseModel):
     password: str
 
 class UserResponse(UserBase):
+    # Stored emails were validated on the way in; re-validating every nested
+    # user on the way out was the most expensive part of serializing bookings
+    email: str
     id: int
     is_active: bool
     created_at: datetime
+    # From the users' rating aggregates; None until someone has rated them
+    average_rating: Optional[float] = None
+    rating_count: int = 0
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Ride schemas
 class RideBase(BaseModel):
     origin: str
     destination: str
+    origin_lat: Optional[float] = Field(None, ge=-90, le=90)
+    origin_lng: Optional[float] = Field(None, ge=-180, le=180)
+    destination_lat: Optional[float] = Field(None, ge=-90, le=90)
+    destination_lng: Optional[float] = Field(None, ge=-180, le=180)
     departure_time: datetime
     available_seats: int
     price: float
     description: Optional[str] = None
 
+# Most points a submitted route may have; it's simplified before it's stored
+MAX_ROUTE_POINTS = 20000
+
+def _validate_route_point(point):
+    lng, lat = point
+    if not (-180 <= lng <= 180 and -90 <= lat <= 90):
+        raise ValueError('Route points must be [lng, lat] pairs')
+    return point
+
 class RideCreate(RideBase):
-    pass
+    # The driver's route as [lng, lat] pairs, i.e. the directions geometry MapService.getDirections returns
+    route: Optional[List[Tuple[float, float]]] = Field(None, min_length=2, max_length=MAX_ROUTE_POINTS)
+
+    _check_route = validator('route', each_item=True)(_validate_route_point)
 
 class RideUpdate(BaseModel):
     origin: Optional[str] = None
     destination: Optional[str] = None
+    origin_lat: Optional[float] = Field(None, ge=-90, le=90)
+    origin_lng: Optional[float] = Field(None, ge=-180, le=180)
+    destination_lat: Optional[float] = Field(None, ge=-90, le=90)
+    destination_lng: Optional[float] = Field(None, ge=-180, le=180)
     departure_time: Optional[datetime] = None
     available_seats: Optional[int] = None
     price: Optional[float] = None
     description: Optional[str] = None
     status: Optional[str] = None
+    route: Optional[List[Tuple[float, float]]] = Field(None, min_length=2, max_length=MAX_ROUTE_POINTS)
+
+    _check_route = validator('route', each_item=True)(_validate_route_point)
 
 class RideResponse(RideBase):
     id: int
     driver_id: int
     status: str
     created_at: datetime
+    updated_at: Optional[datetime] = None
     driver: UserResponse
+    route_polyline: Optional[str] = None
+    # The recurring schedule this ride is an occurrence of, if any
+    schedule_id: Optional[int] = None
+    # Only set by coordinate searches: distance from the searched pickup point
+    distance_km: Optional[float] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class RideMatchResponse(RideResponse):
+    # Lower is better; see app/matching.py for how it's made up
+    score: float
+    pickup_km: float
+    dropoff_km: float
+    # Corridor matches only: distance along the route from its start, in km
+    pickup_along_km: Optional[float] = None
+    dropoff_along_km: Optional[float] = None
+
+# Recurring ride schemas
+class RideScheduleCreate(BaseModel):
+    origin: str
+    destination: str
+    origin_lat: Optional[float] = Field(None, ge=-90, le=90)
+    origin_lng: Optional[float] = Field(None, ge=-180, le=180)
+    destination_lat: Optional[float] = Field(None, ge=-90, le=90)
+    destination_lng: Optional[float] = Field(None, ge=-180, le=180)
+    departure_time: time
+    days: List[str] = Field(..., min_length=1)
+    starts_on: Optional[date] = None
+    ends_on: Optional[date] = None
+    available_seats: int = Field(..., ge=1)
+    price: float
+    description: Optional[str] = None
 
-    class Config:
-        orm_mode = True
+    @validator('days', each_item=True)
+    def validate_day(cls, v):
+        # Accept "Monday", "mon", "MON", ...
+        day = v.strip().lower()[:3]
+        if day not in WEEKDAYS:
+            raise ValueError(f'Unknown weekday: {v}')
+        return day
+
+class RideScheduleResponse(BaseModel):
+    id: int
+    driver_id: int
+    origin: str
+    destination: str
+    origin_lat: Optional[float] = None
+    origin_lng: Optional[float] = None
+    destination_lat: Optional[float] = None
+    destination_lng: Optional[float] = None
+    departure_time: time
+    days: List[str]
+    starts_on: date
+    ends_on: Optional[date] = None
+    available_seats: int
+    price: float
+    description: Optional[str] = None
+    is_active: bool
+    materialized_until: Optional[date] = None
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
 
 # Booking schemas
 class BookingBase(BaseModel):
@@ -61,7 +151,17 @@ class BookingBase(BaseModel):
     seats: int = 1
 
 class BookingCreate(BookingBase):
-    pass
+    seats: int = Field(1, ge=1)
+
+# Largest group or multi-leg reservation accepted in one batch
+MAX_BATCH_BOOKINGS = 20
+
+class BatchBookingItem(BookingCreate):
+    # Book for a listed passenger instead of the caller; only on rides the caller drives
+    passenger_id: Optional[int] = None
+
+class BatchBookingCreate(BaseModel):
+    bookings: List[BatchBookingItem] = Field(..., min_length=1, max_length=MAX_BATCH_BOOKINGS)
 
 class BookingUpdate(BaseModel):
     status: str
@@ -71,11 +171,20 @@ class BookingResponse(BookingBase):
     passenger_id: int
     status: str
     created_at: datetime
+    updated_at: Optional[datetime] = None
     passenger: UserResponse
     ride: RideResponse
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class SyncResponse(BaseModel):
+    # Rides and bookings changed since the request's cursor, oldest change first
+    rides: List[RideResponse]
+    bookings: List[BookingResponse]
+    # Pass back as ?since= for the next sync
+    cursor: int
+    # More changes are waiting: sync again right away with the new cursor
+    has_more: bool
 
 # Rating schemas
 class RatingBase(BaseModel):
@@ -91,15 +200,18 @@ class RatingBase(BaseModel):
         return v
 
 class RatingCreate(RatingBase):
-    pass
+    # Ratings are for a shared ride
+    ride_id: int
 
 class RatingResponse(RatingBase):
     id: int
     rater_id: int
+    # Whether the rated user was the ride's driver or a rider
+    rated_as: Optional[str] = None
     created_at: datetime
+    rater: UserResponse
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Token schemas
 class Token(BaseModel):
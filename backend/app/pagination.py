@@ -0,0 +1,64 @@
+"""Keyset (cursor) pagination for list endpoints.
+
+Pages are ordered by a ``(timestamp, id)`` pair and each page starts strictly
+after the last row of the previous one, so fetching page N costs the same as
+page 1 and concurrent inserts can't shift rows between pages. The cursor for
+the next page is returned in the ``X-Next-Cursor`` response header, which
+keeps the response bodies plain lists for existing clients.
+
+A ``(timestamp, id) > cursor`` comparison never matches a NULL timestamp, so
+the timestamp columns paginated on are NOT NULL (migration 0012).
+"""
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(sort_value: datetime, row_id: int) -> str:
+    payload = json.dumps([sort_value.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+async def paginate(
+    db, stmt, sort_column, id_column, response: Response,
+    cursor: str = None, limit: int = DEFAULT_PAGE_SIZE, skip: int = 0
+):
+    """Return one page of the ``stmt`` select ordered by (sort_column, id_column).
+
+    Sets the next-page cursor header on ``response`` when more rows remain.
+    ``skip`` is the legacy offset parameter and is ignored once a cursor is given.
+    """
+    stmt = stmt.order_by(sort_column, id_column)
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        stmt = stmt.filter(tuple_(sort_column, id_column) > tuple_(sort_value, row_id))
+    elif skip:
+        stmt = stmt.offset(skip)
+
+    rows = (await db.scalars(stmt.limit(limit + 1))).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            getattr(last, sort_column.key), getattr(last, id_column.key)
+        )
+    return rows
@@ -0,0 +1,66 @@
+"""Password hashing on a dedicated process pool.
+
+bcrypt is deliberately CPU-heavy and holds the GIL, so hashing inline (or on
+the shared threadpool) stalls every other request on the worker during a
+login burst. The async helpers hand the work to a small process pool instead;
+the sync functions remain for scripts and the seeders.
+
+BCRYPT_ROUNDS sets the cost for new hashes. Hashes made with a different cost
+still verify, and are upgraded on the user's next successful login.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from passlib.context import CryptContext
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# 0 runs hashing on the event loop's default thread executor instead of a process pool
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+_pool = None
+
+
+# Password verification
+def verify_password(plain_password, hashed_password):
+    return pwd_context.verify(plain_password, hashed_password)
+
+# Password hashing
+def get_password_hash(password):
+    return pwd_context.hash(password)
+
+def verify_and_update(plain_password, hashed_password):
+    """Return (valid, new_hash); new_hash is set when the stored hash should be replaced."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def _get_pool():
+    global _pool
+    if _pool is None and PASSWORD_HASH_WORKERS > 0:
+        # spawn rather than fork: the API process has event-loop and driver threads running
+        _pool = ProcessPoolExecutor(
+            max_workers=PASSWORD_HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+async def _run(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(_get_pool(), func, *args)
+
+
+async def hash_password_async(password):
+    return await _run(get_password_hash, password)
+
+async def verify_and_update_async(plain_password, hashed_password):
+    return await _run(verify_and_update, plain_password, hashed_password)
+
+
+def shutdown_password_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,195 @@
+"""N+1 detection and per-route query budgets for development and tests.
+
+Every relationship in the models is lazy="select", so a serializer that
+touches one more attribute can quietly add a query per row. With
+QUERY_GUARD set, each request's SQL statements are recorded and checked:
+
+- against the route's budget, declared with ``@query_budget(n)`` under the
+  route decorator (DEFAULT_QUERY_BUDGET otherwise). Budgets count every
+  statement the request runs, including the principal lookup on a cache
+  miss, but not COMMIT;
+- for repeated statement shapes (same SQL, IN-lists collapsed), the usual
+  signature of an N+1 loop;
+- for lazy loads, which should never be needed: routes load what they
+  serialize with joinedload or attach it with set_committed_value.
+
+QUERY_GUARD=warn logs a report when a request breaks a rule, =raise raises
+at the offending statement (so tests fail with the statements listed), and
+=off (the default) installs nothing. Under raise, a lazy load fails with
+UnintendedLazyLoad naming the relationship instead of asyncio's opaque
+MissingGreenlet.
+"""
+import logging
+import os
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+QUERY_GUARD = os.getenv("QUERY_GUARD", "off")
+DEFAULT_QUERY_BUDGET = int(os.getenv("QUERY_BUDGET_DEFAULT", "10"))
+# The same statement shape this many times in one request looks like a loop
+REPEATED_STATEMENT_THRESHOLD = int(os.getenv("QUERY_REPEAT_THRESHOLD", "3"))
+
+logger = logging.getLogger(__name__)
+
+# Bind-parameter lists such as IN (?, ?, ?) or VALUES ($1, $2), whatever their length
+_PARAMETER_LIST = re.compile(r"\(\s*(?:\?|%s|%\(\w+\)s|\$\d+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|\$\d+))*\s*\)")
+
+
+class QueryGuardError(Exception):
+    """Base class for query guard violations."""
+
+
+class QueryBudgetExceeded(QueryGuardError):
+    pass
+
+
+class RepeatedStatement(QueryGuardError):
+    pass
+
+
+class UnintendedLazyLoad(QueryGuardError):
+    pass
+
+
+def query_budget(statements: int):
+    """Declare how many SQL statements a route may run; apply below the route decorator."""
+    def decorate(endpoint):
+        endpoint.query_budget = statements
+        return endpoint
+    return decorate
+
+
+def statement_shape(statement: str) -> str:
+    return _PARAMETER_LIST.sub("(?)", " ".join(statement.split()))
+
+
+class QueryLog:
+    """Statements and lazy loads recorded for one request (or one track_queries block)."""
+
+    def __init__(self, label, mode, budget=None, scope=None):
+        self.label = label
+        self.mode = mode
+        self.scope = scope
+        self._budget = budget
+        self.statements = []
+        self.shapes = Counter()
+        self.lazy_loads = []
+
+    @property
+    def budget(self):
+        if self._budget is None and self.scope is not None:
+            # The router fills in scope["route"] before the endpoint runs
+            route = self.scope.get("route")
+            if route is not None:
+                return getattr(route.endpoint, "query_budget", DEFAULT_QUERY_BUDGET)
+        return self._budget if self._budget is not None else DEFAULT_QUERY_BUDGET
+
+    def repeated(self):
+        return {shape: count for shape, count in self.shapes.items() if count >= REPEATED_STATEMENT_THRESHOLD}
+
+    def problems(self):
+        problems = []
+        if len(self.statements) > self.budget:
+            problems.append(f"{len(self.statements)} statements, budget {self.budget}")
+        for shape, count in self.repeated().items():
+            problems.append(f"{count}x {shape}")
+        for relationship in self.lazy_loads:
+            problems.append(f"lazy load of {relationship}")
+        return problems
+
+    def report(self):
+        lines = [f"{self.label}: " + "; ".join(self.problems())]
+        lines += [f"  {i}. {statement}" for i, statement in enumerate(self.statements, 1)]
+        return "\n".join(lines)
+
+    def record_statement(self, statement):
+        self.statements.append(statement)
+        shape = statement_shape(statement)
+        self.shapes[shape] += 1
+        if self.mode != "raise":
+            return
+        if len(self.statements) > self.budget:
+            raise QueryBudgetExceeded(self.report())
+        if self.shapes[shape] == REPEATED_STATEMENT_THRESHOLD:
+            raise RepeatedStatement(self.report())
+
+    def record_lazy_load(self, relationship):
+        self.lazy_loads.append(relationship)
+        if self.mode == "raise":
+            raise UnintendedLazyLoad(self.report())
+
+
+_current = ContextVar("query_log", default=None)
+
+
+@contextmanager
+def track_queries(label="block", budget=None, mode="raise"):
+    """Guard the statements run inside the block; yields the QueryLog."""
+    log = QueryLog(label, mode, budget)
+    token = _current.set(log)
+    try:
+        yield log
+    finally:
+        _current.reset(token)
+    if mode == "warn" and log.problems():
+        logger.warning(log.report())
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    log = _current.get()
+    if log is not None:
+        log.record_statement(statement)
+
+
+def _do_orm_execute(orm_execute_state):
+    log = _current.get()
+    if log is not None and orm_execute_state.is_select and orm_execute_state.lazy_loaded_from is not None:
+        path = orm_execute_state.loader_strategy_path
+        log.record_lazy_load(str(path[-1]) if path else orm_execute_state.lazy_loaded_from.class_.__name__)
+
+
+class QueryGuardMiddleware:
+    """Give every HTTP request its own QueryLog and report rule breaks when it ends."""
+
+    def __init__(self, app, mode="warn"):
+        self.app = app
+        self.mode = mode
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        log = QueryLog(f"{scope['method']} {scope['path']}", self.mode, scope=scope)
+        token = _current.set(log)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current.reset(token)
+        if log.problems():
+            logger.warning(log.report())
+
+
+def attach(*engines):
+    """Record statements and lazy loads for guarded blocks; safe to call more than once.
+
+    The listeners only act while a QueryLog is current, i.e. inside a
+    guarded request or a track_queries block.
+    """
+    for engine in engines:
+        if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    if not event.contains(Session, "do_orm_execute", _do_orm_execute):
+        event.listen(Session, "do_orm_execute", _do_orm_execute)
+
+
+def install(app, *engines, mode=QUERY_GUARD):
+    """Wire the guard into the app and engines unless mode is "off"."""
+    if mode not in ("warn", "raise"):
+        return
+    app.add_middleware(QueryGuardMiddleware, mode=mode)
+    attach(*engines)
@@ -0,0 +1,256 @@
+"""In-process fan-out of ride changes to server-sent event subscribers.
+
+Clients used to poll /api/rides to notice seat changes. Instead they can
+hold open /api/realtime/rides, subscribed to a few ride ids and/or a search
+area, and get a small event whenever one of those rides changes.
+
+Routes that change a ride's seats, status, time or price call
+``publish_ride(ride)`` after committing. The event is serialized once into an
+SSE frame and handed to every matching subscriber's bounded queue; lookups go
+through a ride id index and a geohash prefix index, so a publish costs
+the number of interested subscribers, not the number connected. Publishing
+never waits: a subscriber whose queue is full is dropped and told so, and
+its client reconnects and refetches.
+
+Most streams sit idle for hours, so an idle one is kept cheap: its queue is
+a deque plus a future that exists only while the stream waits,
+EventStreamResponse watches for the disconnect with one task instead of
+StreamingResponse's task group, and one background task sends every stream
+its heartbeat rather than a timer per stream.
+
+Subscribers only hear about writes made by this process. With several
+workers, a client keeps polling at a slower rate as a backstop.
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import os
+from collections import defaultdict, deque
+
+from fastapi.responses import StreamingResponse
+
+from app import metrics
+
+# Pending events per subscriber before it counts as too slow and is dropped
+REALTIME_QUEUE_SIZE = int(os.getenv("REALTIME_QUEUE_SIZE", "64"))
+# How often every stream gets a heartbeat comment, so proxies don't time it out
+REALTIME_HEARTBEAT_SECONDS = float(os.getenv("REALTIME_HEARTBEAT_SECONDS", "15"))
+
+SUBSCRIBED = "retry: 5000\n: subscribed\n\n"
+HEARTBEAT = ": ping\n\n"
+# Last frame a dropped subscriber gets; the client should reconnect and refetch
+DROPPED = "event: dropped\ndata: {}\n\n"
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """One client's interest (ride ids, geohash cells) and its bounded queue of pending frames."""
+    __slots__ = ("ride_ids", "cells", "pending", "limit", "closed", "_waiter")
+
+    def __init__(self, ride_ids, cells, limit):
+        self.ride_ids = frozenset(ride_ids)
+        self.cells = frozenset(cells)
+        self.pending = deque()
+        self.limit = limit
+        self.closed = False
+        self._waiter = None
+
+    def offer(self, frame) -> bool:
+        """Queue a frame unless the queue is full or closed; never waits."""
+        if self.closed or len(self.pending) >= self.limit:
+            return False
+        self.pending.append(frame)
+        self._wake()
+        return True
+
+    def close(self, final_frame=None):
+        """Discard what's pending and end the stream, after ``final_frame`` if given."""
+        self.closed = True
+        self.pending.clear()
+        if final_frame is not None:
+            self.pending.append(final_frame)
+        self._wake()
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def get(self):
+        """Next frame, or None once the subscription is closed and drained."""
+        while not self.pending:
+            if self.closed:
+                return None
+            self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        return self.pending.popleft()
+
+
+class Broadcaster:
+    def __init__(self, queue_size=REALTIME_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.sequence = 0
+        self._by_ride = defaultdict(set)
+        self._by_cell = defaultdict(set)
+        # Lengths of the subscribed cells, so a publish only probes prefixes someone asked for
+        self._cell_lengths = defaultdict(int)
+        self._subscriptions = set()
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscriptions)
+
+    def subscribe(self, ride_ids=(), cells=()):
+        subscription = Subscription(ride_ids, cells, self.queue_size)
+        for ride_id in subscription.ride_ids:
+            self._by_ride[ride_id].add(subscription)
+        for cell in subscription.cells:
+            self._by_cell[cell].add(subscription)
+            self._cell_lengths[len(cell)] += 1
+        self._subscriptions.add(subscription)
+        metrics.realtime_subscribers.inc()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        if subscription not in self._subscriptions:
+            return
+        self._subscriptions.discard(subscription)
+        for ride_id in subscription.ride_ids:
+            subscribers = self._by_ride[ride_id]
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._by_ride[ride_id]
+        for cell in subscription.cells:
+            subscribers = self._by_cell[cell]
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._by_cell[cell]
+            self._cell_lengths[len(cell)] -= 1
+            if not self._cell_lengths[len(cell)]:
+                del self._cell_lengths[len(cell)]
+        metrics.realtime_subscribers.inc(amount=-1)
+
+    def publish(self, event, ride_id, geohashes=()) -> int:
+        """Queue ``event`` for everyone subscribed to the ride or an area containing it; returns the count."""
+        targets = set(self._by_ride.get(ride_id, ()))
+        for geohash in geohashes:
+            if not geohash:
+                continue
+            for length in self._cell_lengths:
+                targets.update(self._by_cell.get(geohash[:length], ()))
+        metrics.realtime_events.inc()
+        if not targets:
+            return 0
+
+        self.sequence += 1
+        frame = f"id: {self.sequence}\nevent: ride\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+        delivered = 0
+        for subscription in targets:
+            if subscription.offer(frame):
+                delivered += 1
+            else:
+                self._drop(subscription)
+        metrics.realtime_deliveries.inc(amount=delivered)
+        return delivered
+
+    def _drop(self, subscription):
+        """Disconnect a subscriber that isn't keeping up, without ever blocking the publisher."""
+        self.unsubscribe(subscription)
+        subscription.close(DROPPED)
+        metrics.realtime_dropped.inc()
+
+    def heartbeat(self):
+        """Queue a keep-alive comment for every subscriber that has room for one."""
+        for subscription in self._subscriptions:
+            subscription.offer(HEARTBEAT)
+
+    async def stream(self, subscription):
+        """SSE body for a subscription; unsubscribes when it ends or the client goes away."""
+        try:
+            yield SUBSCRIBED
+            while True:
+                frame = await subscription.get()
+                if frame is None:
+                    return
+                yield frame
+        finally:
+            self.unsubscribe(subscription)
+
+
+class EventStreamResponse(StreamingResponse):
+    """Server-sent events for one subscription.
+
+    StreamingResponse runs the body and a disconnect listener in a task
+    group per response; here a single task waits for the disconnect and
+    closes the subscription, which ends the body.
+    """
+    media_type = "text/event-stream"
+
+    def __init__(self, broadcaster, subscription, headers=None):
+        super().__init__(broadcaster.stream(subscription), headers=headers)
+        self.subscription = subscription
+
+    async def _watch(self, receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        self.subscription.close()
+
+    async def __call__(self, scope, receive, send):
+        watcher = asyncio.ensure_future(self._watch(receive))
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            async for frame in self.body_iterator:
+                await send({"type": "http.response.body", "body": frame.encode(), "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            watcher.cancel()
+            await self.body_iterator.aclose()
+
+
+broadcaster = Broadcaster()
+
+
+def ride_event(ride):
+    return {
+        "ride_id": ride.id,
+        "status": ride.status,
+        "available_seats": ride.available_seats,
+        "departure_time": ride.departure_time.isoformat() if ride.departure_time else None,
+        "price": ride.price,
+    }
+
+
+def publish_ride(ride) -> int:
+    """Tell subscribers about a committed change to ``ride``."""
+    return broadcaster.publish(ride_event(ride), ride.id, (ride.origin_geohash, ride.destination_geohash))
+
+
+async def _heartbeat_forever():
+    while True:
+        await asyncio.sleep(REALTIME_HEARTBEAT_SECONDS)
+        try:
+            broadcaster.heartbeat()
+        except Exception:
+            logger.exception("Sending realtime heartbeats failed")
+
+
+_heartbeat = None
+
+
+async def start_heartbeat():
+    global _heartbeat
+    if _heartbeat is None:
+        _heartbeat = asyncio.create_task(_heartbeat_forever())
+
+
+async def stop_heartbeat():
+    global _heartbeat
+    if _heartbeat is not None:
+        _heartbeat.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await _heartbeat
+        _heartbeat = None
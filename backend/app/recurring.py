@@ -0,0 +1,173 @@
+"""Recurring rides: materialize schedule occurrences as ordinary Ride rows.
+
+A RideSchedule is a template (route, time of day, seats, price) plus the
+weekdays it runs on. Search, booking and seat accounting only ever deal with
+concrete rides, so occurrences are created as Ride rows, but only inside a
+rolling window of RECURRING_WINDOW_DAYS: a commuter's standing ride costs a
+couple of weeks of rows, not a year of them.
+
+Each schedule remembers the last day it was materialized through. New
+schedules are materialized when they're created, and a background task
+extends every active schedule's window in bulk every RECURRING_REFRESH_SECONDS.
+Occurrences are unique per (schedule_id, departure_time) and inserted with
+ON CONFLICT DO NOTHING, so several workers refreshing at once is harmless.
+"""
+import asyncio
+import contextlib
+import logging
+import os
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.database import AsyncSessionLocal
+from app.geo import encode_geohash
+from app.http_cache import invalidate_rides
+from app.models.database_models import WEEKDAYS, Ride, RideSchedule
+from app.realtime import publish_ride
+
+RECURRING_WINDOW_DAYS = int(os.getenv("RECURRING_WINDOW_DAYS", "14"))
+RECURRING_REFRESH_SECONDS = float(os.getenv("RECURRING_REFRESH_SECONDS", "3600"))
+
+# Rows per INSERT; keeps SQLite under its bound-parameter limit
+INSERT_BATCH_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+
+def weekday_mask(days) -> int:
+    return sum(1 << WEEKDAYS.index(day) for day in days)
+
+
+def horizon(today: date = None) -> date:
+    """Last day the rolling window covers."""
+    return (today or date.today()) + timedelta(days=RECURRING_WINDOW_DAYS)
+
+
+def occurrences(schedule: RideSchedule, until: date, now: datetime = None):
+    """Departure datetimes of the schedule after its materialized day, up to ``until``, still in the future."""
+    now = now or datetime.now()
+    day = max(schedule.starts_on, now.date())
+    if schedule.materialized_until is not None:
+        day = max(day, schedule.materialized_until + timedelta(days=1))
+    last = min(until, schedule.ends_on) if schedule.ends_on else until
+    while day <= last:
+        if schedule.weekdays & (1 << day.weekday()):
+            departure = datetime.combine(day, schedule.departure_time)
+            if departure > now:
+                yield departure
+        day += timedelta(days=1)
+
+
+def occurrence_rows(schedule: RideSchedule, until: date, now: datetime = None):
+    # Core inserts skip the ORM's before_insert hook, so fill the geohashes here
+    origin_geohash = destination_geohash = None
+    if schedule.origin_lat is not None and schedule.origin_lng is not None:
+        origin_geohash = encode_geohash(schedule.origin_lat, schedule.origin_lng)
+    if schedule.destination_lat is not None and schedule.destination_lng is not None:
+        destination_geohash = encode_geohash(schedule.destination_lat, schedule.destination_lng)
+    for departure in occurrences(schedule, until, now):
+        yield {
+            "driver_id": schedule.driver_id,
+            "schedule_id": schedule.id,
+            "origin": schedule.origin,
+            "destination": schedule.destination,
+            "origin_lat": schedule.origin_lat,
+            "origin_lng": schedule.origin_lng,
+            "destination_lat": schedule.destination_lat,
+            "destination_lng": schedule.destination_lng,
+            "origin_geohash": origin_geohash,
+            "destination_geohash": destination_geohash,
+            "departure_time": departure,
+            "available_seats": schedule.available_seats,
+            "price": schedule.price,
+            "description": schedule.description,
+            "status": "scheduled",
+        }
+
+
+def _insert_ignoring_existing(dialect_name):
+    if dialect_name == "postgresql":
+        return postgresql.insert(Ride).on_conflict_do_nothing(index_elements=["schedule_id", "departure_time"])
+    if dialect_name == "sqlite":
+        return sqlite.insert(Ride).on_conflict_do_nothing(index_elements=["schedule_id", "departure_time"])
+    # Elsewhere the unique index turns a racing duplicate into an error and a retry
+    return insert(Ride)
+
+
+async def materialize(db, schedules, until: date = None, now: datetime = None) -> list:
+    """Insert the occurrences of ``schedules`` up to ``until`` and advance their materialized day.
+
+    Runs in the caller's transaction; the caller commits, then publishes the
+    returned rides: the ones this call inserted, not those another worker had.
+    """
+    until = until or horizon()
+    rows = [row for schedule in schedules for row in occurrence_rows(schedule, until, now)]
+    stmt = _insert_ignoring_existing(db.get_bind().dialect.name).returning(Ride)
+    created = []
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        created.extend((await db.scalars(stmt.values(rows[start:start + INSERT_BATCH_SIZE]))).all())
+    ids = [schedule.id for schedule in schedules]
+    if ids:
+        await db.execute(
+            update(RideSchedule)
+            .where(RideSchedule.id.in_(ids))
+            .values(materialized_until=until)
+            .execution_options(synchronize_session=False)
+        )
+    return created
+
+
+async def refresh_schedules(until: date = None) -> int:
+    """Extend every active schedule's occurrences to the end of the rolling window."""
+    until = until or horizon()
+    async with AsyncSessionLocal() as db:
+        schedules = (await db.scalars(
+            select(RideSchedule).filter(
+                RideSchedule.is_active == True,
+                or_(RideSchedule.materialized_until == None, RideSchedule.materialized_until < until),
+                # Schedules that have run out have nothing left to create
+                or_(
+                    RideSchedule.ends_on == None,
+                    RideSchedule.materialized_until == None,
+                    RideSchedule.materialized_until < RideSchedule.ends_on,
+                ),
+            )
+        )).all()
+        if not schedules:
+            return 0
+        created = await materialize(db, schedules, until)
+        await db.commit()
+    if created:
+        invalidate_rides()
+        for ride in created:
+            publish_ride(ride)
+    return len(created)
+
+
+async def _refresh_forever():
+    while True:
+        try:
+            await refresh_schedules()
+        except Exception:
+            logger.exception("Refreshing recurring rides failed")
+        await asyncio.sleep(RECURRING_REFRESH_SECONDS)
+
+
+_refresher = None
+
+
+async def start_refresher():
+    global _refresher
+    if _refresher is None:
+        _refresher = asyncio.create_task(_refresh_forever())
+
+
+async def stop_refresher():
+    global _refresher
+    if _refresher is not None:
+        _refresher.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await _refresher
+        _refresher = None
@@ -0,0 +1,211 @@
+"""Read replicas for the read-only endpoints.
+
+Most requests are reads of rides and users. With DATABASE_REPLICA_URLS set
+(comma-separated, same URL format as DATABASE_URL), routes that depend on
+``get_read_db`` instead of ``get_db`` run their queries on a replica:
+
+- replicas are taken round-robin, skipping any marked down;
+- a replica is marked down when connecting to it fails, and a background
+  check pings every replica each REPLICA_CHECK_SECONDS to bring it back
+  (or take it out before a request trips over it);
+- for REPLICA_STICKY_SECONDS after a user's own successful POST, PUT or
+  DELETE, their reads go to the primary, so they see what they just wrote
+  despite replication lag;
+- with no replica configured or none up, reads go to the primary.
+
+The request that hits a failing replica still fails; the ones after it don't.
+Stickiness is remembered per process, like the other in-process caches, so
+REPLICA_STICKY_SECONDS should cover the replicas' usual lag.
+
+Without DATABASE_REPLICA_URLS, ``get_read_db`` is just ``get_db``. Locally,
+two copies of the SQLite file stand in for replicas.
+"""
+import asyncio
+import contextlib
+import logging
+import os
+
+from fastapi import Request
+from jose import jwt
+from jose.exceptions import JOSEError
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+
+from app import metrics
+from app.cache import TTLCache
+from app.database import AsyncSessionLocal, build_async_engine
+
+DATABASE_REPLICA_URLS = os.getenv("DATABASE_REPLICA_URLS", "")
+# How often replicas are pinged, and how long a ping may take
+REPLICA_CHECK_SECONDS = float(os.getenv("REPLICA_CHECK_SECONDS", "5"))
+REPLICA_CHECK_TIMEOUT_SECONDS = float(os.getenv("REPLICA_CHECK_TIMEOUT_SECONDS", "2"))
+# How long a user's reads stay on the primary after they write
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+REPLICA_STICKY_USERS = int(os.getenv("REPLICA_STICKY_USERS", "100000"))
+
+SAFE_METHODS = frozenset(("GET", "HEAD", "OPTIONS"))
+
+logger = logging.getLogger(__name__)
+
+
+class Replica:
+    def __init__(self, url, owner):
+        url = make_url(url.replace("postgres://", "postgresql://", 1))
+        # Host and database only: never put credentials in logs or metric labels
+        self.name = f"{url.host or 'local'}/{url.database}"
+        self.engine = build_async_engine(url)
+        self.healthy = True
+        self.owner = owner
+        event.listen(self.engine.sync_engine, "handle_error", self._on_error)
+
+    def _on_error(self, context):
+        # Couldn't connect, or the connection died: stop sending reads here until a check passes
+        if context.connection is None or context.is_disconnect:
+            self.owner.mark_down(self, context.original_exception)
+
+    async def ping(self):
+        async with self.engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+
+class ReplicaSet:
+    def __init__(self, urls=()):
+        self.replicas = [Replica(url, self) for url in urls]
+        self._turn = 0
+        for replica in self.replicas:
+            metrics.replica_healthy.inc((replica.name,))
+
+    def choose(self):
+        """The next replica that is up, round-robin, or None."""
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[self._turn % len(self.replicas)]
+            self._turn += 1
+            if replica.healthy:
+                return replica
+        return None
+
+    def mark_down(self, replica, error=None):
+        if replica.healthy:
+            replica.healthy = False
+            metrics.replica_healthy.inc((replica.name,), amount=-1)
+            logger.warning("Read replica %s is down: %s", replica.name, error)
+
+    def mark_up(self, replica):
+        if not replica.healthy:
+            replica.healthy = True
+            metrics.replica_healthy.inc((replica.name,))
+            logger.info("Read replica %s is back", replica.name)
+
+    async def check(self):
+        """Ping every replica and mark each up or down."""
+        for replica in self.replicas:
+            try:
+                await asyncio.wait_for(replica.ping(), REPLICA_CHECK_TIMEOUT_SECONDS)
+            except Exception as error:
+                self.mark_down(replica, error)
+            else:
+                self.mark_up(replica)
+
+    async def dispose(self):
+        for replica in self.replicas:
+            metrics.replica_healthy.series.pop((replica.name,), None)
+            await replica.engine.dispose()
+
+
+replicas = ReplicaSet(url.strip() for url in DATABASE_REPLICA_URLS.split(",") if url.strip())
+
+# Subjects of users who wrote in the last REPLICA_STICKY_SECONDS
+recent_writers = TTLCache(maxsize=REPLICA_STICKY_USERS, ttl=REPLICA_STICKY_SECONDS)
+
+
+async def configure(urls):
+    """Replace the replica set, e.g. ``configure([])`` to read from the primary only."""
+    global replicas
+    previous, replicas = replicas, ReplicaSet(urls)
+    await previous.dispose()
+    return replicas
+
+
+def _subject(headers):
+    """The token's user, for routing only: authentication happens in app.auth."""
+    for name, value in headers:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                try:
+                    return jwt.get_unverified_claims(token).get("sub")
+                except JOSEError:
+                    return None
+    return None
+
+
+async def get_read_db(request: Request):
+    """Session for read-only routes: queries go to a replica unless the caller just wrote."""
+    db = AsyncSessionLocal()
+    # Where this request reads from, for the ride response cache (see app.http_cache)
+    request.state.replica = None
+    request.state.read_your_writes = False
+    if replicas.replicas:
+        subject = _subject(request.scope["headers"])
+        request.state.read_your_writes = subject is not None and bool(recent_writers.get(subject))
+        replica = None if request.state.read_your_writes else replicas.choose()
+        request.state.replica = replica
+        if replica is not None:
+            db.sync_session.info["replica"] = replica
+            metrics.replica_reads.inc((replica.name,))
+        else:
+            metrics.replica_reads.inc(("primary",))
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+class ReadYourWritesMiddleware:
+    """Keep a user's reads on the primary for a while after a write of theirs succeeds."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS or not replicas.replicas:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            # Before the response leaves, so the client's next read already sticks
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                subject = _subject(scope["headers"])
+                if subject is not None:
+                    recent_writers.set(subject, True)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+async def _check_forever():
+    while True:
+        await asyncio.sleep(REPLICA_CHECK_SECONDS)
+        try:
+            await replicas.check()
+        except Exception:
+            logger.exception("Checking read replicas failed")
+
+
+_checker = None
+
+
+async def start_health_checks():
+    global _checker
+    if _checker is None:
+        _checker = asyncio.create_task(_check_forever())
+
+
+async def stop_health_checks():
+    global _checker
+    if _checker is not None:
+        _checker.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await _checker
+        _checker = None
+    await replicas.dispose()
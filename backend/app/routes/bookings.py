@@ -1,23 +1,93 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import case, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
 
 from app.database import get_db
+from app.replicas import get_read_db
 from app.models.database_models import Booking, Ride, User
-from app.models.schemas import BookingCreate, BookingResponse, BookingUpdate
+from app.models.schemas import BatchBookingCreate, BookingCreate, BookingResponse, BookingUpdate
 from app.auth import get_current_active_user
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, paginate
+from app.serialization import booking_list_adapter, json_response
+from app.http_cache import invalidate_rides
+from app.realtime import publish_ride
+from app.query_guard import query_budget
 
 router = APIRouter()
 
+# Relationships every BookingResponse serializes
+BOOKING_RESPONSE_OPTIONS = (
+    joinedload(Booking.passenger),
+    joinedload(Booking.ride).joinedload(Ride.driver),
+)
+
+async def _adjust_seats(db: AsyncSession, ride: Ride, delta: int, *conditions) -> bool:
+    """Atomically add ``delta`` to the ride's available seats if ``conditions`` hold.
+    
+    The new count comes back in the same statement via RETURNING where the
+    dialect supports it, and is written into the already-loaded ``ride``.
+    Returns False (and changes nothing) when the conditions didn't match.
+    """
+    stmt = (
+        update(Ride)
+        .where(Ride.id == ride.id, *conditions)
+        .values(available_seats=Ride.available_seats + delta)
+        .execution_options(synchronize_session=False)
+    )
+    if db.get_bind().dialect.update_returning:
+        seats = (await db.execute(stmt.returning(Ride.available_seats))).scalar()
+        if seats is None:
+            return False
+        set_committed_value(ride, "available_seats", seats)
+        return True
+    
+    if (await db.execute(stmt)).rowcount == 0:
+        return False
+    await db.refresh(ride, ["available_seats"])
+    return True
+
+async def _set_status(db: AsyncSession, booking: Booking, new_status: str, *conditions) -> bool:
+    """Move ``booking`` to ``new_status`` if its row still matches ``conditions``.
+
+    The check and the write are one UPDATE, so of two concurrent transitions
+    (a passenger cancelling while the driver rejects) only one matches and
+    the seats go back once. Returns False when the booking had already moved
+    on, with ``booking.status`` refreshed to where it went.
+    """
+    now = datetime.now()
+    result = await db.execute(
+        update(Booking)
+        .where(Booking.id == booking.id, *conditions)
+        .values(status=new_status, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        await db.refresh(booking, ["status"])
+        return False
+    set_committed_value(booking, "status", new_status)
+    set_committed_value(booking, "updated_at", now)
+    return True
+
+def _already(booking: Booking):
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Booking is already {booking.status}"
+    )
+
 @router.post("/", response_model=BookingResponse)
-def create_booking(
+@query_budget(4)
+async def create_booking(
     booking: BookingCreate, 
-    db: Session = Depends(get_db), 
+    db: AsyncSession = Depends(get_db), 
     current_user: User = Depends(get_current_active_user)
 ):
-    # Get the ride
-    ride = db.query(Ride).filter(Ride.id == booking.ride_id).first()
+    # Get the ride, with the driver the response needs
+    ride = await db.scalar(select(Ride).options(joinedload(Ride.driver)).filter(Ride.id == booking.ride_id))
     if not ride:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -31,18 +101,27 @@ def create_booking(
             detail="You cannot book your own ride"
         )
     
-    # Check if enough seats are available
-    if ride.available_seats < booking.seats:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Not enough seats available. Only {ride.available_seats} left."
-        )
+    # Reserve the seats with a single conditional UPDATE so concurrent bookings
+    # can never oversell the ride: only one statement can take the last seat
+    reserved = await _adjust_seats(
+        db, ride, -booking.seats,
+        Ride.available_seats >= booking.seats,
+        Ride.status == "scheduled"
+    )
     
-    # Check if ride is scheduled
-    if ride.status != "scheduled":
+    if not reserved:
+        await db.rollback()
+        await db.refresh(ride)
+        
+        # Check if ride is scheduled
+        if ride.status != "scheduled":
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Ride is no longer available for booking"
+            )
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Ride is no longer available for booking"
+            detail=f"Not enough seats available. Only {ride.available_seats} left."
         )
     
     # Create booking
@@ -54,58 +133,196 @@ def create_booking(
     )
     
     db.add(db_booking)
+    await db.commit()
+    # Seat counts changed: cached ride reads are stale, and subscribers want to know
+    invalidate_rides()
+    publish_ride(ride)
+    
+    # Build the response from what is already loaded instead of re-reading it
+    set_committed_value(db_booking, "ride", ride)
+    set_committed_value(db_booking, "passenger", current_user)
+    return db_booking
+
+async def _reserve_seats(db: AsyncSession, rides: dict, seats_by_ride: dict) -> list:
+    """Take seats on several scheduled rides in one conditional UPDATE.
+    
+    Returns the ids of rides that couldn't supply their seats; when that list
+    is non-empty the caller must roll back, since other rides were updated.
+    """
+    seats = case(seats_by_ride, value=Ride.id)
+    stmt = (
+        update(Ride)
+        .where(Ride.id.in_(seats_by_ride), Ride.status == "scheduled", Ride.available_seats >= seats)
+        .values(available_seats=Ride.available_seats - seats)
+        .execution_options(synchronize_session=False)
+    )
+    if db.get_bind().dialect.update_returning:
+        updated = dict((await db.execute(stmt.returning(Ride.id, Ride.available_seats))).all())
+    else:
+        if (await db.execute(stmt)).rowcount < len(seats_by_ride):
+            # Report the rides that looked short when loaded
+            short = [
+                ride_id for ride_id, seats_needed in seats_by_ride.items()
+                if rides[ride_id].status != "scheduled" or rides[ride_id].available_seats < seats_needed
+            ]
+            return short or list(seats_by_ride)
+        updated = dict((await db.execute(
+            select(Ride.id, Ride.available_seats).filter(Ride.id.in_(seats_by_ride))
+        )).all())
+    unavailable = [ride_id for ride_id in seats_by_ride if ride_id not in updated]
+    if not unavailable:
+        for ride_id, available in updated.items():
+            set_committed_value(rides[ride_id], "available_seats", available)
+    return unavailable
+
+@router.post("/batch", response_model=List[BookingResponse])
+@query_budget(5)
+async def create_bookings_batch(
+    batch: BatchBookingCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Book seats on several rides, or for several passengers, all or nothing.
+
+    Callers book for themselves; only a ride's driver may book other
+    passengers onto it (say, riders who arranged a seat with them directly).
+    """
+    items = batch.bookings
+    ride_ids = {item.ride_id for item in items}
+    rides = {
+        ride.id: ride for ride in (await db.scalars(
+            select(Ride).options(joinedload(Ride.driver)).filter(Ride.id.in_(ride_ids))
+        )).all()
+    }
+    missing = sorted(ride_ids - rides.keys())
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Ride {missing[0]} not found"
+        )
     
-    # Update available seats
-    ride.available_seats -= booking.seats
-    
-    db.commit()
-    db.refresh(db_booking)
-    
-    # Return booking with relationships loaded
-    result = db.query(Booking).options(
-        joinedload(Booking.passenger),
-        joinedload(Booking.ride).joinedload(Ride.driver)
-    ).filter(Booking.id == db_booking.id).first()
+    # Listed passengers other than the caller must exist and be active
+    passengers = {current_user.id: current_user}
+    other_ids = {item.passenger_id for item in items if item.passenger_id not in (None, current_user.id)}
+    if other_ids:
+        passengers.update({
+            user.id: user for user in (await db.scalars(
+                select(User).filter(User.id.in_(other_ids), User.is_active == True)
+            )).all()
+        })
+    
+    seats_by_ride = {}
+    for item in items:
+        passenger_id = item.passenger_id or current_user.id
+        if passenger_id not in passengers:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Passenger {passenger_id} not found"
+            )
+        if rides[item.ride_id].driver_id == passenger_id:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"The driver of ride {item.ride_id} cannot book it"
+            )
+        if passenger_id != current_user.id and rides[item.ride_id].driver_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"Only the driver of ride {item.ride_id} can book seats on it for someone else"
+            )
+        seats_by_ride[item.ride_id] = seats_by_ride.get(item.ride_id, 0) + item.seats
+    
+    # One conditional UPDATE takes the seats on every ride or on none of them
+    unavailable = await _reserve_seats(db, rides, seats_by_ride)
+    if unavailable:
+        await db.rollback()
+        ride = rides[unavailable[0]]
+        await db.refresh(ride)
+        if ride.status != "scheduled":
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Ride {ride.id} is no longer available for booking"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Not enough seats available on ride {ride.id}. Only {ride.available_seats} left."
+        )
     
-    return result
+    # A single multi-row INSERT; the unit of work would issue one per booking
+    rows = [
+        {
+            "ride_id": item.ride_id,
+            "passenger_id": item.passenger_id or current_user.id,
+            "seats": item.seats,
+            "status": "pending",
+        }
+        for item in items
+    ]
+    inserted = (await db.scalars(insert(Booking).values(rows).returning(Booking))).all()
+    await db.commit()
+    invalidate_rides()
+    for ride in rides.values():
+        publish_ride(ride)
+    
+    # RETURNING order isn't guaranteed; put the bookings back in request order
+    by_key = {}
+    for db_booking in sorted(inserted, key=lambda db_booking: db_booking.id, reverse=True):
+        by_key.setdefault((db_booking.ride_id, db_booking.passenger_id, db_booking.seats), []).append(db_booking)
+    db_bookings = [by_key[(row["ride_id"], row["passenger_id"], row["seats"])].pop() for row in rows]
+    
+    # Rides and passengers are already loaded: build the responses without re-reading them
+    for db_booking in db_bookings:
+        set_committed_value(db_booking, "ride", rides[db_booking.ride_id])
+        set_committed_value(db_booking, "passenger", passengers[db_booking.passenger_id])
+    return json_response(booking_list_adapter, db_bookings)
 
 @router.get("/", response_model=List[BookingResponse])
-def get_my_bookings(
-    db: Session = Depends(get_db),
+@query_budget(2)
+async def get_my_bookings(
+    response: Response,
+    cursor: str = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     # Get bookings where user is the passenger
-    bookings = db.query(Booking).options(
+    stmt = select(Booking).options(
         joinedload(Booking.passenger),
         joinedload(Booking.ride).joinedload(Ride.driver)
-    ).filter(Booking.passenger_id == current_user.id).all()
+    ).filter(Booking.passenger_id == current_user.id)
     
-    return bookings
+    bookings = await paginate(db, stmt, Booking.created_at, Booking.id, response, cursor, limit)
+    return json_response(booking_list_adapter, bookings, response)
 
 @router.get("/as-driver", response_model=List[BookingResponse])
-def get_bookings_as_driver(
-    db: Session = Depends(get_db),
+@query_budget(2)
+async def get_bookings_as_driver(
+    response: Response,
+    cursor: str = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     # Get bookings for rides where user is the driver
-    bookings = db.query(Booking).options(
+    stmt = select(Booking).options(
         joinedload(Booking.passenger),
         joinedload(Booking.ride).joinedload(Ride.driver)
-    ).join(Booking.ride).filter(Ride.driver_id == current_user.id).all()
+    ).join(Booking.ride).filter(Ride.driver_id == current_user.id)
     
-    return bookings
+    bookings = await paginate(db, stmt, Booking.created_at, Booking.id, response, cursor, limit)
+    return json_response(booking_list_adapter, bookings, response)
 
 @router.get("/{booking_id}", response_model=BookingResponse)
-def get_booking(
+@query_budget(2)
+async def get_booking(
     booking_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     # Get the booking
-    booking = db.query(Booking).options(
+    booking = await db.scalar(select(Booking).options(
         joinedload(Booking.passenger),
         joinedload(Booking.ride).joinedload(Ride.driver)
-    ).filter(Booking.id == booking_id).first()
+    ).filter(Booking.id == booking_id))
     
     if not booking:
         raise HTTPException(
@@ -123,16 +340,17 @@ def get_booking(
     return booking
 
 @router.put("/{booking_id}", response_model=BookingResponse)
-def update_booking_status(
+@query_budget(4)
+async def update_booking_status(
     booking_id: int,
     booking_update: BookingUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     # Get the booking
-    booking = db.query(Booking).options(
-        joinedload(Booking.ride)
-    ).filter(Booking.id == booking_id).first()
+    booking = await db.scalar(
+        select(Booking).options(*BOOKING_RESPONSE_OPTIONS).filter(Booking.id == booking_id)
+    )
     
     if not booking:
         raise HTTPException(
@@ -164,37 +382,35 @@ def update_booking_status(
             detail="Invalid status update"
         )
     
-    # Handle seat allocation if booking is cancelled or rejected
-    if booking_update.status in ["cancelled", "rejected"] and booking.status not in ["cancelled", "rejected"]:
-        # Return seats to the ride
-        ride = booking.ride
-        ride.available_seats += booking.seats
-    
-    # Update booking status
-    booking.status = booking_update.status
+    # Update booking status, unless it was already cancelled or rejected (perhaps just now)
+    if not await _set_status(db, booking, booking_update.status, Booking.status.notin_(["cancelled", "rejected"])):
+        raise _already(booking)
     
-    db.commit()
-    db.refresh(booking)
+    # Cancelling or rejecting returns the seats to the ride (atomically, so concurrent bookings aren't overwritten)
+    seats_returned = booking_update.status in ["cancelled", "rejected"]
+    if seats_returned:
+        await _adjust_seats(db, booking.ride, booking.seats)
     
-    # Return booking with relationships loaded
-    result = db.query(Booking).options(
-        joinedload(Booking.passenger),
-        joinedload(Booking.ride).joinedload(Ride.driver)
-    ).filter(Booking.id == booking_id).first()
+    await db.commit()
+    invalidate_rides()
+    if seats_returned:
+        publish_ride(booking.ride)
     
-    return result
+    # Relationships were loaded up front, so the response needs no further queries
+    return booking
 
 @router.put("/{booking_id}/approve", response_model=BookingResponse)
-def approve_booking(
+@query_budget(3)
+async def approve_booking(
     booking_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Approve a booking request (driver only)"""
     # Get the booking with relationships loaded
-    booking = db.query(Booking).options(
-        joinedload(Booking.ride)
-    ).filter(Booking.id == booking_id).first()
+    booking = await db.scalar(
+        select(Booking).options(*BOOKING_RESPONSE_OPTIONS).filter(Booking.id == booking_id)
+    )
     
     if not booking:
         raise HTTPException(
@@ -219,28 +435,23 @@ def approve_booking(
     
     # Update booking status
     booking.status = "confirmed"
-    db.commit()
-    db.refresh(booking)
+    await db.commit()
     
-    # Return with relationships loaded
-    result = db.query(Booking).options(
-        joinedload(Booking.passenger),
-        joinedload(Booking.ride).joinedload(Ride.driver)
-    ).filter(Booking.id == booking_id).first()
-    
-    return result
+    # Relationships were loaded up front, so the response needs no further queries
+    return booking
 
 @router.put("/{booking_id}/reject", response_model=BookingResponse)
-def reject_booking(
+@query_budget(4)
+async def reject_booking(
     booking_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Reject a booking request (driver only)"""
     # Get the booking with relationships loaded
-    booking = db.query(Booking).options(
-        joinedload(Booking.ride)
-    ).filter(Booking.id == booking_id).first()
+    booking = await db.scalar(
+        select(Booking).options(*BOOKING_RESPONSE_OPTIONS).filter(Booking.id == booking_id)
+    )
     
     if not booking:
         raise HTTPException(
@@ -256,26 +467,16 @@ def reject_booking(
             detail="Only the ride driver can reject bookings"
         )
     
-    # Check if booking is in a pending state
-    if booking.status != "pending":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Booking is already {booking.status}"
-        )
-    
-    # Update booking status
-    booking.status = "rejected"
+    # Update booking status if it is still pending
+    if not await _set_status(db, booking, "rejected", Booking.status == "pending"):
+        raise _already(booking)
     
     # Restore available seats in the ride
-    ride.available_seats += booking.seats
+    await _adjust_seats(db, ride, booking.seats)
     
-    db.commit()
-    db.refresh(booking)
+    await db.commit()
+    invalidate_rides()
+    publish_ride(ride)
     
-    # Return with relationships loaded
-    result = db.query(Booking).options(
-        joinedload(Booking.passenger),
-        joinedload(Booking.ride).joinedload(Ride.driver)
-    ).filter(Booking.id == booking_id).first()
-    
-    return result
+    # Relationships were loaded up front, so the response needs no further queries
+    return booking
@@ -0,0 +1,130 @@
+from datetime import datetime
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import and_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.auth import get_current_active_user, principal_cache
+from app.database import get_db
+from app.replicas import get_read_db
+from app.http_cache import invalidate_rides
+from app.models.database_models import Booking, Rating, Ride, User
+from app.models.schemas import RatingCreate, RatingResponse
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, paginate
+from app.query_guard import query_budget
+from app.serialization import json_response, rating_list_adapter
+
+router = APIRouter()
+
+# Bookings that mean the passenger actually shared the ride
+RATEABLE_BOOKINGS = ("confirmed", "completed")
+
+@router.post("/", response_model=RatingResponse)
+@query_budget(4)
+async def create_rating(
+    rating: RatingCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Rate the driver of a ride you rode on, or a rider on a ride you drove."""
+    if rating.rated_id == current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="You cannot rate yourself"
+        )
+
+    # The ride, plus which of the two users held a seat on it, in one statement
+    rows = (await db.execute(
+        select(Ride.driver_id, Ride.status, Ride.departure_time, Booking.passenger_id)
+        .outerjoin(Booking, and_(
+            Booking.ride_id == Ride.id,
+            Booking.passenger_id.in_((current_user.id, rating.rated_id)),
+            Booking.status.in_(RATEABLE_BOOKINGS)
+        ))
+        .filter(Ride.id == rating.ride_id)
+    )).all()
+    if not rows:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Ride not found"
+        )
+
+    driver_id, ride_status, departure_time = rows[0][:3]
+    passengers = {row.passenger_id for row in rows}
+    if current_user.id == driver_id and rating.rated_id in passengers:
+        rated_as = "rider"
+    elif rating.rated_id == driver_id and current_user.id in passengers:
+        rated_as = "driver"
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You can only rate people you shared this ride with"
+        )
+    if ride_status == "cancelled" or (ride_status != "completed" and departure_time > datetime.now()):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="You can rate a ride once it has taken place"
+        )
+
+    db_rating = Rating(
+        rater_id=current_user.id,
+        rated_id=rating.rated_id,
+        ride_id=rating.ride_id,
+        rating=rating.rating,
+        comment=rating.comment,
+        rated_as=rated_as
+    )
+    db.add(db_rating)
+    try:
+        await db.flush()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="You have already rated this person for this ride"
+        )
+
+    # Keep the aggregates in step with the insert: same transaction, and an
+    # increment rather than a recount, so concurrent ratings can't be lost
+    rated_email = await db.scalar(
+        update(User)
+        .where(User.id == rating.rated_id)
+        .values(rating_count=User.rating_count + 1, rating_sum=User.rating_sum + rating.rating)
+        .returning(User.email)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    # A Core UPDATE skips the ORM hooks that drop cached principals, and the
+    # cached user's average would end up in their own ride responses
+    principal_cache.invalidate(rated_email)
+    # Ride responses embed the driver's average rating
+    invalidate_rides()
+
+    set_committed_value(db_rating, "rater", current_user)
+    return db_rating
+
+@router.get("/user/{user_id}", response_model=List[RatingResponse])
+@query_budget(1)
+async def get_user_ratings(
+    user_id: int,
+    response: Response,
+    cursor: str = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Ratings a user has received; the average and count are on the user itself."""
+    stmt = select(Rating).options(joinedload(Rating.rater)).filter(Rating.rated_id == user_id)
+    ratings = await paginate(db, stmt, Rating.created_at, Rating.id, response, cursor, limit)
+    return json_response(rating_list_adapter, ratings, response)
+
+@router.get("/ride/{ride_id}", response_model=List[RatingResponse])
+@query_budget(1)
+async def get_ride_ratings(ride_id: int, db: AsyncSession = Depends(get_read_db)):
+    ratings = (await db.scalars(
+        select(Rating).options(joinedload(Rating.rater)).filter(Rating.ride_id == ride_id).order_by(Rating.id)
+    )).all()
+    return json_response(rating_list_adapter, ratings)
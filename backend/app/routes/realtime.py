@@ -0,0 +1,42 @@
+from typing import List
+
+from fastapi import APIRouter, HTTPException, Query, status
+
+from app import geo, realtime
+
+# Most rides a single stream can follow
+MAX_SUBSCRIBED_RIDES = 100
+
+router = APIRouter()
+
+@router.get("/rides")
+async def ride_updates(
+    ride_id: List[int] = Query([]),
+    lat: float = Query(None, ge=-90, le=90),
+    lng: float = Query(None, ge=-180, le=180),
+    radius_km: float = Query(2.0, gt=0, le=50)
+):
+    """Server-sent events for changes to the given rides and/or rides starting or ending near a point."""
+    if len(ride_id) > MAX_SUBSCRIBED_RIDES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A stream can follow at most {MAX_SUBSCRIBED_RIDES} rides"
+        )
+    if (lat is None) != (lng is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="An area needs both lat and lng"
+        )
+    cells = geo.covering_cells(lat, lng, radius_km) if lat is not None else []
+    if not ride_id and not cells:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Subscribe to at least one ride_id or an area"
+        )
+
+    subscription = realtime.broadcaster.subscribe(ride_id, cells)
+    return realtime.EventStreamResponse(
+        realtime.broadcaster, subscription,
+        # Don't let proxies buffer or cache the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
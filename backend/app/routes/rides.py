@@ -1,19 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
 from typing import List
+import heapq
 from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
 
+from app import geo, matching
 from app.database import get_db
+from app.replicas import get_read_db
 from app.models.database_models import Ride, User
-from app.models.schemas import RideCreate, RideResponse, RideUpdate
+from app.models.schemas import RideCreate, RideMatchResponse, RideResponse, RideUpdate
 from app.auth import get_current_active_user
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, paginate
+from app.serialization import json_response, ride_adapter, ride_list_adapter, ride_match_list_adapter
+from app.http_cache import cache_generation, cache_ride_response, cached_ride_response, invalidate_rides
+from app.text_search import get_text_search
+from app.query_guard import query_budget
+from app.realtime import publish_ride
+
+# Most rides a match request can ask for
+MAX_MATCHES = 50
 
 router = APIRouter()
 
 @router.post("/", response_model=RideResponse)
-def create_ride(
+@query_budget(2)
+async def create_ride(
     ride: RideCreate, 
-    db: Session = Depends(get_db), 
+    db: AsyncSession = Depends(get_db), 
     current_user: User = Depends(get_current_active_user)
 ):
     # Check if user is a driver or both
@@ -27,46 +44,91 @@ def create_ride(
         driver_id=current_user.id,
         origin=ride.origin,
         destination=ride.destination,
+        origin_lat=ride.origin_lat,
+        origin_lng=ride.origin_lng,
+        destination_lat=ride.destination_lat,
+        destination_lng=ride.destination_lng,
         departure_time=ride.departure_time,
         available_seats=ride.available_seats,
         price=ride.price,
-        description=ride.description
+        description=ride.description,
+        route_polyline=geo.encode_route(ride.route) if ride.route else None
     )
     
+    # All column defaults are client-side, so after the INSERT the instance is
+    # complete and the response can be built without re-reading the row
     db.add(db_ride)
-    db.commit()
-    db.refresh(db_ride)
-    
-    # Load the ride with driver information
-    result = db.query(Ride).options(joinedload(Ride.driver)).filter(Ride.id == db_ride.id).first()
+    await db.commit()
+    invalidate_rides()
+    # Area subscribers see new rides in their cells without polling
+    publish_ride(db_ride)
     
-    return result
+    # The driver is the current user; attach it without another query
+    set_committed_value(db_ride, "driver", current_user)
+    return db_ride
 
 @router.get("/", response_model=List[RideResponse])
-def get_rides(
+@query_budget(1)
+async def get_rides(
+    request: Request,
+    response: Response,
+    cursor: str = None,
     skip: int = 0, 
-    limit: int = 100, 
-    db: Session = Depends(get_db)
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), 
+    db: AsyncSession = Depends(get_read_db)
 ):
-    rides = db.query(Ride).options(joinedload(Ride.driver)).offset(skip).limit(limit).all()
-    return rides
+    cached = cached_ride_response(request)
+    if cached is not None:
+        return cached
+    generation = cache_generation()
+    
+    stmt = select(Ride).options(joinedload(Ride.driver))
+    rides = await paginate(db, stmt, Ride.departure_time, Ride.id, response, cursor, limit, skip)
+    return cache_ride_response(
+        request, json_response(ride_list_adapter, rides, response), generation=generation
+    )
 
 @router.get("/search", response_model=List[RideResponse])
-def search_rides(
+@query_budget(2)
+async def search_rides(
+    request: Request,
     origin: str = None,
     destination: str = None,
     min_date: str = None,
     max_date: str = None,
     max_price: float = None,
     min_seats: int = 1,
-    db: Session = Depends(get_db)
+    origin_lat: float = Query(None, ge=-90, le=90),
+    origin_lng: float = Query(None, ge=-180, le=180),
+    destination_lat: float = Query(None, ge=-90, le=90),
+    destination_lng: float = Query(None, ge=-180, le=180),
+    radius_km: float = Query(2.0, gt=0, le=100),
+    sort: str = Query(None, pattern="^(departure_time|price|distance|relevance)$"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    query = db.query(Ride).options(joinedload(Ride.driver))
+    if format == "json":
+        cached = cached_ride_response(request)
+        if cached is not None:
+            return cached
+    generation = cache_generation()
+    
+    query = select(Ride).options(joinedload(Ride.driver))
     
-    if origin:
-        query = query.filter(Ride.origin.ilike(f"%{origin}%"))
-    if destination:
-        query = query.filter(Ride.destination.ilike(f"%{destination}%"))
+    # Coordinate search: narrow to nearby geohash cells, then rank by exact distance
+    near_origin = origin_lat is not None and origin_lng is not None
+    near_destination = destination_lat is not None and destination_lng is not None
+    if near_origin:
+        query = query.filter(geo.geohash_filter(Ride.origin_geohash, origin_lat, origin_lng, radius_km))
+    if near_destination:
+        query = query.filter(
+            geo.geohash_filter(Ride.destination_geohash, destination_lat, destination_lng, radius_km)
+        )
+    
+    text_search = await get_text_search(db)
+    if origin or destination:
+        query = await text_search.filter(db, query, origin, destination, ranked=sort == "relevance")
     if min_date:
         query = query.filter(Ride.departure_time >= min_date)
     if max_date:
@@ -79,31 +141,238 @@ def search_rides(
     # Only return scheduled rides
     query = query.filter(Ride.status == "scheduled")
     
-    rides = query.all()
-    return rides
+    if sort is None:
+        sort = "distance" if near_origin or near_destination else "departure_time"
+    if sort == "distance" and not (near_origin or near_destination):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Sorting by distance needs origin or destination coordinates"
+        )
+    if sort == "relevance" and not (origin or destination):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Sorting by relevance needs an origin or destination search term"
+        )
+    if sort == "departure_time":
+        query = query.order_by(Ride.departure_time, Ride.id)
+    elif sort == "price":
+        query = query.order_by(Ride.price, Ride.departure_time, Ride.id)
+    
+    def results():
+        return _top_rides(
+            db, query, sort, limit, text_search, origin, destination, radius_km,
+            (origin_lat, origin_lng) if near_origin else None,
+            (destination_lat, destination_lng) if near_destination else None,
+        )
+    
+    if format == "ndjson":
+        return StreamingResponse(_ndjson_stream(db, results), media_type="application/x-ndjson")
+    rides = [ride async for ride in results()]
+    return cache_ride_response(
+        request, json_response(ride_list_adapter, rides), generation=generation
+    )
+
+@router.get("/match", response_model=List[RideMatchResponse])
+@query_budget(3)
+async def match_rides(
+    origin_lat: float = Query(..., ge=-90, le=90),
+    origin_lng: float = Query(..., ge=-180, le=180),
+    destination_lat: float = Query(..., ge=-90, le=90),
+    destination_lng: float = Query(..., ge=-180, le=180),
+    departure_time: datetime = Query(...),
+    window_minutes: int = Query(60, ge=1, le=24 * 60),
+    radius_km: float = Query(3.0, gt=0, le=50),
+    seats: int = Query(1, ge=1),
+    max_price: float = None,
+    limit: int = Query(10, ge=1, le=MAX_MATCHES),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Rank rides for a rider's trip by distance, departure time, price and driver rating."""
+    index = await matching.get_index(db)
+    # Ask for spares: the index may be a few seconds behind on seats and status
+    ids, scores, pickup, dropoff = index.match(
+        (origin_lat, origin_lng), (destination_lat, destination_lng), departure_time,
+        window_minutes, radius_km, seats, max_price, limit * 2
+    )
+    return json_response(
+        ride_match_list_adapter, await _load_matches(db, seats, limit, ids, scores, pickup, dropoff)
+    )
+
+@router.get("/corridor", response_model=List[RideMatchResponse])
+@query_budget(3)
+async def match_rides_along_route(
+    origin_lat: float = Query(..., ge=-90, le=90),
+    origin_lng: float = Query(..., ge=-180, le=180),
+    destination_lat: float = Query(..., ge=-90, le=90),
+    destination_lng: float = Query(..., ge=-180, le=180),
+    departure_time: datetime = Query(...),
+    window_minutes: int = Query(60, ge=1, le=24 * 60),
+    max_distance_m: float = Query(500, gt=0, le=5000),
+    seats: int = Query(1, ge=1),
+    max_price: float = None,
+    limit: int = Query(10, ge=1, le=MAX_MATCHES),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Rank rides whose route passes near the rider's pickup and then their drop-off."""
+    index = await matching.get_index(db)
+    ids, scores, pickup, dropoff, pickup_along, dropoff_along = index.corridor(
+        (origin_lat, origin_lng), (destination_lat, destination_lng), departure_time,
+        window_minutes, max_distance_m / 1000, seats, max_price, limit * 2
+    )
+    return json_response(ride_match_list_adapter, await _load_matches(
+        db, seats, limit, ids, scores, pickup, dropoff,
+        pickup_along_km=pickup_along, dropoff_along_km=dropoff_along
+    ))
+
+async def _load_matches(db, seats, limit, ids, scores, pickup, dropoff, **extra):
+    """Load the matched rides in rank order, dropping any the index was stale about."""
+    if len(ids) == 0:
+        return []
+    
+    # Filtering on id alone keeps this a primary-key lookup: with a status
+    # condition SQLite prefers the status index and scans every scheduled ride
+    rides = {
+        ride.id: ride for ride in (await db.scalars(
+            select(Ride).options(joinedload(Ride.driver)).filter(Ride.id.in_(ids.tolist()))
+        )).all()
+    }
+    extra = {name: values.tolist() for name, values in extra.items()}
+    matches = []
+    for position, (ride_id, score, pickup_km, dropoff_km) in enumerate(zip(
+        ids.tolist(), scores.tolist(), pickup.tolist(), dropoff.tolist()
+    )):
+        ride = rides.get(ride_id)
+        if ride is None or ride.status != "scheduled" or ride.available_seats < seats:
+            continue
+        ride.score = round(score, 4)
+        ride.pickup_km = round(pickup_km, 3)
+        ride.dropoff_km = round(dropoff_km, 3)
+        for name, values in extra.items():
+            setattr(ride, name, round(values[position], 3))
+        matches.append(ride)
+        if len(matches) == limit:
+            break
+    return matches
+
+# Rows fetched per round-trip when results have to be filtered or ranked in Python
+SEARCH_BATCH_SIZE = 500
+
+async def _top_rides(db, query, sort, limit, text_search, origin, destination, radius_km, origin_point, destination_point):
+    """Run the search query and yield at most ``limit`` rides in the requested order.
+
+    Orderings SQL can express are pushed into ORDER BY/LIMIT. Distance (and
+    relevance on backends without SQL ranking) is computed while streaming
+    rows with yield_per into a bounded top-k heap, so memory stays flat.
+    """
+    near = origin_point is not None or destination_point is not None
+    if sort == "distance":
+        rank_key = lambda ride: (ride.distance_km, ride.departure_time, ride.id)
+    elif sort == "relevance":
+        rank_key = text_search.relevance_key(origin, destination)
+    else:
+        rank_key = None
+    
+    if not near and rank_key is None:
+        for ride in (await db.scalars(query.limit(limit))).all():
+            yield ride
+        return
+    
+    result = await db.stream_scalars(query.execution_options(yield_per=SEARCH_BATCH_SIZE))
+    try:
+        rides = _within_radius(result, radius_km, origin_point, destination_point) if near else result
+        if rank_key is None:
+            # Already in SQL order; stop reading once we have enough
+            count = 0
+            async for ride in rides:
+                yield ride
+                count += 1
+                if count >= limit:
+                    break
+            return
+        
+        # Bounded max-heap of the best `limit` rides seen so far
+        heap = []
+        async for ride in rides:
+            item = _Ranked(rank_key(ride), ride)
+            if len(heap) < limit:
+                heapq.heappush(heap, item)
+            elif heap[0].key > item.key:
+                heapq.heapreplace(heap, item)
+        for item in sorted(heap, key=lambda item: item.key):
+            yield item.ride
+    finally:
+        await result.close()
+
+class _Ranked:
+    """Heap entry ordered worst-first, so heap[0] is the ride to evict."""
+    __slots__ = ("key", "ride")
+    
+    def __init__(self, key, ride):
+        self.key = key
+        self.ride = ride
+    
+    def __lt__(self, other):
+        return self.key > other.key
+
+async def _within_radius(rides, radius_km, origin_point, destination_point):
+    """Yield rides within the radius, with distance_km set to the pickup (else drop-off) distance."""
+    async for ride in rides:
+        distance = 0.0
+        if origin_point:
+            pickup = geo.haversine_km(origin_point[0], origin_point[1], ride.origin_lat, ride.origin_lng)
+            if pickup > radius_km:
+                continue
+            distance = pickup
+        if destination_point:
+            dropoff = geo.haversine_km(
+                destination_point[0], destination_point[1], ride.destination_lat, ride.destination_lng
+            )
+            if dropoff > radius_km:
+                continue
+            if not origin_point:
+                distance = dropoff
+        ride.distance_km = round(distance, 3)
+        yield ride
+
+async def _ndjson_stream(db, results):
+    # The get_db dependency has already closed the session by the time the body
+    # streams; querying reopens it on a fresh connection, so close it when done.
+    try:
+        async for ride in results():
+            yield RideResponse.model_validate(ride, from_attributes=True).model_dump_json() + "\n"
+    finally:
+        await db.close()
 
 @router.get("/{ride_id}", response_model=RideResponse)
-def get_ride(
+@query_budget(1)
+async def get_ride(
     ride_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_read_db)
 ):
-    ride = db.query(Ride).options(joinedload(Ride.driver)).filter(Ride.id == ride_id).first()
+    cached = cached_ride_response(request)
+    if cached is not None:
+        return cached
+    generation = cache_generation()
+    
+    ride = await db.scalar(select(Ride).options(joinedload(Ride.driver)).filter(Ride.id == ride_id))
     if not ride:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Ride not found"
         )
-    return ride
+    return cache_ride_response(request, json_response(ride_adapter, ride), ride.updated_at, generation)
 
 @router.put("/{ride_id}", response_model=RideResponse)
-def update_ride(
+@query_budget(3)
+async def update_ride(
     ride_id: int,
     ride_update: RideUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     # Get the ride
-    db_ride = db.query(Ride).filter(Ride.id == ride_id).first()
+    db_ride = await db.scalar(select(Ride).filter(Ride.id == ride_id))
     
     if not db_ride:
         raise HTTPException(
@@ -120,25 +389,29 @@ def update_ride(
     
     # Update fields if provided
     update_data = ride_update.dict(exclude_unset=True)
+    if "route" in update_data:
+        route = update_data.pop("route")
+        db_ride.route_polyline = geo.encode_route(route) if route else None
     for key, value in update_data.items():
         setattr(db_ride, key, value)
     
-    db.commit()
-    db.refresh(db_ride)
-    
-    # Load the ride with driver information
-    result = db.query(Ride).options(joinedload(Ride.driver)).filter(Ride.id == ride_id).first()
+    await db.commit()
+    invalidate_rides()
+    publish_ride(db_ride)
     
-    return result
+    # The driver is the current user; attach it without another query
+    set_committed_value(db_ride, "driver", current_user)
+    return db_ride
 
 @router.delete("/{ride_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_ride(
+@query_budget(3)
+async def delete_ride(
     ride_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     # Get the ride
-    db_ride = db.query(Ride).filter(Ride.id == ride_id).first()
+    db_ride = await db.scalar(select(Ride).filter(Ride.id == ride_id))
     
     if not db_ride:
         raise HTTPException(
@@ -155,6 +428,8 @@ def delete_ride(
     
     # Set ride status to cancelled
     db_ride.status = "cancelled"
-    db.commit()
+    await db.commit()
+    invalidate_rides()
+    publish_ride(db_ride)
     
     return None
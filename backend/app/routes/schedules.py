@@ -0,0 +1,125 @@
+from datetime import date, datetime
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app import recurring
+from app.auth import get_current_active_user
+from app.database import get_db
+from app.replicas import get_read_db
+from app.http_cache import invalidate_rides
+from app.realtime import publish_ride
+from app.models.database_models import Ride, RideSchedule, User
+from app.models.schemas import RideScheduleCreate, RideScheduleResponse
+from app.query_guard import query_budget
+
+router = APIRouter()
+
+@router.post("/", response_model=RideScheduleResponse)
+@query_budget(4)
+async def create_schedule(
+    schedule: RideScheduleCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Create a recurring ride; its occurrences in the rolling window are created right away."""
+    if current_user.role not in ["driver", "both"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only drivers can create rides"
+        )
+
+    starts_on = schedule.starts_on or date.today()
+    if schedule.ends_on is not None and schedule.ends_on < starts_on:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ends_on must not be before starts_on"
+        )
+
+    db_schedule = RideSchedule(
+        driver_id=current_user.id,
+        origin=schedule.origin,
+        destination=schedule.destination,
+        origin_lat=schedule.origin_lat,
+        origin_lng=schedule.origin_lng,
+        destination_lat=schedule.destination_lat,
+        destination_lng=schedule.destination_lng,
+        departure_time=schedule.departure_time,
+        weekdays=recurring.weekday_mask(schedule.days),
+        starts_on=starts_on,
+        ends_on=schedule.ends_on,
+        available_seats=schedule.available_seats,
+        price=schedule.price,
+        description=schedule.description,
+        is_active=True
+    )
+    db.add(db_schedule)
+    await db.flush()
+
+    until = recurring.horizon()
+    created = await recurring.materialize(db, [db_schedule], until)
+    await db.commit()
+    invalidate_rides()
+    for ride in created:
+        publish_ride(ride)
+
+    set_committed_value(db_schedule, "materialized_until", until)
+    return db_schedule
+
+@router.get("/", response_model=List[RideScheduleResponse])
+@query_budget(2)
+async def get_my_schedules(
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    return (await db.scalars(
+        select(RideSchedule)
+        .filter(RideSchedule.driver_id == current_user.id)
+        .order_by(RideSchedule.created_at, RideSchedule.id)
+    )).all()
+
+@router.delete("/{schedule_id}", status_code=status.HTTP_204_NO_CONTENT)
+@query_budget(4)
+async def delete_schedule(
+    schedule_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Stop a recurring ride and cancel its upcoming occurrences."""
+    db_schedule = await db.scalar(select(RideSchedule).filter(RideSchedule.id == schedule_id))
+
+    if not db_schedule:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Schedule not found"
+        )
+
+    if db_schedule.driver_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only the ride creator can delete this schedule"
+        )
+
+    db_schedule.is_active = False
+    # Cancel the materialized future occurrences in one statement; RETURNING
+    # hands back the cancelled rides so subscribers can be told about them
+    cancelled = (await db.scalars(
+        update(Ride)
+        .where(
+            Ride.schedule_id == schedule_id,
+            Ride.status == "scheduled",
+            Ride.departure_time > datetime.now()
+        )
+        .values(status="cancelled")
+        .returning(Ride)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )).all()
+    await db.commit()
+    invalidate_rides()
+    for ride in cancelled:
+        publish_ride(ride)
+
+    return None
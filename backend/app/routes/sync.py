@@ -0,0 +1,113 @@
+"""Delta sync of the caller's rides and bookings.
+
+GET /api/bookings/ and /as-driver return a user's whole history on every
+refresh. A client that keeps a local copy can instead call
+``GET /api/sync?since=<cursor>`` and get only the rides and bookings that
+were created or changed (including cancellations) after the cursor.
+
+Every insert or update of a ride or booking is stamped by the database with
+the next number from one counter (``change_seq``, see CHANGE_SEQUENCE_DDL)
+and the time it was taken (``changed_at``). Each query below is a range
+scan over ``change_seq`` on a ``(owner, change_seq)`` index, so a sync costs
+roughly the number of changes since the cursor, not the size of the history.
+
+On PostgreSQL the numbers come from a sequence and are taken in statement
+order, not commit order: a transaction still open when a later number
+commits would be skipped by a cursor already past it. So a change is only
+returned once it is SYNC_VISIBILITY_SECONDS old by the database's clock, the
+one that stamped it. That bounds the skip, it doesn't rule it out: a
+transaction that commits more than SYNC_VISIBILITY_SECONDS after its trigger
+fired lands behind cursors that have already moved on, and those clients
+never see that change. The window has to outlast the longest write
+transaction (the API's commit within milliseconds; keep migrations and
+scripts that write rides or bookings short, or run them while sync is idle).
+"""
+import os
+from datetime import timedelta
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from app.database import DATABASE_URL
+from app.replicas import get_read_db
+from app.models.database_models import Booking, Ride, User
+from app.models.schemas import SyncResponse
+from app.auth import get_current_active_user
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.serialization import json_response, sync_adapter
+from app.query_guard import query_budget
+
+router = APIRouter()
+
+# Keep this longer than any write transaction. SQLite runs one writer at a
+# time, so its numbers are already in commit order and need no window.
+SYNC_VISIBILITY_SECONDS = float(
+    os.getenv("SYNC_VISIBILITY_SECONDS", "0" if DATABASE_URL.startswith("sqlite") else "5")
+)
+
+
+def _settled_before(dialect):
+    """The database's time SYNC_VISIBILITY_SECONDS ago, in the form changed_at is stored."""
+    if dialect == "sqlite":
+        return func.strftime("%Y-%m-%d %H:%M:%f000", "now", f"-{SYNC_VISIBILITY_SECONDS} seconds")
+    return func.now() - timedelta(seconds=SYNC_VISIBILITY_SECONDS)
+
+@router.get("", response_model=SyncResponse)
+@query_budget(3)
+async def sync(
+    since: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Rides and bookings the caller drives, booked or was booked on, changed after ``since``.
+
+    Start with ``since=0`` for a full copy. Changes come oldest first, at most
+    ``limit`` of them; while ``has_more`` is set, call again with ``cursor``.
+    """
+    # Changes too recent to be sure every earlier number has committed wait for the next sync
+    settled = _settled_before(db.get_bind().dialect.name)
+
+    # Rides the caller drives or has a booking on
+    booked_rides = select(Booking.ride_id).filter(Booking.passenger_id == current_user.id)
+    rides = (await db.scalars(
+        select(Ride).options(joinedload(Ride.driver))
+        .filter(
+            Ride.change_seq > since,
+            Ride.changed_at <= settled,
+            or_(Ride.driver_id == current_user.id, Ride.id.in_(booked_rides))
+        )
+        .order_by(Ride.change_seq)
+        .limit(limit + 1)
+    )).all()
+
+    # The caller's own bookings and the bookings on rides they drive
+    driven_rides = select(Ride.id).filter(Ride.driver_id == current_user.id)
+    bookings = (await db.scalars(
+        select(Booking).options(
+            joinedload(Booking.passenger),
+            joinedload(Booking.ride).joinedload(Ride.driver)
+        )
+        .filter(
+            Booking.change_seq > since,
+            Booking.changed_at <= settled,
+            or_(Booking.passenger_id == current_user.id, Booking.ride_id.in_(driven_rides))
+        )
+        .order_by(Booking.change_seq)
+        .limit(limit + 1)
+    )).all()
+
+    # Both lists are in change order on one shared sequence: keep the oldest
+    # ``limit`` changes overall so the cursor never skips one
+    changes = sorted([*rides, *bookings], key=lambda row: row.change_seq)
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    cursor = changes[-1].change_seq if changes else since
+    return json_response(sync_adapter, {
+        "rides": [row for row in changes if isinstance(row, Ride)],
+        "bookings": [row for row in changes if isinstance(row, Booking)],
+        "cursor": cursor,
+        "has_more": has_more,
+    })
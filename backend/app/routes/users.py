@@ -1,23 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from datetime import timedelta
 
 from app.database import get_db
+from app.replicas import get_read_db
 from app.models.database_models import User
 from app.models.schemas import UserCreate, UserResponse, Token
 from app.auth import (
-    get_password_hash, authenticate_user, create_access_token,
+    authenticate_user, create_access_token,
     ACCESS_TOKEN_EXPIRE_MINUTES, get_current_active_user
 )
+from app.passwords import hash_password_async
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, paginate
+from app.serialization import json_response, user_list_adapter
+from app.query_guard import query_budget
 
 router = APIRouter()
 
 @router.post("/register", response_model=UserResponse)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
+@query_budget(3)
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
     # Check if user already exists
-    db_user = db.query(User).filter(User.email == user.email).first()
+    db_user = await db.scalar(select(User).filter(User.email == user.email))
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -25,7 +32,7 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Create new user
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await hash_password_async(user.password)
     db_user = User(
         name=user.name,
         email=user.email,
@@ -36,15 +43,16 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
     
     # Save user to database
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     
     return db_user
 
 @router.post("/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+@query_budget(2)
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     # Authenticate user
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -61,12 +69,14 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=UserResponse)
-def get_current_user_profile(current_user: User = Depends(get_current_active_user)):
+@query_budget(1)
+async def get_current_user_profile(current_user: User = Depends(get_current_active_user)):
     return current_user
 
 @router.get("/{user_id}", response_model=UserResponse)
-def get_user_by_id(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+@query_budget(1)
+async def get_user_by_id(user_id: int, db: AsyncSession = Depends(get_read_db)):
+    user = await db.scalar(select(User).filter(User.id == user_id))
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, 
@@ -75,11 +85,14 @@ def get_user_by_id(user_id: int, db: Session = Depends(get_db)):
     return user
 
 @router.get("/", response_model=List[UserResponse])
-def get_users(
+@query_budget(2)
+async def get_users(
+    response: Response,
+    cursor: str = None,
     skip: int = 0, 
-    limit: int = 100, 
-    db: Session = Depends(get_db),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), 
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    users = db.query(User).offset(skip).limit(limit).all()
-    return users
+    users = await paginate(db, select(User), User.created_at, User.id, response, cursor, limit, skip)
+    return json_response(user_list_adapter, users, response)
@@ -0,0 +1,44 @@
+"""Fast JSON responses for list (and cached detail) endpoints.
+
+FastAPI's default path validates the returned ORM objects against the
+response model, dumps them back to Python structures and then runs the
+stdlib JSON encoder over the result. For lists of nested rides and bookings
+that is a visible share of request CPU, so list endpoints use adapters built
+once at import time instead: one from_attributes validation pass, then
+pydantic-core writes the JSON bytes directly.
+
+Endpoints keep their ``response_model`` so the OpenAPI schema is unchanged.
+"""
+from typing import List
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+from app.models.schemas import (
+    BookingResponse, RatingResponse, RideMatchResponse, RideResponse, SyncResponse, UserResponse
+)
+
+ride_list_adapter = TypeAdapter(List[RideResponse])
+booking_list_adapter = TypeAdapter(List[BookingResponse])
+user_list_adapter = TypeAdapter(List[UserResponse])
+ride_adapter = TypeAdapter(RideResponse)
+ride_match_list_adapter = TypeAdapter(List[RideMatchResponse])
+sync_adapter = TypeAdapter(SyncResponse)
+rating_list_adapter = TypeAdapter(List[RatingResponse])
+
+
+class PreserializedJSONResponse(Response):
+    """JSON response whose body is already encoded bytes."""
+    media_type = "application/json"
+
+
+def json_response(adapter: TypeAdapter, rows, response: Response = None) -> PreserializedJSONResponse:
+    """Serialize ORM rows (or a single object) with a precompiled adapter.
+
+    Headers already set on the endpoint's injected ``response`` (such as the
+    next-page cursor) are carried over, since FastAPI drops them when an
+    endpoint returns its own Response.
+    """
+    models = adapter.validate_python(rows, from_attributes=True)
+    headers = dict(response.headers) if response is not None else None
+    return PreserializedJSONResponse(content=adapter.dump_json(models), headers=headers)
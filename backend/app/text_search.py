@@ -0,0 +1,267 @@
+"""Free-text search over ride origin/destination.
+
+The substring semantics of the original ``ilike '%term%'`` filters are kept,
+but each dialect answers them from an index instead of a table scan:
+
+* Postgres: ``pg_trgm`` GIN indexes, which the planner uses for ``ILIKE``
+  directly; relevance is ``similarity()``.
+* SQLite: an external-content FTS5 table with the ``trigram`` tokenizer
+  (kept in sync by triggers); relevance is ``bm25()``.
+* Anything else, or a database that hasn't been migrated yet: an in-process
+  trigram index that narrows the candidate ids before the ``ilike`` check.
+
+Terms shorter than three characters have no trigrams and fall back to a
+plain ``ilike``.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import Float, Integer, event, func, select, text
+from sqlalchemy.orm import Session
+
+from app.models.database_models import Ride
+
+TEXT_SEARCH_BACKEND = os.getenv("TEXT_SEARCH_BACKEND")  # force "postgres", "sqlite" or "memory"
+
+_SEARCH_FIELDS = ("origin", "destination")
+
+
+def _trigrams(value: str):
+    value = value.lower()
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+class TextSearchBackend:
+    name = "base"
+    ranks_in_sql = True
+
+    async def filter(self, db, stmt, origin: str = None, destination: str = None, ranked: bool = False):
+        """Restrict a Ride select to matching rows, ordered by relevance when ranked."""
+        raise NotImplementedError
+
+    def relevance_key(self, origin: str = None, destination: str = None):
+        """Sort key (lower is better) for backends that rank fetched rides in Python."""
+        return None
+
+
+class PostgresTrigramBackend(TextSearchBackend):
+    name = "postgres"
+
+    async def filter(self, db, stmt, origin=None, destination=None, ranked=False):
+        score = None
+        for field, term in zip(_SEARCH_FIELDS, (origin, destination)):
+            if not term:
+                continue
+            column = getattr(Ride, field)
+            stmt = stmt.filter(column.ilike(f"%{term}%"))
+            similarity = func.similarity(column, term)
+            score = similarity if score is None else score + similarity
+        if ranked and score is not None:
+            stmt = stmt.order_by(score.desc(), Ride.id)
+        return stmt
+
+
+class SqliteFtsBackend(TextSearchBackend):
+    name = "sqlite"
+
+    @staticmethod
+    def _phrase(field, term):
+        return '%s : "%s"' % (field, term.replace('"', '""'))
+
+    async def filter(self, db, stmt, origin=None, destination=None, ranked=False):
+        clauses = []
+        for field, term in zip(_SEARCH_FIELDS, (origin, destination)):
+            if not term:
+                continue
+            if len(term) < 3:
+                stmt = stmt.filter(getattr(Ride, field).ilike(f"%{term}%"))
+            else:
+                clauses.append(self._phrase(field, term))
+        if not clauses:
+            return stmt
+
+        matches = (
+            text("SELECT rowid AS ride_id, bm25(rides_fts) AS score FROM rides_fts WHERE rides_fts MATCH :match")
+            .bindparams(match=" AND ".join(clauses))
+            .columns(ride_id=Integer, score=Float)
+            .subquery("fts_matches")
+        )
+        stmt = stmt.join(matches, matches.c.ride_id == Ride.id)
+        if ranked:
+            # bm25() is lower-is-better
+            stmt = stmt.order_by(matches.c.score, Ride.id)
+        return stmt
+
+
+class InMemoryTrigramBackend(TextSearchBackend):
+    """Process-local trigram index over ride ids.
+
+    Rows written through this process's ORM are added as they flush. Bulk
+    inserts (recurring rides) don't go through the unit of work, so a session
+    that commits one marks the index stale and the next search rebuilds it; the
+    whole index is also rebuilt every REFRESH_SECONDS to pick up writes from
+    other workers and scripts. Postings are only ever added between rebuilds, so
+    the index over-approximates and the ``ilike`` check removes stale candidates.
+    Rides added while a rebuild reads the table are carried over into the new
+    index, and a bulk insert committed mid-rebuild leaves it marked stale.
+
+    A term common enough to match more than MAX_CANDIDATES rides isn't narrowing
+    much, and the id list would run into SQLite's bound-parameter limit, so such
+    terms fall back to the plain ``ilike``.
+    """
+    name = "memory"
+    ranks_in_sql = False
+    REFRESH_SECONDS = 300
+    MAX_CANDIDATES = 500
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = {field: defaultdict(set) for field in _SEARCH_FIELDS}
+        self._texts = {}
+        self._loaded_at = None
+        # One log per rebuild in progress, of the writes it may have read too early to see
+        self._load_logs = []
+
+    @staticmethod
+    def _build(rows):
+        postings = {field: defaultdict(set) for field in _SEARCH_FIELDS}
+        texts = {}
+        for ride_id, origin, destination in rows:
+            texts[ride_id] = (origin or "", destination or "")
+            for field, value in zip(_SEARCH_FIELDS, texts[ride_id]):
+                for gram in _trigrams(value):
+                    postings[field][gram].add(ride_id)
+        return postings, texts
+
+    @staticmethod
+    def _index(postings, texts, ride_id, origin, destination):
+        texts[ride_id] = (origin or "", destination or "")
+        for field, value in zip(_SEARCH_FIELDS, texts[ride_id]):
+            for gram in _trigrams(value):
+                postings[field][gram].add(ride_id)
+
+    async def _load(self, db):
+        log = {"rides": {}, "stale": False}
+        with self._lock:
+            self._load_logs.append(log)
+        try:
+            rows = (await db.execute(select(Ride.id, Ride.origin, Ride.destination))).all()
+            # CPU-bound; keep it off the event loop (like the match index in app/matching.py)
+            postings, texts = await asyncio.to_thread(self._build, rows)
+        finally:
+            with self._lock:
+                self._load_logs.remove(log)
+        with self._lock:
+            # Rides added while the SELECT ran went into the old postings; carry them over
+            for ride_id, (origin, destination) in log["rides"].items():
+                self._index(postings, texts, ride_id, origin, destination)
+            self._postings = postings
+            self._texts = texts
+            # A bulk insert committed mid-load may be missing from the rows read
+            self._loaded_at = None if log["stale"] else time.monotonic()
+
+    def mark_stale(self):
+        with self._lock:
+            self._loaded_at = None
+            for log in self._load_logs:
+                log["stale"] = True
+
+    def add(self, ride_id, origin, destination):
+        with self._lock:
+            for log in self._load_logs:
+                log["rides"][ride_id] = (origin, destination)
+            if self._loaded_at is None:
+                return
+            self._index(self._postings, self._texts, ride_id, origin, destination)
+
+    async def candidates(self, db, field, term):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.REFRESH_SECONDS:
+            await self._load(db)
+        grams = _trigrams(term)
+        with self._lock:
+            postings = self._postings[field]
+            sets = sorted((postings.get(gram, set()) for gram in grams), key=len)
+            return set.intersection(*sets) if sets else set()
+
+    async def filter(self, db, stmt, origin=None, destination=None, ranked=False):
+        for field, term in zip(_SEARCH_FIELDS, (origin, destination)):
+            if not term:
+                continue
+            if len(term) >= 3:
+                candidates = await self.candidates(db, field, term)
+                if len(candidates) <= self.MAX_CANDIDATES:
+                    stmt = stmt.filter(Ride.id.in_(candidates))
+            stmt = stmt.filter(getattr(Ride, field).ilike(f"%{term}%"))
+        return stmt
+
+    def relevance_key(self, origin=None, destination=None):
+        def score(ride):
+            total = 0.0
+            for term, value in ((origin, ride.origin), (destination, ride.destination)):
+                if term and value:
+                    wanted, have = _trigrams(term), _trigrams(value)
+                    if wanted and have:
+                        total += len(wanted & have) / len(wanted | have)
+            return total
+        return lambda ride: (-score(ride), ride.id)
+
+
+_memory_backend = InMemoryTrigramBackend()
+_backends = {}
+
+
+@event.listens_for(Ride, "after_insert")
+@event.listens_for(Ride, "after_update")
+def _index_ride(mapper, connection, target):
+    _memory_backend.add(target.id, target.origin, target.destination)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _note_bulk_insert(orm_execute_state):
+    if orm_execute_state.is_insert and orm_execute_state.bind_mapper is Ride.__mapper__:
+        orm_execute_state.session.info["rides_inserted"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _rebuild_after_bulk_insert(session):
+    # Only once the rows are committed, or a rebuild could run without them
+    if session.info.pop("rides_inserted", False):
+        _memory_backend.mark_stale()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_bulk_insert(session):
+    session.info.pop("rides_inserted", None)
+
+
+async def _detect_backend(db, dialect):
+    if dialect == "postgresql":
+        installed = await db.scalar(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"))
+        if installed:
+            return PostgresTrigramBackend()
+    elif dialect == "sqlite":
+        has_fts = await db.scalar(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rides_fts'")
+        )
+        if has_fts:
+            return SqliteFtsBackend()
+    return _memory_backend
+
+
+async def get_text_search(db) -> TextSearchBackend:
+    """Pick (once per engine) the best text-search backend the database supports."""
+    if TEXT_SEARCH_BACKEND == "memory":
+        return _memory_backend
+    if TEXT_SEARCH_BACKEND == "postgres":
+        return PostgresTrigramBackend()
+    if TEXT_SEARCH_BACKEND == "sqlite":
+        return SqliteFtsBackend()
+
+    bind = db.get_bind()
+    backend = _backends.get(bind)
+    if backend is None:
+        backend = _backends[bind] = await _detect_backend(db, bind.dialect.name)
+    return backend
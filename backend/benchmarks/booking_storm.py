@@ -0,0 +1,134 @@
+"""Booking storm: hundreds of passengers try to book the same ride at once.
+
+Measures bookings per second through POST /api/bookings/ and checks that the
+ride is never oversold (seats handed out never exceed the ride's capacity and
+available_seats never goes negative).
+
+    python -m benchmarks.booking_storm --bookers 300 --seats 20 --concurrency 100
+
+Every booker races for the same ride, with at most --concurrency requests in
+flight at once. Requests beyond the engine's pool size (5 + 10 overflow by
+default) wait on pool checkout, which shows up as latency rather than errors.
+
+Runs against a throwaway SQLite database unless DATABASE_URL is set.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+# Use a scratch database unless one was given explicitly
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "booking_storm.db"))
+
+# Add the backend directory to sys.path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
+
+import httpx
+from datetime import datetime, timedelta
+
+from app.database import Base, engine, SessionLocal
+from app.models.database_models import User, Ride, Booking
+from app.auth import create_access_token, get_password_hash
+from main import app
+
+
+def setup_storm(bookers, seats):
+    """Create one driver, one ride and `bookers` passengers; return (ride_id, tokens)."""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        hashed_password = get_password_hash("password123")  # hash once, reuse for everyone
+        stamp = int(time.time() * 1000)
+        driver = User(name="Storm Driver", email=f"storm.driver.{stamp}@example.com", phone="000",
+                      role="driver", hashed_password=hashed_password)
+        passengers = [
+            User(name=f"Storm Rider {i}", email=f"storm.rider.{stamp}.{i}@example.com", phone="000",
+                 role="rider", hashed_password=hashed_password)
+            for i in range(bookers)
+        ]
+        db.add(driver)
+        db.add_all(passengers)
+        db.flush()
+        ride = Ride(driver_id=driver.id, origin="University Campus", destination="Downtown",
+                    departure_time=datetime.now() + timedelta(days=1), available_seats=seats, price=5.0)
+        db.add(ride)
+        db.commit()
+        tokens = [create_access_token({"sub": p.email}) for p in passengers]
+        return ride.id, tokens
+    finally:
+        db.close()
+
+
+async def storm(ride_id, tokens, concurrency):
+    transport = httpx.ASGITransport(app=app)
+    in_flight = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def book(token):
+            async with in_flight:
+                response = await client.post(
+                    "/api/bookings/", json={"ride_id": ride_id, "seats": 1},
+                    headers={"Authorization": f"Bearer {token}"}
+                )
+            return response.status_code
+
+        started = time.perf_counter()
+        statuses = await asyncio.gather(*(book(token) for token in tokens))
+        elapsed = time.perf_counter() - started
+    return statuses, elapsed
+
+
+def check_ride(ride_id, seats):
+    db = SessionLocal()
+    try:
+        ride = db.query(Ride).filter(Ride.id == ride_id).first()
+        booked = sum(b.seats for b in db.query(Booking).filter(Booking.ride_id == ride_id))
+        return ride.available_seats, booked
+    finally:
+        db.close()
+
+
+def run(bookers=300, seats=20, concurrency=100):
+    ride_id, tokens = setup_storm(bookers, seats)
+    statuses, elapsed = asyncio.run(storm(ride_id, tokens, concurrency))
+    available, booked = check_ride(ride_id, seats)
+
+    succeeded = statuses.count(200)
+    rejected = statuses.count(400)
+    errors = len(statuses) - succeeded - rejected
+    oversold = max(0, booked - seats) + max(0, -available)
+    return {
+        "bookers": bookers,
+        "seats": seats,
+        "concurrency": concurrency,
+        "succeeded": succeeded,
+        "rejected": rejected,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(len(statuses) / elapsed, 1),
+        "bookings_per_s": round(succeeded / elapsed, 1),
+        "seats_booked": booked,
+        "seats_left": available,
+        "oversold": oversold,
+        "consistent": booked + available == seats,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent booking storm against a single ride")
+    parser.add_argument("--bookers", type=int, default=300, help="Concurrent passengers")
+    parser.add_argument("--seats", type=int, default=20, help="Seats offered on the ride")
+    parser.add_argument("--concurrency", type=int, default=100, help="Requests in flight at once")
+    args = parser.parse_args()
+
+    print(f"\n🌩️  Booking storm: {args.bookers} bookers, {args.seats} seats")
+    result = run(args.bookers, args.seats, args.concurrency)
+    for key, value in result.items():
+        print(f"- {key}: {value}")
+    if result["oversold"] or not result["consistent"]:
+        print("❌ Ride was oversold!")
+        sys.exit(1)
+    print("✅ No oversells")
@@ -0,0 +1,174 @@
+"""High-concurrency read benchmark: many clients browsing rides and bookings at once.
+
+Each simulated client loops over ride detail, ride search and "my bookings"
+until --requests have been sent, with at most --concurrency requests in
+flight. --latency-ms adds a per-statement delay on the database connection
+to stand in for a networked database; without it SQLite answers in
+microseconds and the benchmark only measures Python overhead.
+
+    python -m benchmarks.concurrency --concurrency 200 --requests 2000 --latency-ms 5
+
+Reports throughput, latency percentiles and failed requests (pool checkout
+timeouts surface as errors). Runs against a throwaway SQLite database unless
+DATABASE_URL is set; the latency hook only applies to SQLite.
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+# Use a scratch database unless one was given explicitly
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "concurrency.db"))
+
+# Add the backend directory to sys.path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
+
+import httpx
+from datetime import datetime, timedelta
+from sqlalchemy import event
+
+from app import database
+from app.database import Base, engine, SessionLocal
+from app.models.database_models import User, Ride, Booking
+from app.auth import create_access_token, get_password_hash
+from main import app
+
+
+def add_latency(latency_ms):
+    """Sleep for latency_ms on every statement the API's connections run."""
+    if latency_ms <= 0 or engine.dialect.name != "sqlite":
+        return
+    delay = latency_ms / 1000.0
+
+    def trace(statement):
+        time.sleep(delay)
+
+    async_engine = getattr(database, "async_engine", None)
+    if async_engine is not None:
+        # aiosqlite runs each connection on its own thread, so the sleep blocks that connection only
+        @event.listens_for(async_engine.sync_engine, "connect")
+        def on_async_connect(dbapi_connection, connection_record):
+            dbapi_connection.run_async(lambda conn: conn.set_trace_callback(trace))
+    else:
+        @event.listens_for(engine, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            dbapi_connection.set_trace_callback(trace)
+
+
+def seed(rides, passengers):
+    """Create one driver with `rides` rides and `passengers` passengers with a booking each."""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        hashed_password = get_password_hash("password123")  # hash once, reuse for everyone
+        stamp = int(time.time() * 1000)
+        driver = User(name="Bench Driver", email=f"bench.driver.{stamp}@example.com", phone="000",
+                      role="driver", hashed_password=hashed_password)
+        riders = [
+            User(name=f"Bench Rider {i}", email=f"bench.rider.{stamp}.{i}@example.com", phone="000",
+                 role="rider", hashed_password=hashed_password)
+            for i in range(passengers)
+        ]
+        db.add(driver)
+        db.add_all(riders)
+        db.flush()
+        start = datetime.now() + timedelta(days=1)
+        ride_rows = [
+            Ride(driver_id=driver.id, origin=f"Campus Gate {i % 10}", destination=f"Downtown Stop {i % 25}",
+                 departure_time=start + timedelta(minutes=i), available_seats=4, price=5.0 + i % 7)
+            for i in range(rides)
+        ]
+        db.add_all(ride_rows)
+        db.flush()
+        db.add_all(
+            Booking(ride_id=ride_rows[i % rides].id, passenger_id=rider.id, seats=1, status="pending")
+            for i, rider in enumerate(riders)
+        )
+        db.commit()
+        ride_ids = [ride.id for ride in ride_rows]
+        tokens = [create_access_token({"sub": rider.email}) for rider in riders]
+        return ride_ids, tokens
+    finally:
+        db.close()
+
+
+async def browse(ride_ids, tokens, requests, concurrency):
+    transport = httpx.ASGITransport(app=app)
+    in_flight = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = []
+    rng = random.Random(42)
+    calls = []
+    for i in range(requests):
+        kind = i % 3
+        if kind == 0:
+            calls.append((f"/api/rides/{rng.choice(ride_ids)}", {}, None))
+        elif kind == 1:
+            calls.append(("/api/rides/search", {"origin": "Gate", "limit": 20}, None))
+        else:
+            calls.append(("/api/bookings/", {"limit": 20}, rng.choice(tokens)))
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def call(path, params, token):
+            headers = {"Authorization": f"Bearer {token}"} if token else {}
+            async with in_flight:
+                started = time.perf_counter()
+                try:
+                    outcome = (await client.get(path, params=params, headers=headers)).status_code
+                except Exception as exc:  # pool timeouts propagate through ASGITransport
+                    outcome = type(exc).__name__
+                latencies.append(time.perf_counter() - started)
+            if outcome != 200:
+                failures.append(outcome)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(call(*c) for c in calls))
+        elapsed = time.perf_counter() - started
+    return latencies, failures, elapsed
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run(requests=2000, concurrency=200, latency_ms=5, rides=500, passengers=200):
+    ride_ids, tokens = seed(rides, passengers)
+    add_latency(latency_ms)
+    latencies, failures, elapsed = asyncio.run(browse(ride_ids, tokens, requests, concurrency))
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "latency_ms": latency_ms,
+        "failed": len(failures),
+        "elapsed_s": round(elapsed, 2),
+        "requests_per_s": round(requests / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent read load against rides and bookings")
+    parser.add_argument("--requests", type=int, default=2000, help="Total requests to send")
+    parser.add_argument("--concurrency", type=int, default=200, help="Requests in flight at once")
+    parser.add_argument("--latency-ms", type=float, default=5, help="Simulated per-statement DB latency")
+    parser.add_argument("--rides", type=int, default=500, help="Rides to seed")
+    parser.add_argument("--passengers", type=int, default=200, help="Passengers to seed (one booking each)")
+    args = parser.parse_args()
+
+    print(f"\n🚦 Concurrency benchmark: {args.requests} requests, {args.concurrency} in flight")
+    result = run(args.requests, args.concurrency, args.latency_ms, args.rides, args.passengers)
+    for key, value in result.items():
+        print(f"- {key}: {value}")
+    if result["failed"]:
+        print(f"❌ {result['failed']} requests failed")
+        sys.exit(1)
+    print("✅ All requests succeeded")
@@ -0,0 +1,269 @@
+"""Load-test suite: drive main:app in-process through realistic scenarios.
+
+Seeds a local database of configurable size with generate_data.py, then runs each scenario with
+concurrent httpx clients over ASGITransport (no network, no server process):
+
+- search_burst      riders hammering /api/rides/search with text, price and
+                    coordinate filters
+- booking_storm     passengers racing for the seats on one new ride
+- driver_dashboard  drivers loading their bookings and the ride list
+- login_wave        users logging in at once (real bcrypt verification)
+
+Each scenario reports requests/s and p50/p95/p99 latency. Results can be
+saved as a JSON baseline and later runs compared against it:
+
+    python -m benchmarks.loadtest --users 2000 --rides 5000 --save baseline.json
+    python -m benchmarks.loadtest --users 2000 --rides 5000 --compare baseline.json
+
+--compare exits 1 when a scenario's throughput drops, or its p95 rises, by
+more than --tolerance. Runs against a throwaway SQLite database unless
+DATABASE_URL is set (the database must be empty or disposable: it is seeded).
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+
+# Use a scratch database unless one was given explicitly
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "loadtest.db"))
+
+# Add the backend directory to sys.path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
+
+import httpx
+
+from app.database import engine, SessionLocal, DATABASE_URL
+from app.models.database_models import Ride
+from app.auth import create_access_token
+from app.passwords import shutdown_password_pool
+from generate_data import CAMPUS, PLACES, email_for, generate, role_for
+from main import app
+
+PASSWORD = "password123"
+
+class Call:
+    """One request a scenario makes, and the statuses that count as success."""
+    __slots__ = ("method", "path", "kwargs", "ok")
+
+    def __init__(self, method, path, ok=(200,), **kwargs):
+        self.method = method
+        self.path = path
+        self.kwargs = kwargs
+        self.ok = ok
+
+
+def seed(users, rides, bookings_per_ride, seed_value):
+    """Generate the dataset with generate_data.py and return the drivers and riders to act as."""
+    summary = generate(users, rides, bookings_per_ride, seed=seed_value, password=PASSWORD, log=lambda message: None)
+    ids = range(summary["first_user_id"], summary["last_user_id"] + 1)
+    return {
+        "drivers": [(user_id, email_for(user_id)) for user_id in ids if role_for(user_id) == "driver"],
+        "riders": [(user_id, email_for(user_id)) for user_id in ids if role_for(user_id) == "rider"],
+    }
+
+
+def bearer(email):
+    return {"Authorization": f"Bearer {create_access_token({'sub': email})}"}
+
+
+def search_burst(data, rng, requests):
+    calls = []
+    for _ in range(requests):
+        place, lat, lng = rng.choice(PLACES + [CAMPUS])
+        kind = rng.randrange(4)
+        if kind == 0:
+            params = {"origin": place.split()[0], "limit": 20}
+        elif kind == 1:
+            params = {"destination": place.split()[0], "max_price": 400, "sort": "price", "limit": 20}
+        elif kind == 2:
+            params = {"origin_lat": lat, "origin_lng": lng, "radius_km": 3, "limit": 20}
+        else:
+            params = {"min_date": datetime.now().isoformat(), "min_seats": 2, "limit": 50}
+        calls.append(Call("GET", "/api/rides/search", params=params))
+    return calls
+
+
+def booking_storm(data, rng, requests):
+    """Create one ride with a tenth as many seats as bookers, then let everyone race for it."""
+    db = SessionLocal()
+    try:
+        driver_id, _ = data["drivers"][0]
+        ride = Ride(driver_id=driver_id, origin="University Campus", destination="Downtown",
+                    departure_time=datetime.now() + timedelta(days=1),
+                    available_seats=max(1, requests // 10), price=5.0)
+        db.add(ride)
+        db.commit()
+        ride_id = ride.id
+    finally:
+        db.close()
+    riders = rng.sample(data["riders"], min(requests, len(data["riders"])))
+    return [
+        Call("POST", "/api/bookings/", ok=(200, 400), json={"ride_id": ride_id, "seats": 1},
+             headers=bearer(riders[i % len(riders)][1]))
+        for i in range(requests)
+    ]
+
+
+def driver_dashboard(data, rng, requests):
+    calls = []
+    for i in range(requests):
+        _, email = rng.choice(data["drivers"])
+        if i % 2 == 0:
+            calls.append(Call("GET", "/api/bookings/as-driver", params={"limit": 50}, headers=bearer(email)))
+        else:
+            calls.append(Call("GET", "/api/rides/", params={"limit": 50}))
+    return calls
+
+
+def login_wave(data, rng, requests):
+    return [
+        Call("POST", "/api/users/login", data={"username": rng.choice(data["riders"])[1], "password": PASSWORD})
+        for _ in range(requests)
+    ]
+
+
+SCENARIOS = {
+    "search_burst": search_burst,
+    "booking_storm": booking_storm,
+    "driver_dashboard": driver_dashboard,
+    "login_wave": login_wave,
+}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def drive(calls, concurrency):
+    """Send the calls with at most `concurrency` in flight; return (latencies, failures, elapsed)."""
+    transport = httpx.ASGITransport(app=app)
+    in_flight = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+        async def send(call):
+            async with in_flight:
+                started = time.perf_counter()
+                try:
+                    outcome = (await client.request(call.method, call.path, **call.kwargs)).status_code
+                except Exception as exc:
+                    outcome = type(exc).__name__
+                latencies.append(time.perf_counter() - started)
+            if outcome not in call.ok:
+                failures.append(outcome)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(send(call) for call in calls))
+        elapsed = time.perf_counter() - started
+    return latencies, failures, elapsed
+
+
+def run_scenario(name, data, requests, concurrency, seed_value):
+    calls = SCENARIOS[name](data, random.Random(seed_value), requests)
+    latencies, failures, elapsed = asyncio.run(drive(calls, concurrency))
+    return {
+        "requests": len(calls),
+        "concurrency": concurrency,
+        "errors": len(failures),
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(len(calls) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def run(scenarios, users=1000, rides=2000, bookings_per_ride=1.5, requests=500, concurrency=50, seed_value=42):
+    started = time.perf_counter()
+    data = seed(users, rides, bookings_per_ride, seed_value)
+    results = {
+        "meta": {
+            "users": users,
+            "rides": rides,
+            "bookings_per_ride": bookings_per_ride,
+            "requests": requests,
+            "concurrency": concurrency,
+            "seed": seed_value,
+            "dialect": engine.dialect.name,
+            "python": platform.python_version(),
+            "seeded_in_s": round(time.perf_counter() - started, 2),
+            "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        },
+        "scenarios": {},
+    }
+    try:
+        for name in scenarios:
+            results["scenarios"][name] = run_scenario(name, data, requests, concurrency, seed_value)
+    finally:
+        shutdown_password_pool()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of regression messages against a saved baseline."""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        if current["requests_per_s"] < previous["requests_per_s"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: {current['requests_per_s']} req/s vs baseline {previous['requests_per_s']}"
+            )
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {current['p95_ms']} ms vs baseline {previous['p95_ms']}")
+        if current["errors"] > previous["errors"]:
+            regressions.append(f"{name}: {current['errors']} errors vs baseline {previous['errors']}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="In-process load test of the UniPool API")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Scenario to run (repeatable; default all)")
+    parser.add_argument("--users", type=int, default=1000, help="Users to seed (every 10th is a driver)")
+    parser.add_argument("--rides", type=int, default=2000, help="Rides to seed")
+    parser.add_argument("--bookings-per-ride", type=float, default=1.5, help="Average bookings per seeded ride")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=50, help="Requests in flight at once")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for data and request mix")
+    parser.add_argument("--save", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Compare against a JSON baseline written by --save")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    scenarios = args.scenario or list(SCENARIOS)
+    print(f"\n🏋️  Load test on {DATABASE_URL.split('://')[0]}: {args.users} users, {args.rides} rides")
+    results = run(scenarios, args.users, args.rides, args.bookings_per_ride, args.requests, args.concurrency,
+                  args.seed)
+
+    print(f"Seeded in {results['meta']['seeded_in_s']}s\n")
+    print(f"{'scenario':<18}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, result in results["scenarios"].items():
+        print(f"{name:<18}{result['requests_per_s']:>9}{result['p50_ms']:>10}{result['p95_ms']:>10}"
+              f"{result['p99_ms']:>10}{result['errors']:>8}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Saved results to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\n❌ Regressions against baseline:")
+            for line in regressions:
+                print(f"- {line}")
+            sys.exit(1)
+        print(f"\n✅ Within {args.tolerance:.0%} of baseline {args.compare}")
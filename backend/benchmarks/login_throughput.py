@@ -0,0 +1,135 @@
+"""Login burst: many users log in at once while other traffic keeps flowing.
+
+Measures logins per second through POST /api/users/login (and per hashing
+worker), and the latency of GET /health probes sent during the burst, which
+shows whether bcrypt is stalling unrelated requests.
+
+    python -m benchmarks.login_throughput --logins 200 --concurrency 50 --workers 4 --rounds 12
+
+--workers sets PASSWORD_HASH_WORKERS (0 hashes on threads in the API process).
+Runs against a throwaway SQLite database unless DATABASE_URL is set.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Concurrent login throughput")
+    parser.add_argument("--logins", type=int, default=200, help="Total login requests")
+    parser.add_argument("--concurrency", type=int, default=50, help="Logins in flight at once")
+    parser.add_argument("--workers", type=int, default=None, help="Password hashing processes")
+    parser.add_argument("--rounds", type=int, default=None, help="bcrypt cost factor")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    # Hashing settings are read at import time
+    if args.workers is not None:
+        os.environ["PASSWORD_HASH_WORKERS"] = str(args.workers)
+    if args.rounds is not None:
+        os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+
+# Use a scratch database unless one was given explicitly
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "login_throughput.db"))
+
+# Add the backend directory to sys.path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
+
+import httpx
+
+from app.database import Base, engine, SessionLocal
+from app.models.database_models import User
+from app.passwords import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, get_password_hash, shutdown_password_pool
+from main import app
+
+PASSWORD = "password123"
+
+
+def seed(users):
+    """Create `users` accounts sharing one password hash; return their emails."""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        hashed_password = get_password_hash(PASSWORD)  # hash once, reuse for everyone
+        stamp = int(time.time() * 1000)
+        emails = [f"login.{stamp}.{i}@example.com" for i in range(users)]
+        db.add_all(
+            User(name=f"Login User {i}", email=email, phone="000", role="rider", hashed_password=hashed_password)
+            for i, email in enumerate(emails)
+        )
+        db.commit()
+        return emails
+    finally:
+        db.close()
+
+
+async def burst(emails, logins, concurrency):
+    transport = httpx.ASGITransport(app=app)
+    in_flight = asyncio.Semaphore(concurrency)
+    probe_latencies = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def login(email):
+            async with in_flight:
+                response = await client.post("/api/users/login", data={"username": email, "password": PASSWORD})
+            return response.status_code
+
+        async def probe(done):
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/health")
+                probe_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(0.01)
+
+        # Warm the pool up so process start-up isn't billed to the first logins
+        await client.post("/api/users/login", data={"username": emails[0], "password": PASSWORD})
+
+        done = asyncio.Event()
+        prober = asyncio.create_task(probe(done))
+        started = time.perf_counter()
+        statuses = await asyncio.gather(*(login(emails[i % len(emails)]) for i in range(logins)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await prober
+    return statuses, elapsed, probe_latencies
+
+
+def run(logins=200, concurrency=50):
+    emails = seed(min(logins, 100))
+    try:
+        statuses, elapsed, probes = asyncio.run(burst(emails, logins, concurrency))
+    finally:
+        shutdown_password_pool()
+    workers = PASSWORD_HASH_WORKERS or 1
+    return {
+        "logins": logins,
+        "concurrency": concurrency,
+        "bcrypt_rounds": BCRYPT_ROUNDS,
+        "hash_workers": PASSWORD_HASH_WORKERS,
+        "cpus": os.cpu_count(),
+        "failed": len(statuses) - statuses.count(200),
+        "elapsed_s": round(elapsed, 2),
+        "logins_per_s": round(logins / elapsed, 1),
+        "logins_per_s_per_worker": round(logins / elapsed / min(workers, os.cpu_count() or 1), 1),
+        "health_probes": len(probes),
+        "health_p50_ms": round(statistics.median(probes) * 1000, 1) if probes else None,
+        "health_max_ms": round(max(probes) * 1000, 1) if probes else None,
+    }
+
+
+if __name__ == "__main__":
+    print(f"\n🔐 Login burst: {args.logins} logins, {args.concurrency} in flight")
+    result = run(args.logins, args.concurrency)
+    for key, value in result.items():
+        print(f"- {key}: {value}")
+    if result["failed"]:
+        print(f"❌ {result['failed']} logins failed")
+        sys.exit(1)
+    print("✅ All logins succeeded")
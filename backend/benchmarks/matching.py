@@ -0,0 +1,182 @@
+"""Matching benchmark: GET /api/rides/match over a large set of scheduled rides.
+
+Seeds --rides upcoming rides with generate_data.py, then times
+
+- building the in-memory ride index from the database,
+- the vectorized scoring alone (RideIndex.match), and
+- whole /api/rides/match requests (index lookup, scoring, loading the top k),
+- corridor scoring alone (RideIndex.corridor) and whole /api/rides/corridor
+  requests, after --routes of the rides were given a winding route polyline.
+
+Riders are placed near the seeded pickup points and ask for a departure
+around the commute peaks, so most requests have real candidates to rank.
+
+    python -m benchmarks.matching --rides 100000 --routes 5000 --requests 200
+
+Runs against a throwaway SQLite database unless DATABASE_URL is set.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+
+# Use a scratch database unless one was given explicitly
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "matching.db"))
+# Hash on threads: spawned hashing workers would re-run this script
+os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")
+
+# Add the backend directory to sys.path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
+
+from fastapi.testclient import TestClient
+from sqlalchemy import select, update
+
+from app import geo, matching
+from app.database import AsyncSessionLocal, engine
+from app.models.database_models import Ride
+from generate_data import CAMPUS, PLACES, generate
+from main import app
+
+
+def trips(count, rng):
+    """Random rider trips between seeded places, around tomorrow's commute peaks."""
+    tomorrow = datetime.combine(datetime.now().date() + timedelta(days=1), datetime.min.time())
+    result = []
+    for _ in range(count):
+        home = rng.choice(PLACES)
+        to_campus = rng.random() < 0.5
+        origin, destination = (home, CAMPUS) if to_campus else (CAMPUS, home)
+        hour = 8 if to_campus else 17
+        result.append({
+            "origin_lat": origin[1] + rng.uniform(-0.01, 0.01),
+            "origin_lng": origin[2] + rng.uniform(-0.01, 0.01),
+            "destination_lat": destination[1] + rng.uniform(-0.01, 0.01),
+            "destination_lng": destination[2] + rng.uniform(-0.01, 0.01),
+            "departure_time": (tomorrow + timedelta(hours=hour, minutes=rng.randint(-45, 45))).isoformat(),
+        })
+    return result
+
+
+def add_routes(count, rng, points=40):
+    """Give ``count`` seeded rides a winding route between their endpoints, like a simplified directions geometry."""
+    with engine.begin() as connection:
+        rides = connection.execute(
+            select(Ride.id, Ride.origin_lat, Ride.origin_lng, Ride.destination_lat, Ride.destination_lng)
+            .filter(Ride.origin_lat != None, Ride.destination_lat != None)
+            .order_by(Ride.id).limit(count)
+        ).all()
+        for ride_id, origin_lat, origin_lng, destination_lat, destination_lng in rides:
+            # Detour through a waypoint off the straight line, wobbling like a street grid
+            via = ((origin_lat + destination_lat) / 2 + rng.uniform(-0.02, 0.02),
+                   (origin_lng + destination_lng) / 2 + rng.uniform(-0.02, 0.02))
+            route = []
+            for start, end in (((origin_lat, origin_lng), via), (via, (destination_lat, destination_lng))):
+                for step in range(points // 2):
+                    t = step / (points // 2)
+                    route.append((start[0] + (end[0] - start[0]) * t + rng.uniform(-0.0005, 0.0005),
+                                  start[1] + (end[1] - start[1]) * t + rng.uniform(-0.0005, 0.0005)))
+            route.append((destination_lat, destination_lng))
+            connection.execute(
+                update(Ride).where(Ride.id == ride_id).values(route_polyline=geo.encode_polyline(route))
+            )
+    return len(rides)
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+
+def run(rides=100000, routes=5000, requests=200, seed=42):
+    generate(max(100, rides // 10), rides, bookings_per_ride=0.5, rating_rate=0.0, seed=seed,
+             past_days=0, future_days=14, log=lambda message: None)
+    rng = random.Random(seed)
+    routed = add_routes(routes, rng)
+    queries = trips(requests, rng)
+
+    async def build():
+        async with AsyncSessionLocal() as db:
+            return await matching.build_index(db)
+
+    results = {}
+    with TestClient(app) as client:
+        started = time.perf_counter()
+        index = client.portal.call(build)
+        results["index build"] = ((time.perf_counter() - started) * 1000, None)
+        results["indexed rides"] = index.size
+        results["routed rides"] = routed
+        results["route segments"] = index.seg_len.size
+
+        params = iter(queries * 2)
+
+        def score():
+            query = next(params)
+            index.match((query["origin_lat"], query["origin_lng"]),
+                        (query["destination_lat"], query["destination_lng"]),
+                        datetime.fromisoformat(query["departure_time"]), 60, 3.0, limit=10)
+
+        results["scoring only"] = timed(score, requests)
+
+        client.get("/api/rides/match", params=queries[0])  # warm the index
+        requests_iter = iter(queries)
+        matched = []
+
+        def request():
+            response = client.get("/api/rides/match", params=next(requests_iter))
+            assert response.status_code == 200, response.text
+            matched.append(len(response.json()))
+
+        results["GET /api/rides/match"] = timed(request, requests)
+        results["mean matches"] = statistics.mean(matched)
+
+        def along_route():
+            query = next(params)
+            index.corridor((query["origin_lat"], query["origin_lng"]),
+                           (query["destination_lat"], query["destination_lng"]),
+                           datetime.fromisoformat(query["departure_time"]), 60, 0.5, limit=10)
+
+        params = iter(queries * 2)
+        results["corridor scoring only"] = timed(along_route, requests)
+
+        requests_iter = iter(queries)
+        matched.clear()
+
+        def corridor_request():
+            response = client.get("/api/rides/corridor", params=next(requests_iter))
+            assert response.status_code == 200, response.text
+            matched.append(len(response.json()))
+
+        results["GET /api/rides/corridor"] = timed(corridor_request, requests)
+        results["mean corridor matches"] = statistics.mean(matched)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time ranked ride matching")
+    parser.add_argument("--rides", type=int, default=100000, help="Upcoming rides to seed")
+    parser.add_argument("--routes", type=int, default=5000, help="Seeded rides to give a route polyline")
+    parser.add_argument("--requests", type=int, default=200, help="Match requests to time")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for data and trips")
+    args = parser.parse_args()
+
+    print(f"\n🎯 Matching against {args.rides} seeded rides")
+    results = run(args.rides, args.routes, args.requests, args.seed)
+    print(f"- indexed rides: {results['indexed rides']} ({results['routed rides']} with routes, "
+          f"{results['route segments']} segments)")
+    print(f"- index build: {results['index build'][0]:.0f} ms")
+    for label in ("scoring only", "GET /api/rides/match", "corridor scoring only", "GET /api/rides/corridor"):
+        p50, p95 = results[label]
+        print(f"- {label}: p50 {p50:.2f} ms, p95 {p95:.2f} ms")
+    print(f"- matches per request: {results['mean matches']:.1f}")
+    print(f"- corridor matches per request: {results['mean corridor matches']:.1f}")
@@ -0,0 +1,234 @@
+"""Realtime benchmark: ride updates fanned out to many idle SSE subscribers.
+
+Starts the API under uvicorn in a child process, opens --subscribers event
+streams (most following one random ride, --area-share of them following
+the area around campus, where every seeded ride ends), then has the driver
+update --events rides. Reports
+
+- the server memory the open streams cost,
+- PUT /api/rides/{id} latency with no subscribers and with all of them open,
+- fan-out latency: from sending the update until the last interested
+  subscriber has read the event.
+
+    python -m benchmarks.realtime --subscribers 10000 --rides 1000 --events 50
+
+Client and server each need a file-descriptor limit above --subscribers
+(ulimit -n). Runs against a throwaway SQLite database unless DATABASE_URL is set.
+"""
+import os
+import sys
+import time
+import random
+import socket
+import asyncio
+import subprocess
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+
+# Use a scratch database unless one was given explicitly
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "realtime.db"))
+# Hash on threads: spawned hashing workers would re-run this script
+os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")
+
+# Add the backend directory to sys.path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
+
+import httpx
+
+from app.auth import create_access_token, get_password_hash
+from app.database import Base, SessionLocal, engine
+from app.models.database_models import Ride, User
+from generate_data import CAMPUS, PLACES
+
+
+def seed(rides):
+    """One driver with ``rides`` upcoming rides from the seeded places to campus."""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        driver = User(name="Realtime Driver", email=f"realtime.driver.{int(time.time() * 1000)}@example.com",
+                      phone="000", role="driver", hashed_password=get_password_hash("password123"))
+        db.add(driver)
+        db.flush()
+        start = datetime.now() + timedelta(days=1)
+        ride_rows = []
+        for i in range(rides):
+            place = PLACES[i % len(PLACES)]
+            ride_rows.append(Ride(
+                driver_id=driver.id, origin=place[0], destination=CAMPUS[0],
+                origin_lat=place[1], origin_lng=place[2], destination_lat=CAMPUS[1], destination_lng=CAMPUS[2],
+                departure_time=start + timedelta(minutes=i), available_seats=4, price=150.0
+            ))
+        db.add_all(ride_rows)
+        db.commit()
+        return [ride.id for ride in ride_rows], create_access_token({"sub": driver.email})
+    finally:
+        db.close()
+
+
+def rss_mb(pid):
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+class Subscriber:
+    """A raw SSE client: one socket, reading chunked frames and noting when each event arrives."""
+
+    def __init__(self, port, query):
+        self.port = port
+        self.query = query
+        self.received = {}
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection("127.0.0.1", self.port, limit=1 << 16)
+        self.writer.write(
+            f"GET /api/realtime/rides?{self.query} HTTP/1.1\r\nHost: bench\r\nAccept: text/event-stream\r\n\r\n"
+            .encode()
+        )
+        await self.reader.readuntil(b"\r\n\r\n")
+        await self._chunk()  # the "subscribed" comment
+
+    async def open_retrying(self):
+        # A burst of connects can overflow the listen queue; back off and retry
+        for attempt in range(5):
+            try:
+                return await self.open()
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await asyncio.sleep(0.2 * (attempt + 1))
+        await self.open()
+
+    async def _chunk(self):
+        size = int((await self.reader.readline()).strip(), 16)
+        return (await self.reader.readexactly(size + 2))[:-2]
+
+    async def listen(self):
+        try:
+            while True:
+                data = await self._chunk()
+                if b"event: ride" in data:
+                    # The update carries the new price, which tells the events apart
+                    price = data.rsplit(b'"price":', 1)[1].split(b"}", 1)[0]
+                    self.received[float(price)] = time.perf_counter()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+
+    def close(self):
+        self.writer.close()
+
+
+async def update_rides(client, ride_ids, token, events, rng, price_base):
+    """Change the price of ``events`` random rides; returns {price: (ride_id, sent_at)} and latencies."""
+    sent = {}
+    latencies = []
+    headers = {"Authorization": f"Bearer {token}"}
+    for i in range(events):
+        ride_id = rng.choice(ride_ids)
+        price = price_base + i
+        started = time.perf_counter()
+        response = await client.put(f"/api/rides/{ride_id}", json={"price": price}, headers=headers)
+        latencies.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, response.text
+        sent[float(price)] = (ride_id, started)
+        await asyncio.sleep(0.02)
+    return sent, latencies
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+
+async def run(subscribers=10000, rides=1000, events=50, area_share=0.1, seed_value=42):
+    ride_ids, token = seed(rides)
+    rng = random.Random(seed_value)
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--backlog", "4096"],
+        cwd=backend_dir,
+    )
+    try:
+        return await measure(port, server.pid, ride_ids, token, subscribers, events, area_share, rng)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+async def subscriber_gauge(client):
+    metrics = (await client.get("/metrics")).text
+    return int(float(metrics.split("\nrealtime_subscribers ", 1)[1].split("\n", 1)[0]))
+
+
+async def measure(port, server_pid, ride_ids, token, subscribers, events, area_share, rng):
+    results = {}
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+        for _ in range(100):
+            try:
+                await client.get("/health")
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+        # Warm up, then time updates with nobody listening
+        await update_rides(client, ride_ids, token, 5, rng, 1000)
+        _, results["PUT ride, no subscribers"] = await update_rides(client, ride_ids, token, events, rng, 2000)
+
+        memory_before = rss_mb(server_pid)
+        area = f"lat={CAMPUS[1]}&lng={CAMPUS[2]}&radius_km=1"
+        clients = [
+            Subscriber(port, area if rng.random() < area_share else f"ride_id={rng.choice(ride_ids)}")
+            for _ in range(subscribers)
+        ]
+        started = time.perf_counter()
+        for batch in range(0, subscribers, 200):
+            await asyncio.gather(*(subscriber.open_retrying() for subscriber in clients[batch:batch + 200]))
+        results["connect seconds"] = time.perf_counter() - started
+        results["open streams"] = await subscriber_gauge(client)
+        results["MB per 1k streams"] = (rss_mb(server_pid) - memory_before) / subscribers * 1000
+        listeners = [asyncio.create_task(subscriber.listen()) for subscriber in clients]
+
+        sent, results["PUT ride, all subscribed"] = await update_rides(client, ride_ids, token, events, rng, 3000)
+        await asyncio.sleep(1.0)
+
+        fanout, deliveries = [], []
+        for price, (ride_id, sent_at) in sent.items():
+            arrivals = [subscriber.received[price] for subscriber in clients if price in subscriber.received]
+            deliveries.append(len(arrivals))
+            if arrivals:
+                fanout.append((max(arrivals) - sent_at) * 1000)
+        results["fan-out to last subscriber"] = fanout
+        results["deliveries per event"] = statistics.mean(deliveries)
+
+        for subscriber in clients:
+            subscriber.close()
+        for listener in listeners:
+            listener.cancel()
+        await asyncio.gather(*listeners, return_exceptions=True)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark realtime ride updates with many idle subscribers")
+    parser.add_argument("--subscribers", type=int, default=10000, help="Open event streams")
+    parser.add_argument("--rides", type=int, default=1000, help="Rides to seed and update")
+    parser.add_argument("--events", type=int, default=50, help="Ride updates to publish")
+    parser.add_argument("--area-share", type=float, default=0.1, help="Share of streams following an area")
+    args = parser.parse_args()
+
+    print(f"\n📡 {args.subscribers} subscribers, {args.rides} rides, {args.events} updates")
+    results = asyncio.run(run(args.subscribers, args.rides, args.events, args.area_share))
+    print(f"- open streams: {results['open streams']} (connected in {results['connect seconds']:.1f}s)")
+    print(f"- server memory: {results['MB per 1k streams']:.1f} MB per 1k open streams")
+    for label in ("PUT ride, no subscribers", "PUT ride, all subscribed", "fan-out to last subscriber"):
+        p50, p95 = percentiles(results[label])
+        print(f"- {label}: p50 {p50:.1f} ms, p95 {p95:.1f} ms")
+    print(f"- deliveries per event: {results['deliveries per event']:.0f}")
@@ -0,0 +1,96 @@
+"""Serialization micro-benchmark: 1k rides and 1k bookings to JSON bytes.
+
+Compares FastAPI's default response_model path (validate, dump to Python,
+stdlib json) with the precompiled list adapters in app/serialization.py.
+Objects are built in memory, so no database is involved.
+
+    python -m benchmarks.serialization --rows 1000 --repeat 20
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+from typing import List
+from datetime import datetime, timedelta
+
+# Add the backend directory to sys.path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.models.database_models import User, Ride, Booking
+from app.models.schemas import BookingResponse, RideResponse
+
+try:
+    from app.serialization import booking_list_adapter, json_response, ride_list_adapter
+except ImportError:  # trees without the fast path
+    json_response = None
+
+
+def build_rows(count):
+    """Return (rides, bookings) as transient ORM objects with relationships set."""
+    now = datetime(2030, 1, 1, 8, 0, 0)
+    users = [
+        User(id=i, name=f"User {i}", email=f"user{i}@university.edu", phone="0300-0000000",
+             role="both", is_active=True, created_at=now)
+        for i in range(1, 101)
+    ]
+    rides = []
+    for i in range(1, count + 1):
+        driver = users[i % len(users)]
+        rides.append(Ride(
+            id=i, driver_id=driver.id, driver=driver, origin=f"Campus Gate {i % 10}",
+            destination=f"Downtown Stop {i % 25}", origin_lat=31.48, origin_lng=74.30,
+            destination_lat=31.52, destination_lng=74.35, departure_time=now + timedelta(minutes=i),
+            available_seats=3, price=150.0, description="Daily commute", status="scheduled", created_at=now,
+        ))
+    bookings = [
+        Booking(id=i, ride_id=rides[i - 1].id, ride=rides[i - 1], passenger_id=users[(i + 1) % len(users)].id,
+                passenger=users[(i + 1) % len(users)], seats=1, status="pending", created_at=now)
+        for i in range(1, count + 1)
+    ]
+    return rides, bookings
+
+
+def fastapi_default(model, rows):
+    field = create_response_field(name="response", type_=List[model])
+    content = asyncio.run(serialize_response(field=field, response_content=rows, is_coroutine=True))
+    return JSONResponse(content).body
+
+
+def timed(func, repeat):
+    func()  # warm up
+    started = time.perf_counter()
+    for _ in range(repeat):
+        body = func()
+    return (time.perf_counter() - started) / repeat * 1000, len(body)
+
+
+def run(rows=1000, repeat=20):
+    rides, bookings = build_rows(rows)
+    cases = [
+        ("rides: fastapi default", lambda: fastapi_default(RideResponse, rides)),
+        ("bookings: fastapi default", lambda: fastapi_default(BookingResponse, bookings)),
+    ]
+    if json_response is not None:
+        cases += [
+            ("rides: list adapter", lambda: json_response(ride_list_adapter, rides).body),
+            ("bookings: list adapter", lambda: json_response(booking_list_adapter, bookings).body),
+        ]
+    return {label: timed(func, repeat) for label, func in cases}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serialize nested ride/booking lists")
+    parser.add_argument("--rows", type=int, default=1000, help="Rides and bookings per list")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed iterations per case")
+    args = parser.parse_args()
+
+    print(f"\n📦 Serializing {args.rows} rides and {args.rows} bookings")
+    for label, (ms, size) in run(args.rows, args.repeat).items():
+        print(f"- {label}: {ms:.1f} ms ({size / 1024:.0f} KiB)")
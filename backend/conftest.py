@@ -0,0 +1,64 @@
+"""Shared setup for the pytest suites in this directory.
+
+pytest imports this before any test module, so the environment below is in
+place before the app (and its engines) are first imported, whichever test
+file runs first. All tests share one scratch database for the session; set
+TEST_DATABASE_URL to run them against another database instead.
+"""
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = os.getenv(
+    "TEST_DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
+)
+# Hash on threads: spawned hashing workers would re-import the test modules
+os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")
+# Sync right after a write, on PostgreSQL too (test_sync covers the window)
+os.environ.setdefault("SYNC_VISIBILITY_SECONDS", "0")
+
+import pytest
+from fastapi.testclient import TestClient
+
+RIDE = {"origin": "University Campus", "destination": "Downtown",
+        "departure_time": "2030-01-01T08:00:00", "available_seats": 3, "price": 5.0}
+
+
+@pytest.fixture(scope="session")
+def database():
+    """The scratch database's engine, with the schema created."""
+    from app.database import Base, engine
+    from app.models import database_models  # registers the tables on Base
+
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+
+@pytest.fixture
+def client(database):
+    from main import app
+
+    return TestClient(app)
+
+
+@pytest.fixture
+def login(client):
+    """Register (if needed) and log in a user; returns their Authorization headers.
+
+    Also fetches /api/users/me, which warms the principal cache so later
+    requests only run the endpoint's own statements.
+    """
+    def login(email, role):
+        client.post("/api/users/register", json={
+            "name": email.split("@")[0], "email": email, "phone": "000", "role": role, "password": "password123"
+        })
+        response = client.post("/api/users/login", data={"username": email, "password": "password123"})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        client.get("/api/users/me", headers=headers)
+        return headers
+    return login
+
+
+@pytest.fixture
+def ride_payload():
+    """A valid POST /api/rides/ body, departing well in the future."""
+    return dict(RIDE)
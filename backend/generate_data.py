@@ -0,0 +1,335 @@
+"""Synthetic data generator for capacity testing.
+
+Produces users, rides, bookings and ratings at any scale (millions of rows)
+with campus-shaped distributions: most rides start or end at the university,
+departures cluster around the morning and evening commute on weekdays, past
+rides are completed and some of their passengers leave ratings.
+
+Rows are streamed in batches with explicit ids, so memory stays flat and no
+ORM objects are built: SQLite gets executemany INSERTs, Postgres gets COPY.
+Every user shares one precomputed password hash, and the same --seed always
+produces the same data.
+
+    python generate_data.py --users 100000 --rides 1000000 --seed 42
+
+Appends to whatever DATABASE_URL points at (tables are created if missing).
+"""
+import os
+import sys
+import io
+import csv
+import math
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+# Add the current directory to sys.path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.insert(0, current_dir)
+
+from sqlalchemy import func, select, text
+
+from app.database import Base, engine
+from app.geo import encode_geohash, haversine_km
+from app.models.database_models import User, Ride, Booking, Rating
+from app.passwords import get_password_hash
+
+DEFAULT_PASSWORD = "password123"
+
+CAMPUS = ("University Campus", 31.4707, 74.4098)
+PLACES = [
+    ("DHA Phase 5", 31.4620, 74.4085),
+    ("Gulberg", 31.5204, 74.3487),
+    ("Model Town", 31.4840, 74.3253),
+    ("Johar Town", 31.4697, 74.2728),
+    ("Cantt", 31.5102, 74.3754),
+    ("Bahria Town", 31.3693, 74.1857),
+    ("Downtown", 31.5580, 74.3507),
+    ("Airport", 31.5216, 74.4036),
+    ("Railway Station", 31.5770, 74.3369),
+    ("Township", 31.4496, 74.3097),
+    ("Wapda Town", 31.4310, 74.2655),
+    ("Garden Town", 31.5040, 74.3300),
+]
+FIRST_NAMES = ["Ali", "Ayesha", "Hamza", "Fatima", "Usman", "Zainab", "Bilal", "Hira", "Omar", "Sana",
+               "Ahmed", "Maryam", "Hassan", "Amna", "Saad", "Iqra", "Taha", "Noor", "Raza", "Mahnoor"]
+LAST_NAMES = ["Khan", "Ahmed", "Malik", "Butt", "Sheikh", "Qureshi", "Chaudhry", "Raza", "Iqbal", "Shah"]
+COMMENTS = [None, None, "Great driver, very punctual!", "Smooth ride", "Friendly and on time",
+            "A bit late but fine", "Clean car", None]
+
+USER_COLUMNS = ["id", "name", "email", "phone", "hashed_password", "role", "is_active", "created_at", "updated_at"]
+RIDE_COLUMNS = ["id", "driver_id", "origin", "destination", "origin_lat", "origin_lng", "destination_lat",
+                "destination_lng", "origin_geohash", "destination_geohash", "departure_time", "available_seats",
+                "price", "description", "status", "created_at", "updated_at"]
+BOOKING_COLUMNS = ["id", "ride_id", "passenger_id", "status", "seats", "created_at", "updated_at"]
+RATING_COLUMNS = ["id", "rater_id", "rated_id", "ride_id", "rating", "comment", "rated_as", "created_at"]
+
+
+# Roles follow the id, so callers can pick drivers or riders without loading users
+def role_for(user_id):
+    return {0: "driver", 1: "both"}.get(user_id % 10, "rider")
+
+def email_for(user_id):
+    return f"user{user_id}@campus.example.edu"
+
+
+class Generator:
+    def __init__(self, users, rides, bookings_per_ride=1.5, rating_rate=0.3, past_days=60, future_days=30,
+                 seed=42, now=None):
+        if users < 10:
+            raise ValueError("Generate at least 10 users so every role exists")
+        self.users = users
+        self.rides = rides
+        self.bookings_per_ride = bookings_per_ride
+        self.rating_rate = rating_rate
+        self.past_days = past_days
+        self.future_days = future_days
+        self.rng = random.Random(seed)
+        self.now = now or datetime.now().replace(microsecond=0)
+
+    def set_start_ids(self, user_id, ride_id, booking_id, rating_id):
+        self.first_user_id = user_id
+        self.last_user_id = user_id + self.users - 1
+        self.first_ride_id = ride_id
+        self.next_booking_id = booking_id
+        self.next_rating_id = rating_id
+
+    def _clamp(self, user_id):
+        while user_id < self.first_user_id:
+            user_id += 10
+        while user_id > self.last_user_id:
+            user_id -= 10
+        return user_id
+
+    def pick_driver(self):
+        user_id = self.rng.randint(self.first_user_id, self.last_user_id)
+        return self._clamp(user_id - user_id % 10 + self.rng.choice((0, 1)))
+
+    def pick_rider(self, exclude):
+        while True:
+            user_id = self.rng.randint(self.first_user_id, self.last_user_id)
+            if user_id % 10 == 0:
+                user_id = self._clamp(user_id + 1)
+            if user_id != exclude:
+                return user_id
+
+    def user_rows(self, password_hash):
+        rng = self.rng
+        for user_id in range(self.first_user_id, self.last_user_id + 1):
+            created = self.now - timedelta(days=rng.uniform(0, 365))
+            yield (
+                user_id,
+                f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                email_for(user_id),
+                f"03{rng.randint(0, 49):02d}-{rng.randint(0, 9999999):07d}",
+                password_hash,
+                role_for(user_id),
+                rng.random() > 0.01,
+                created,
+                created,
+            )
+
+    def _departure(self):
+        rng = self.rng
+        while True:
+            day = self.now.date() + timedelta(days=rng.randint(-self.past_days, self.future_days))
+            # Fewer rides at weekends
+            if day.weekday() < 5 or rng.random() < 0.4:
+                break
+        roll = rng.random()
+        if roll < 0.45:
+            hour = rng.gauss(8.0, 0.75)   # morning commute to campus
+        elif roll < 0.8:
+            hour = rng.gauss(17.0, 1.0)   # evening commute home
+        else:
+            hour = rng.uniform(6, 23)
+        minutes = int(min(max(hour, 5.0), 23.9) * 60) // 5 * 5
+        return datetime.combine(day, datetime.min.time()) + timedelta(minutes=minutes), roll < 0.45
+
+    def _route(self, to_campus):
+        rng = self.rng
+        if rng.random() < 0.7:
+            home = rng.choice(PLACES)
+            return (home, CAMPUS) if to_campus else (CAMPUS, home)
+        origin, destination = rng.sample(PLACES, 2)
+        return origin, destination
+
+    def ride_batches(self, batch_size):
+        """Yield (rides, bookings, ratings) row batches; bookings always follow their rides."""
+        rng = self.rng
+        rides, bookings, ratings = [], [], []
+        for ride_id in range(self.first_ride_id, self.first_ride_id + self.rides):
+            departure, morning = self._departure()
+            (origin, o_lat, o_lng), (destination, d_lat, d_lng) = self._route(morning)
+            o_lat += rng.uniform(-0.01, 0.01)
+            o_lng += rng.uniform(-0.01, 0.01)
+            d_lat += rng.uniform(-0.01, 0.01)
+            d_lng += rng.uniform(-0.01, 0.01)
+            price = round(100 + 25 * haversine_km(o_lat, o_lng, d_lat, d_lng), -1)
+            capacity = rng.choices((1, 2, 3, 4), weights=(1, 3, 4, 2))[0]
+            past = departure < self.now
+            if past:
+                status = "cancelled" if rng.random() < 0.03 else "completed"
+            else:
+                status = "scheduled"
+            created = departure - timedelta(days=rng.uniform(0.1, 7))
+            driver_id = self.pick_driver()
+
+            # Poisson-ish demand, never more seats than the car has
+            taken = 0
+            raters = set()
+            wanted = min(capacity, int(rng.expovariate(1 / self.bookings_per_ride)) if self.bookings_per_ride else 0)
+            for _ in range(wanted):
+                seats = 2 if capacity - taken >= 2 and rng.random() < 0.1 else 1
+                if taken + seats > capacity:
+                    break
+                passenger_id = self.pick_rider(exclude=driver_id)
+                if past:
+                    booking_status = "completed" if status == "completed" and rng.random() < 0.92 else "cancelled"
+                else:
+                    booking_status = rng.choice(("pending", "confirmed", "confirmed"))
+                if booking_status != "cancelled":
+                    taken += seats
+                booked_at = created + (departure - created) * rng.random()
+                bookings.append((self.next_booking_id, ride_id, passenger_id, booking_status, seats,
+                                 booked_at, booked_at))
+                self.next_booking_id += 1
+                # One rating per passenger and ride, even if they booked twice
+                if booking_status == "completed" and passenger_id not in raters and rng.random() < self.rating_rate:
+                    raters.add(passenger_id)
+                    rated_at = departure + timedelta(hours=rng.uniform(1, 48))
+                    ratings.append((self.next_rating_id, passenger_id, driver_id, ride_id,
+                                    rng.choices((1, 2, 3, 4, 5), weights=(1, 1, 3, 10, 20))[0],
+                                    rng.choice(COMMENTS), "driver", rated_at))
+                    self.next_rating_id += 1
+
+            rides.append((
+                ride_id, driver_id, origin, destination, o_lat, o_lng, d_lat, d_lng,
+                encode_geohash(o_lat, o_lng), encode_geohash(d_lat, d_lng), departure,
+                capacity - taken, price, None, status, created, created,
+            ))
+            if len(rides) >= batch_size:
+                yield rides, bookings, ratings
+                rides, bookings, ratings = [], [], []
+        if rides:
+            yield rides, bookings, ratings
+
+
+def _insert(connection, table, columns, rows):
+    """Bulk-load rows: COPY on Postgres, executemany INSERT elsewhere."""
+    if not rows:
+        return
+    if connection.dialect.name == "postgresql":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow("" if value is None else value for value in row)
+        buffer.seek(0)
+        cursor = connection.connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        finally:
+            cursor.close()
+    else:
+        connection.execute(table.insert(), [dict(zip(columns, row)) for row in rows])
+
+
+def _add_rating_aggregates(connection, totals):
+    """Add {user_id: [count, sum]} to the users' rating aggregates, as the ratings API does per insert."""
+    if totals:
+        connection.execute(
+            text("UPDATE users SET rating_count = rating_count + :count, rating_sum = rating_sum + :sum "
+                 "WHERE id = :id"),
+            [{"id": user_id, "count": count, "sum": total} for user_id, (count, total) in totals.items()]
+        )
+
+
+def _next_id(connection, table):
+    return (connection.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+
+
+def generate(users, rides, bookings_per_ride=1.5, rating_rate=0.3, seed=42, batch_size=5000,
+             password=DEFAULT_PASSWORD, past_days=60, future_days=30, log=print):
+    """Generate and load the data; return row counts, id ranges and timings."""
+    Base.metadata.create_all(bind=engine)
+    generator = Generator(users, rides, bookings_per_ride, rating_rate, past_days, future_days, seed)
+    password_hash = get_password_hash(password)  # one hash shared by every generated user
+    started = time.perf_counter()
+
+    with engine.begin() as connection:
+        if connection.dialect.name == "sqlite":
+            # Bulk load speed over crash safety; this is throwaway benchmark data
+            connection.exec_driver_sql("PRAGMA synchronous = OFF")
+        generator.set_start_ids(
+            _next_id(connection, User.__table__), _next_id(connection, Ride.__table__),
+            _next_id(connection, Booking.__table__), _next_id(connection, Rating.__table__),
+        )
+
+        batch = []
+        for row in generator.user_rows(password_hash):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                _insert(connection, User.__table__, USER_COLUMNS, batch)
+                batch = []
+        _insert(connection, User.__table__, USER_COLUMNS, batch)
+        log(f"👤 {users} users in {time.perf_counter() - started:.1f}s")
+
+        counts = {"users": users, "rides": 0, "bookings": 0, "ratings": 0}
+        rating_totals = {}
+        report_every = max(1, math.ceil(rides / batch_size / 10))
+        for number, (ride_rows, booking_rows, rating_rows) in enumerate(generator.ride_batches(batch_size), 1):
+            _insert(connection, Ride.__table__, RIDE_COLUMNS, ride_rows)
+            _insert(connection, Booking.__table__, BOOKING_COLUMNS, booking_rows)
+            _insert(connection, Rating.__table__, RATING_COLUMNS, rating_rows)
+            for row in rating_rows:
+                totals = rating_totals.setdefault(row[2], [0, 0])
+                totals[0] += 1
+                totals[1] += row[4]
+            counts["rides"] += len(ride_rows)
+            counts["bookings"] += len(booking_rows)
+            counts["ratings"] += len(rating_rows)
+            if number % report_every == 0:
+                log(f"🚗 {counts['rides']}/{rides} rides in {time.perf_counter() - started:.1f}s")
+        _add_rating_aggregates(connection, rating_totals)
+
+        if connection.dialect.name == "postgresql":
+            # Explicit ids bypass the sequences; move them past the loaded rows
+            for table in ("users", "rides", "bookings", "ratings"):
+                connection.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"(SELECT COALESCE(MAX(id), 1) FROM {table}))"
+                ))
+
+    elapsed = time.perf_counter() - started
+    return {
+        **counts,
+        "first_user_id": generator.first_user_id,
+        "last_user_id": generator.last_user_id,
+        "first_ride_id": generator.first_ride_id,
+        "seed": seed,
+        "elapsed_s": round(elapsed, 2),
+        "rows_per_s": round(sum(counts.values()) / elapsed),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic UniPool data for capacity testing")
+    parser.add_argument("--users", type=int, default=10000, help="Users to create (every 10th is a driver)")
+    parser.add_argument("--rides", type=int, default=50000, help="Rides to create")
+    parser.add_argument("--bookings-per-ride", type=float, default=1.5, help="Average bookings per ride")
+    parser.add_argument("--rating-rate", type=float, default=0.3, help="Share of completed bookings rated")
+    parser.add_argument("--past-days", type=int, default=60, help="Spread departures this far back")
+    parser.add_argument("--future-days", type=int, default=30, help="Spread departures this far ahead")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed; same seed, same data")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows per INSERT/COPY batch")
+    parser.add_argument("--password", default=DEFAULT_PASSWORD, help="Password for every generated user")
+    args = parser.parse_args()
+
+    print(f"\n🏭 Generating {args.users} users and {args.rides} rides (seed {args.seed})")
+    summary = generate(args.users, args.rides, args.bookings_per_ride, args.rating_rate, args.seed,
+                       args.batch_size, args.password, args.past_days, args.future_days)
+    for key, value in summary.items():
+        print(f"- {key}: {value}")
+    print(f"✅ Done. Log in as {email_for(summary['first_user_id'])} / {args.password}")
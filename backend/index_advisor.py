@@ -0,0 +1,160 @@
+import os
+import sys
+import argparse
+from collections import OrderedDict
+
+# Add the current directory to sys.path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.insert(0, current_dir)
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, text
+
+from app.database import engine, async_engine, SessionLocal
+from app.models.database_models import User, Ride, Booking
+from app import metrics
+from app.auth import create_access_token
+from main import app
+
+# Read-only routes on the hot path: (label, path, query params, who calls it)
+ROUTES = [
+    ("list rides", "/api/rides/", {"limit": 20}, None),
+    ("search by text", "/api/rides/search", {"origin": "Campus", "limit": 20}, None),
+    ("search by text, ranked", "/api/rides/search", {"origin": "Campus", "sort": "relevance", "limit": 20}, None),
+    ("search by date and price", "/api/rides/search", {"min_date": "2000-01-01", "max_price": 1000, "sort": "price"}, None),
+    ("ride detail", "/api/rides/{ride_id}", {}, None),
+    ("my bookings", "/api/bookings/", {}, "passenger"),
+    ("bookings as driver", "/api/bookings/as-driver", {}, "driver"),
+    ("booking detail", "/api/bookings/{booking_id}", {}, "passenger"),
+    ("list users", "/api/users/", {"limit": 20}, "driver"),
+    ("user detail", "/api/users/{driver_id}", {}, None),
+]
+
+
+def capture_statements():
+    """Record the statements requests run on the API's engine until the returned list is detached.
+
+    Background tasks (e.g. the recurring ride refresh) share the engine, but
+    their statements aren't the route's and are left out.
+    """
+    statements = []
+    target = async_engine.sync_engine
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and metrics.in_request():
+            statements.append((statement, parameters))
+
+    event.listen(target, "before_cursor_execute", before_cursor_execute)
+    return statements, lambda: event.remove(target, "before_cursor_execute", before_cursor_execute)
+
+
+async def explain_all(statements, label, verbose):
+    """EXPLAIN captured statements on the API's own driver, so parameter styles match."""
+    route_flags = []
+    async with async_engine.connect() as connection:
+        for statement, parameters in statements:
+            if not statement.lstrip().upper().startswith("SELECT"):
+                continue
+            if "sqlite_master" in statement or "pg_extension" in statement:
+                # Backend detection in app/text_search.py, not a route query
+                continue
+            plan, flagged = await explain(connection, statement, parameters)
+            if verbose:
+                print(f"\n[{label}] {statement}")
+                for line in plan:
+                    print(f"    {line}")
+            route_flags.extend(flagged)
+    return route_flags
+
+
+async def explain(connection, statement, parameters):
+    """Return (plan lines, flagged lines) for one statement."""
+    if engine.dialect.name == "postgresql":
+        rows = (await connection.exec_driver_sql("EXPLAIN " + statement, parameters)).fetchall()
+        plan = [row[0] for row in rows]
+        flagged = [line.strip() for line in plan if "Seq Scan" in line]
+    else:
+        rows = (await connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)).fetchall()
+        plan = [row[-1] for row in rows]
+        # A bare "SCAN <table>" is a full table scan. "SCAN ... USING INDEX" walks an
+        # index in order (Postgres' Index Scan) and virtual (FTS) tables are index-backed.
+        flagged = [
+            line for line in plan
+            if line.startswith("SCAN ") and " USING " not in line
+            and "VIRTUAL TABLE" not in line and "CONSTANT ROW" not in line
+        ]
+    return plan, flagged
+
+
+def sample_ids():
+    db = SessionLocal()
+    try:
+        booking = db.query(Booking).first()
+        ride = db.query(Ride).first()
+        if not booking or not ride:
+            return None
+        driver = db.query(User).filter(User.id == booking.ride.driver_id).first()
+        passenger = db.query(User).filter(User.id == booking.passenger_id).first()
+        return {
+            "ride_id": ride.id,
+            "booking_id": booking.id,
+            "driver_id": driver.id,
+            "driver_email": driver.email,
+            "passenger_email": passenger.email,
+        }
+    finally:
+        db.close()
+
+
+def run_advisor(analyze=True, verbose=False):
+    ids = sample_ids()
+    if ids is None:
+        print("❌ ERROR: Database has no rides or bookings. Seed it first (seed_data.py, or generate_data.py for realistic volumes).")
+        return 2
+
+    if analyze:
+        with engine.begin() as connection:
+            connection.execute(text("ANALYZE"))
+
+    tokens = {
+        "driver": create_access_token({"sub": ids["driver_email"]}),
+        "passenger": create_access_token({"sub": ids["passenger_email"]}),
+    }
+    findings = OrderedDict()
+
+    # One client for the whole run keeps every request (and EXPLAIN) on the same event loop
+    with TestClient(app) as client:
+        for label, path, params, caller in ROUTES:
+            headers = {"Authorization": f"Bearer {tokens[caller]}"} if caller else {}
+            statements, detach = capture_statements()
+            try:
+                response = client.get(path.format(**ids), params=params, headers=headers)
+            finally:
+                detach()
+            if response.status_code != 200:
+                print(f"⚠️  {label}: {path} returned {response.status_code}, skipping")
+                continue
+
+            findings[label] = client.portal.call(explain_all, statements, label, verbose)
+
+    print(f"\n--- Index advisor ({engine.dialect.name}) ---")
+    for label, flagged in findings.items():
+        if flagged:
+            print(f"❌ {label}:")
+            for line in flagged:
+                print(f"    {line}")
+        else:
+            print(f"✅ {label}")
+
+    return 1 if any(findings.values()) else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="EXPLAIN the SQL each hot route generates against DATABASE_URL and flag sequential scans"
+    )
+    parser.add_argument("--no-analyze", action="store_true", help="Don't refresh planner statistics first")
+    parser.add_argument("--verbose", action="store_true", help="Print every statement with its full plan")
+    args = parser.parse_args()
+    sys.exit(run_advisor(analyze=not args.no_analyze, verbose=args.verbose))
@@ -2,7 +2,14 @@ import os
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import users, rides, bookings
+from fastapi.responses import PlainTextResponse
+from app import auth, http_cache, metrics, query_guard, replicas
+from app.database import async_engine
+from app.routes import users, rides, bookings, schedules, realtime, sync, ratings
+from app import recurring
+from app.realtime import start_heartbeat, stop_heartbeat
+from app.pagination import NEXT_CURSOR_HEADER
+from app.passwords import shutdown_password_pool
 
 app = FastAPI(
     title="UniPool API",
@@ -30,12 +37,51 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Last-Modified"],
 )
 
+# Per-route latency, status and SQL metrics, served at /metrics; event streams
+# stay open for hours and have their own gauges
+app.add_middleware(metrics.MetricsMiddleware, exclude=("/metrics", "/api/realtime/rides"))
+replica_engines = [replica.engine.sync_engine for replica in replicas.replicas.replicas]
+for engine in (async_engine.sync_engine, *replica_engines):
+    metrics.instrument_engine(engine)
+
+# Hit rates of the in-process caches
+metrics.caches.watch("principal", auth.principal_cache)
+metrics.caches.watch("ride_response", http_cache.ride_response_cache)
+metrics.caches.watch("recent_writers", replicas.recent_writers)
+
+# Query budgets and N+1 checks when QUERY_GUARD=warn|raise (development and tests)
+query_guard.install(app, async_engine.sync_engine, *replica_engines)
+
+# Read-your-writes: a user's reads skip the replicas for a while after they write
+app.add_middleware(replicas.ReadYourWritesMiddleware)
+
 # Include routers
 app.include_router(users.router, prefix="/api/users", tags=["users"])
+# Before the rides router, whose /{ride_id} would otherwise claim /schedules
+app.include_router(schedules.router, prefix="/api/rides/schedules", tags=["rides"])
 app.include_router(rides.router, prefix="/api/rides", tags=["rides"])
 app.include_router(bookings.router, prefix="/api/bookings", tags=["bookings"])
+app.include_router(ratings.router, prefix="/api/ratings", tags=["ratings"])
+app.include_router(realtime.router, prefix="/api/realtime", tags=["realtime"])
+app.include_router(sync.router, prefix="/api/sync", tags=["sync"])
+
+# Stop the password hashing workers with the app
+app.add_event_handler("shutdown", shutdown_password_pool)
+
+# Keep recurring rides materialized through the rolling window
+app.add_event_handler("startup", recurring.start_refresher)
+app.add_event_handler("shutdown", recurring.stop_refresher)
+
+# Take read replicas out of (and back into) rotation as they fail and recover
+app.add_event_handler("startup", replicas.start_health_checks)
+app.add_event_handler("shutdown", replicas.stop_health_checks)
+
+# Keep idle realtime streams alive through proxies
+app.add_event_handler("startup", start_heartbeat)
+app.add_event_handler("shutdown", stop_heartbeat)
 
 @app.get("/")
 async def root():
@@ -45,6 +91,10 @@ async def root():
 async def health_check():
     return {"status": "healthy", "environment": ENVIRONMENT}
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
     uvicorn.run("main:app", host="0.0.0.0", port=port, reload=ENVIRONMENT=="development")
@@ -0,0 +1,37 @@
+"""add ride coordinates and geohash indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2025-07-05
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table('rides') as batch_op:
+        batch_op.add_column(sa.Column('origin_lat', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('origin_lng', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('destination_lat', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('destination_lng', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('origin_geohash', sa.String(length=12), nullable=True))
+        batch_op.add_column(sa.Column('destination_geohash', sa.String(length=12), nullable=True))
+    op.create_index(op.f('ix_rides_origin_geohash'), 'rides', ['origin_geohash'], unique=False)
+    op.create_index(op.f('ix_rides_destination_geohash'), 'rides', ['destination_geohash'], unique=False)
+
+def downgrade():
+    op.drop_index(op.f('ix_rides_destination_geohash'), table_name='rides')
+    op.drop_index(op.f('ix_rides_origin_geohash'), table_name='rides')
+    with op.batch_alter_table('rides') as batch_op:
+        batch_op.drop_column('destination_geohash')
+        batch_op.drop_column('origin_geohash')
+        batch_op.drop_column('destination_lng')
+        batch_op.drop_column('destination_lat')
+        batch_op.drop_column('origin_lng')
+        batch_op.drop_column('origin_lat')
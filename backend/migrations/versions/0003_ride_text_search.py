@@ -0,0 +1,54 @@
+"""add text-search indexes on ride origin and destination
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2025-07-05
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute("CREATE INDEX IF NOT EXISTS ix_rides_origin_trgm ON rides USING gin (origin gin_trgm_ops)")
+        op.execute("CREATE INDEX IF NOT EXISTS ix_rides_destination_trgm ON rides USING gin (destination gin_trgm_ops)")
+    elif dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS rides_fts USING fts5("
+            "origin, destination, content='rides', content_rowid='id', tokenize='trigram')"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS rides_fts_ai AFTER INSERT ON rides BEGIN "
+            "INSERT INTO rides_fts(rowid, origin, destination) VALUES (new.id, new.origin, new.destination); END"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS rides_fts_ad AFTER DELETE ON rides BEGIN "
+            "INSERT INTO rides_fts(rides_fts, rowid, origin, destination) "
+            "VALUES ('delete', old.id, old.origin, old.destination); END"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS rides_fts_au AFTER UPDATE OF origin, destination ON rides BEGIN "
+            "INSERT INTO rides_fts(rides_fts, rowid, origin, destination) "
+            "VALUES ('delete', old.id, old.origin, old.destination); "
+            "INSERT INTO rides_fts(rowid, origin, destination) VALUES (new.id, new.origin, new.destination); END"
+        )
+        # Index the rides that already exist
+        op.execute("INSERT INTO rides_fts(rides_fts) VALUES ('rebuild')")
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_rides_destination_trgm")
+        op.execute("DROP INDEX IF EXISTS ix_rides_origin_trgm")
+    elif dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS rides_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS rides_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS rides_fts_ai")
+        op.execute("DROP TABLE IF EXISTS rides_fts")
@@ -0,0 +1,44 @@
+"""add indexes for ride search and booking lookups
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2025-07-12
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_rides_status_departure_time', 'rides', ['status', 'departure_time']),
+    ('ix_rides_driver_id', 'rides', ['driver_id']),
+    ('ix_bookings_passenger_id', 'bookings', ['passenger_id']),
+    ('ix_bookings_ride_id', 'bookings', ['ride_id']),
+    # Keyset pagination order of GET /api/rides/ and GET /api/users/
+    ('ix_rides_departure_time_id', 'rides', ['departure_time', 'id']),
+    ('ix_users_created_at_id', 'users', ['created_at', 'id']),
+]
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # CREATE INDEX CONCURRENTLY can't run inside a transaction, but it
+        # doesn't block writes to the (live) tables while it builds
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+    else:
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, if_not_exists=True)
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, _ in reversed(INDEXES):
+                op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+    else:
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True)
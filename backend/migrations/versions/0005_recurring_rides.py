@@ -0,0 +1,70 @@
+"""add recurring ride schedules
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2025-07-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.database_models import RIDES_SEARCH_DDL
+
+# revision identifiers, used by Alembic
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'ride_schedules',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('driver_id', sa.Integer(), nullable=True),
+        sa.Column('origin', sa.String(), nullable=True),
+        sa.Column('destination', sa.String(), nullable=True),
+        sa.Column('origin_lat', sa.Float(), nullable=True),
+        sa.Column('origin_lng', sa.Float(), nullable=True),
+        sa.Column('destination_lat', sa.Float(), nullable=True),
+        sa.Column('destination_lng', sa.Float(), nullable=True),
+        sa.Column('departure_time', sa.Time(), nullable=True),
+        sa.Column('weekdays', sa.Integer(), nullable=True),
+        sa.Column('starts_on', sa.Date(), nullable=True),
+        sa.Column('ends_on', sa.Date(), nullable=True),
+        sa.Column('available_seats', sa.Integer(), nullable=True),
+        sa.Column('price', sa.Float(), nullable=True),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('materialized_until', sa.Date(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['driver_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_ride_schedules_id'), 'ride_schedules', ['id'], unique=False)
+    op.create_index(op.f('ix_ride_schedules_driver_id'), 'ride_schedules', ['driver_id'], unique=False)
+
+    if op.get_bind().dialect.name == 'sqlite':
+        # A plain ADD COLUMN: batch mode would rebuild rides and drop its full-text triggers
+        op.execute("ALTER TABLE rides ADD COLUMN schedule_id INTEGER REFERENCES ride_schedules (id)")
+    else:
+        op.add_column('rides', sa.Column('schedule_id', sa.Integer(), nullable=True))
+        op.create_foreign_key('fk_rides_schedule_id', 'rides', 'ride_schedules', ['schedule_id'], ['id'])
+    op.create_index('ix_rides_schedule_id_departure_time', 'rides', ['schedule_id', 'departure_time'], unique=True)
+
+def downgrade():
+    op.drop_index('ix_rides_schedule_id_departure_time', table_name='rides')
+    if op.get_bind().dialect.name == 'sqlite':
+        # SQLite can't drop a column with a foreign key in place; the rebuilt
+        # table loses its full-text triggers, so put them back
+        with op.batch_alter_table('rides') as batch_op:
+            batch_op.drop_column('schedule_id')
+        for statement in RIDES_SEARCH_DDL['sqlite']:
+            op.execute(statement)
+        op.execute("INSERT INTO rides_fts(rides_fts) VALUES ('rebuild')")
+    else:
+        op.drop_constraint('fk_rides_schedule_id', 'rides', type_='foreignkey')
+        op.drop_column('rides', 'schedule_id')
+    op.drop_index(op.f('ix_ride_schedules_driver_id'), table_name='ride_schedules')
+    op.drop_index(op.f('ix_ride_schedules_id'), table_name='ride_schedules')
+    op.drop_table('ride_schedules')
@@ -0,0 +1,23 @@
+"""add the driver's route polyline to rides
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2025-07-26
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # A plain ADD COLUMN on every backend; on SQLite it leaves the full-text triggers alone
+    op.add_column('rides', sa.Column('route_polyline', sa.Text(), nullable=True))
+
+def downgrade():
+    # SQLite 3.35+ drops a column without rebuilding the table
+    op.drop_column('rides', 'route_polyline')
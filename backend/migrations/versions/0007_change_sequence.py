@@ -0,0 +1,102 @@
+"""add change sequence numbers to rides and bookings for delta sync
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2025-08-02
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+CHANGE_SEQUENCE_TABLES = ('rides', 'bookings')
+
+# revision identifiers, used by Alembic
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+def change_sequence_ddl(dialect):
+    """The stamping triggers as of this revision (0011 replaces them)."""
+    if dialect == 'sqlite':
+        statements = []
+        for table in CHANGE_SEQUENCE_TABLES:
+            stamp = (
+                "UPDATE sync_sequence SET value = value + 1 WHERE id = 1; "
+                f"UPDATE {table} SET change_seq = (SELECT value FROM sync_sequence WHERE id = 1) WHERE id = new.id; END"
+            )
+            statements.append(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_change_seq_ai AFTER INSERT ON {table} BEGIN {stamp}"
+            )
+            statements.append(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_change_seq_au AFTER UPDATE ON {table} "
+                f"WHEN new.change_seq IS old.change_seq BEGIN {stamp}"
+            )
+        return statements
+    if dialect == 'postgresql':
+        statements = [
+            "CREATE OR REPLACE FUNCTION stamp_change_seq() RETURNS trigger AS $$ BEGIN "
+            "UPDATE sync_sequence SET value = value + 1 WHERE id = 1 RETURNING value INTO NEW.change_seq; "
+            "RETURN NEW; END $$ LANGUAGE plpgsql",
+        ]
+        for table in CHANGE_SEQUENCE_TABLES:
+            statements.append(f"DROP TRIGGER IF EXISTS {table}_change_seq ON {table}")
+            statements.append(
+                f"CREATE TRIGGER {table}_change_seq BEFORE INSERT OR UPDATE ON {table} "
+                "FOR EACH ROW EXECUTE FUNCTION stamp_change_seq()"
+            )
+        return statements
+    return []
+
+INDEXES = [
+    ('ix_rides_driver_id_change_seq', 'rides', ['driver_id', 'change_seq']),
+    ('ix_bookings_passenger_id_change_seq', 'bookings', ['passenger_id', 'change_seq']),
+    ('ix_bookings_ride_id_change_seq', 'bookings', ['ride_id', 'change_seq']),
+]
+
+def upgrade():
+    op.create_table(
+        'sync_sequence',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('value', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    for table in CHANGE_SEQUENCE_TABLES:
+        # A plain ADD COLUMN on every backend; on SQLite it leaves the full-text triggers alone
+        op.add_column(table, sa.Column('change_seq', sa.BigInteger(), nullable=True))
+
+    # Number the existing rows in the order they last changed
+    bind = op.get_bind()
+    rows = []
+    for table in CHANGE_SEQUENCE_TABLES:
+        rows.extend(
+            (updated_at, table, row_id)
+            for row_id, updated_at in bind.execute(sa.text(f"SELECT id, updated_at FROM {table}"))
+        )
+    rows.sort(key=lambda row: (row[0] is not None, row[0] or '', row[1], row[2]))
+    for table in CHANGE_SEQUENCE_TABLES:
+        numbered = [{'seq': seq, 'id': row_id} for seq, (_, name, row_id) in enumerate(rows, 1) if name == table]
+        if numbered:
+            bind.execute(sa.text(f"UPDATE {table} SET change_seq = :seq WHERE id = :id"), numbered)
+    bind.execute(sa.text("INSERT INTO sync_sequence (id, value) VALUES (1, :value)"), {'value': len(rows)})
+
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+    for statement in change_sequence_ddl(bind.dialect.name):
+        op.execute(statement)
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        for table in CHANGE_SEQUENCE_TABLES:
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_change_seq_ai")
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_change_seq_au")
+    elif op.get_bind().dialect.name == 'postgresql':
+        for table in CHANGE_SEQUENCE_TABLES:
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_change_seq ON {table}")
+        op.execute("DROP FUNCTION IF EXISTS stamp_change_seq()")
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
+    for table in CHANGE_SEQUENCE_TABLES:
+        # SQLite 3.35+ drops a column without rebuilding the table
+        op.drop_column(table, 'change_seq')
+    op.drop_table('sync_sequence')
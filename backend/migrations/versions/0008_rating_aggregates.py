@@ -0,0 +1,50 @@
+"""add per-user rating aggregates and rating indexes
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2025-08-09
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_ratings_rated_id_created_at_id', 'ratings', ['rated_id', 'created_at', 'id'], False),
+    ('ix_ratings_ride_id', 'ratings', ['ride_id'], False),
+    ('ix_ratings_rater_id_rated_id_ride_id', 'ratings', ['rater_id', 'rated_id', 'ride_id'], True),
+]
+
+def upgrade():
+    # Plain ADD COLUMNs on every backend; none of these tables has triggers to lose
+    op.add_column('users', sa.Column('rating_count', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('users', sa.Column('rating_sum', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('ratings', sa.Column('rated_as', sa.String(), nullable=True))
+
+    # Aggregate the ratings left so far; from here on each insert updates them
+    op.execute(
+        "UPDATE users SET "
+        "rating_count = (SELECT COUNT(*) FROM ratings WHERE ratings.rated_id = users.id), "
+        "rating_sum = (SELECT COALESCE(SUM(rating), 0) FROM ratings WHERE ratings.rated_id = users.id) "
+        "WHERE id IN (SELECT rated_id FROM ratings)"
+    )
+    op.execute(
+        "UPDATE ratings SET rated_as = CASE WHEN rated_id = "
+        "(SELECT driver_id FROM rides WHERE rides.id = ratings.ride_id) THEN 'driver' ELSE 'rider' END "
+        "WHERE ride_id IS NOT NULL"
+    )
+    for name, table, columns, unique in INDEXES:
+        op.create_index(name, table, columns, unique=unique)
+
+def downgrade():
+    for name, table, _, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
+    # SQLite 3.35+ drops a column without rebuilding the table
+    op.drop_column('ratings', 'rated_as')
+    op.drop_column('users', 'rating_sum')
+    op.drop_column('users', 'rating_count')
@@ -0,0 +1,39 @@
+"""add indexes for paginated booking lists
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2025-08-16
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    # Keyset pagination order of a passenger's bookings and of the bookings on each of a driver's rides
+    ('ix_bookings_passenger_id_created_at_id', 'bookings', ['passenger_id', 'created_at', 'id']),
+    ('ix_bookings_ride_id_created_at_id', 'bookings', ['ride_id', 'created_at', 'id']),
+]
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # Built without blocking writes to the live bookings table (see 0004)
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+    else:
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, if_not_exists=True)
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, _ in reversed(INDEXES):
+                op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+    else:
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,23 @@
+"""index the recurring ride refresh's schedule lookup
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2025-08-16
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index(
+        'ix_ride_schedules_is_active_materialized_until', 'ride_schedules', ['is_active', 'materialized_until'],
+        unique=False
+    )
+
+def downgrade():
+    op.drop_index('ix_ride_schedules_is_active_materialized_until', table_name='ride_schedules')
@@ -0,0 +1,68 @@
+"""stamp change sequence numbers from a PostgreSQL sequence, with the time taken
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2025-08-23
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.database_models import CHANGE_SEQUENCE_DDL, CHANGE_SEQUENCE_TABLES
+
+# revision identifiers, used by Alembic
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    bind = op.get_bind()
+    # Off while changed_at is filled in, so the backfill doesn't renumber every row
+    for table in CHANGE_SEQUENCE_TABLES:
+        if bind.dialect.name == 'sqlite':
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_change_seq_ai")
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_change_seq_au")
+        elif bind.dialect.name == 'postgresql':
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_change_seq ON {table}")
+
+    for table in CHANGE_SEQUENCE_TABLES:
+        op.add_column(table, sa.Column('changed_at', sa.DateTime(timezone=True), nullable=True))
+        # Existing rows are already committed, so any time up to now will do
+        # (updated_at is local time, which would hold them back on SQLite)
+        op.execute(f"UPDATE {table} SET changed_at = CURRENT_TIMESTAMP")
+
+    if bind.dialect.name == 'postgresql':
+        # Carry on from the counter row, which the new trigger function no longer locks
+        value = bind.scalar(sa.text("SELECT value FROM sync_sequence WHERE id = 1")) or 0
+        op.execute(f"CREATE SEQUENCE change_seq START WITH {value + 1}")
+    for statement in CHANGE_SEQUENCE_DDL.get(bind.dialect.name, []):
+        op.execute(statement)
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        for table in CHANGE_SEQUENCE_TABLES:
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_change_seq_ai")
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_change_seq_au")
+            stamp = (
+                "UPDATE sync_sequence SET value = value + 1 WHERE id = 1; "
+                f"UPDATE {table} SET change_seq = (SELECT value FROM sync_sequence WHERE id = 1) WHERE id = new.id; END"
+            )
+            op.execute(f"CREATE TRIGGER {table}_change_seq_ai AFTER INSERT ON {table} BEGIN {stamp}")
+            op.execute(
+                f"CREATE TRIGGER {table}_change_seq_au AFTER UPDATE ON {table} "
+                f"WHEN new.change_seq IS old.change_seq BEGIN {stamp}"
+            )
+    elif bind.dialect.name == 'postgresql':
+        op.execute(
+            "UPDATE sync_sequence SET value = (SELECT last_value FROM change_seq) WHERE id = 1"
+        )
+        op.execute(
+            "CREATE OR REPLACE FUNCTION stamp_change_seq() RETURNS trigger AS $$ BEGIN "
+            "UPDATE sync_sequence SET value = value + 1 WHERE id = 1 RETURNING value INTO NEW.change_seq; "
+            "RETURN NEW; END $$ LANGUAGE plpgsql"
+        )
+        op.execute("DROP SEQUENCE change_seq")
+    for table in CHANGE_SEQUENCE_TABLES:
+        op.drop_column(table, 'changed_at')
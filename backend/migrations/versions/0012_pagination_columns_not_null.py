@@ -0,0 +1,50 @@
+"""make the columns paginated lists are ordered by NOT NULL
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2025-08-30
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.database_models import CHANGE_SEQUENCE_DDL, RIDES_SEARCH_DDL
+
+# revision identifiers, used by Alembic
+revision = '0012'
+down_revision = '0011'
+branch_labels = None
+depends_on = None
+
+# Keyset pagination compares (column, id) tuples, which never reach a NULL
+COLUMNS = [
+    ('users', 'created_at', "COALESCE(updated_at, CURRENT_TIMESTAMP)"),
+    ('rides', 'created_at', "COALESCE(updated_at, CURRENT_TIMESTAMP)"),
+    ('rides', 'departure_time', "created_at"),
+    ('bookings', 'created_at', "COALESCE(updated_at, CURRENT_TIMESTAMP)"),
+    ('ratings', 'created_at', "CURRENT_TIMESTAMP"),
+]
+
+def _set_nullable(nullable):
+    if op.get_bind().dialect.name != 'sqlite':
+        for table, column, _ in COLUMNS:
+            op.alter_column(table, column, existing_type=sa.DateTime(), nullable=nullable)
+        return
+    # SQLite can only change a column's constraints by rebuilding the table,
+    # which drops the triggers on it; put them back afterwards (see 0005)
+    for table in dict.fromkeys(table for table, _, _ in COLUMNS):
+        with op.batch_alter_table(table) as batch_op:
+            for name, column, _ in COLUMNS:
+                if name == table:
+                    batch_op.alter_column(column, existing_type=sa.DateTime(), nullable=nullable)
+    for statement in RIDES_SEARCH_DDL['sqlite'] + CHANGE_SEQUENCE_DDL['sqlite']:
+        op.execute(statement)
+    op.execute("INSERT INTO rides_fts(rides_fts) VALUES ('rebuild')")
+
+def upgrade():
+    for table, column, fallback in COLUMNS:
+        op.execute(f"UPDATE {table} SET {column} = {fallback} WHERE {column} IS NULL")
+    _set_nullable(False)
+
+def downgrade():
+    _set_nullable(True)
@@ -0,0 +1,44 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.routes import bookings
+from main import app
+
+
+def test_cancel_and_reject_race_returns_seats_once(client, login, ride_payload, monkeypatch):
+    driver = login("race.driver@example.com", "driver")
+    rider = login("race.rider@example.com", "rider")
+    ride_id = client.post("/api/rides/", json=ride_payload, headers=driver).json()["id"]
+    booking_id = client.post("/api/bookings/", json={"ride_id": ride_id, "seats": 2}, headers=rider).json()["id"]
+    assert client.get(f"/api/rides/{ride_id}").json()["available_seats"] == 1
+
+    # Hold both requests until each has read the booking as pending
+    barrier = asyncio.Barrier(2)
+    set_status = bookings._set_status
+
+    async def racing_set_status(*args):
+        await barrier.wait()
+        return await set_status(*args)
+
+    monkeypatch.setattr(bookings, "_set_status", racing_set_status)
+
+    async def race():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+            return await asyncio.gather(
+                http.put(f"/api/bookings/{booking_id}", json={"status": "cancelled"}, headers=rider),
+                http.put(f"/api/bookings/{booking_id}/reject", headers=driver),
+            )
+
+    cancelled, rejected = asyncio.run(race())
+    assert sorted([cancelled.status_code, rejected.status_code]) == [200, 400]
+    loser = cancelled if cancelled.status_code == 400 else rejected
+    assert loser.json()["detail"] in ("Booking is already cancelled", "Booking is already rejected")
+    # One of them returned the two seats; the other returned none
+    assert client.get(f"/api/rides/{ride_id}").json()["available_seats"] == 3
+    print("✅ a cancel racing a reject returns the seats once")
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__]))
@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.geo import encode_polyline
+from app.matching import RideIndex
+
+CAMPUS = (31.4707, 74.4098)
+GULBERG = (31.5204, 74.3487)
+DEPARTURE = datetime(2030, 1, 7, 8, 0)
+
+
+def ride(ride_id, origin, destination, minutes=0, price=150.0, seats=3, driver_id=1, route=None):
+    return (ride_id, driver_id, DEPARTURE + timedelta(minutes=minutes), origin[0], origin[1],
+            destination[0], destination[1], price, seats, encode_polyline(route) if route else None)
+
+
+def match(rows, ratings=None, **kwargs):
+    rows = sorted(rows, key=lambda row: row[2])
+    index = RideIndex(rows, ratings or {}, generation=0)
+    options = dict(window_minutes=60, radius_km=3.0, limit=10)
+    options.update(kwargs)
+    ids, scores, pickup, dropoff = index.match(GULBERG, CAMPUS, DEPARTURE, **options)
+    return ids.tolist()
+
+
+def test_ranks_by_distance_time_and_price():
+    near = (GULBERG[0] + 0.002, GULBERG[1])    # ~220 m from the rider
+    farther = (GULBERG[0] + 0.015, GULBERG[1])  # ~1.7 km
+    rows = [
+        ride(1, farther, CAMPUS),
+        ride(2, near, CAMPUS),
+        ride(3, near, CAMPUS, minutes=50),
+        ride(4, near, CAMPUS, price=400.0),
+    ]
+    assert match(rows) == [2, 4, 3, 1]
+    print("✅ closer, sooner and cheaper rides rank first")
+
+
+def test_filters_window_radius_seats_and_price():
+    rows = [
+        ride(1, GULBERG, CAMPUS),
+        ride(2, GULBERG, CAMPUS, minutes=90),           # outside the hour window
+        ride(3, (31.60, 74.35), CAMPUS),                # pickup ~9 km away
+        ride(4, GULBERG, (31.40, 74.41)),               # drop-off ~8 km away
+        ride(5, GULBERG, CAMPUS, seats=1),
+        ride(6, GULBERG, CAMPUS, price=900.0),
+    ]
+    assert match(rows, seats=2, max_price=500.0) == [1]
+    assert match([], seats=1) == []
+    print("✅ window, radius, seats and price filters")
+
+
+def test_rating_breaks_ties_and_limit_applies():
+    rows = [ride(i, GULBERG, CAMPUS, driver_id=i) for i in range(1, 21)]
+    ratings = {7: 5.0, 3: 4.8, 12: 1.0}
+    top = match(rows, ratings, limit=3)
+    assert top[:2] == [7, 3] and 12 not in top and len(top) == 3
+    print("✅ driver rating and top-k")
+
+
+# Campus to DHA by way of a point due east of Gulberg
+DHA = (31.4800, 74.4600)
+VIA = (31.5204, 74.3900)
+
+
+def corridor(rows, origin, destination, **kwargs):
+    rows = sorted(rows, key=lambda row: row[2])
+    index = RideIndex(rows, {}, generation=0)
+    options = dict(window_minutes=60, max_km=0.5, limit=10)
+    options.update(kwargs)
+    ids, scores, pickup, dropoff, pickup_along, dropoff_along = index.corridor(
+        origin, destination, DEPARTURE, **options
+    )
+    return ids.tolist(), pickup_along.tolist(), dropoff_along.tolist()
+
+
+def test_corridor_follows_route_and_direction():
+    route = [GULBERG, VIA, DHA]
+    rows = [
+        ride(1, GULBERG, DHA, route=route),
+        ride(2, GULBERG, DHA),              # no stored route: straight line, far from VIA
+        ride(3, DHA, GULBERG, route=route[::-1]),
+    ]
+    # A rider near the bend, going on towards DHA: only the routed ride passes both points
+    on_the_way = (VIA[0] + 0.002, VIA[1])
+    near_dha = (DHA[0], DHA[1] - 0.003)
+    ids, pickup_along, dropoff_along = corridor(rows, on_the_way, near_dha)
+    assert ids == [1]
+    assert 3.5 < pickup_along[0] < dropoff_along[0]
+    # Going the other way along the same roads matches only the reversed ride
+    assert corridor(rows, near_dha, on_the_way)[0] == [3]
+    # Off the route by more than the allowed detour
+    assert corridor(rows, (VIA[0] + 0.02, VIA[1]), near_dha)[0] == []
+    print("✅ corridor distance, order and detour")
+
+
+def test_corridor_falls_back_to_straight_line():
+    rows = [ride(1, GULBERG, CAMPUS)]
+    midpoint = ((GULBERG[0] + CAMPUS[0]) / 2, (GULBERG[1] + CAMPUS[1]) / 2)
+    assert corridor(rows, midpoint, CAMPUS)[0] == [1]
+    assert corridor(rows, CAMPUS, midpoint)[0] == []
+    assert corridor([], midpoint, CAMPUS)[0] == []
+    print("✅ rides without a route use the straight line")
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__]))
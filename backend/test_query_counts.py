@@ -0,0 +1,193 @@
+from contextlib import contextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, select
+
+from app import query_guard
+from app.database import async_engine, AsyncSessionLocal
+from app.auth import principal_cache
+from app.models.database_models import Booking
+from app.query_guard import QueryGuardMiddleware, RepeatedStatement, UnintendedLazyLoad, track_queries
+from main import app
+
+# Statements each write endpoint may run once the caller's principal is cached.
+# The COMMIT itself isn't counted.
+QUERY_BUDGETS = {
+    "create ride": 1,       # INSERT
+    "update ride": 2,       # SELECT ride, UPDATE
+    "create booking": 3,    # SELECT ride + driver, UPDATE seats RETURNING, INSERT
+    "cancel booking": 3,    # SELECT booking + relations, UPDATE booking, UPDATE seats RETURNING
+    "approve booking": 2,   # SELECT booking + relations, UPDATE booking
+    "reject booking": 3,    # SELECT booking + relations, UPDATE booking, UPDATE seats RETURNING
+    "batch booking": 4,     # SELECT rides + drivers, SELECT passengers, UPDATE seats RETURNING, INSERT
+}
+
+
+@pytest.fixture
+def guarded_client(database):
+    """A client whose requests fail on route budget overruns, repeated statements and lazy loads."""
+    query_guard.attach(async_engine.sync_engine)
+    return TestClient(QueryGuardMiddleware(app, mode="raise"))
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+def check(label, statements, response):
+    assert response.status_code == 200, f"{label}: {response.status_code} {response.text}"
+    budget = QUERY_BUDGETS[label]
+    assert len(statements) <= budget, (
+        f"{label}: {len(statements)} statements, budget {budget}:\n" + "\n".join(statements)
+    )
+    print(f"✅ {label}: {len(statements)} statements (budget {budget})")
+
+
+def test_write_endpoint_query_counts(client, login, ride_payload):
+    # login() warms the principal cache, so only the endpoint's own statements are counted
+    driver = login("counts.driver@example.com", "driver")
+    rider = login("counts.rider@example.com", "rider")
+
+    with count_queries() as statements:
+        response = client.post("/api/rides/", json=ride_payload, headers=driver)
+    check("create ride", statements, response)
+    ride_id = response.json()["id"]
+
+    with count_queries() as statements:
+        response = client.put(f"/api/rides/{ride_id}", json={"price": 6.0}, headers=driver)
+    check("update ride", statements, response)
+
+    bookings = []
+    for _ in range(3):
+        with count_queries() as statements:
+            response = client.post("/api/bookings/", json={"ride_id": ride_id, "seats": 1}, headers=rider)
+        check("create booking", statements, response)
+        bookings.append(response.json()["id"])
+    assert response.json()["ride"]["available_seats"] == 0
+
+    with count_queries() as statements:
+        response = client.put(f"/api/bookings/{bookings[0]}", json={"status": "cancelled"}, headers=rider)
+    check("cancel booking", statements, response)
+    assert response.json()["ride"]["available_seats"] == 1
+
+    with count_queries() as statements:
+        response = client.put(f"/api/bookings/{bookings[1]}/approve", headers=driver)
+    check("approve booking", statements, response)
+
+    with count_queries() as statements:
+        response = client.put(f"/api/bookings/{bookings[2]}/reject", headers=driver)
+    check("reject booking", statements, response)
+    assert response.json()["ride"]["available_seats"] == 2
+
+
+def test_batch_booking_is_all_or_nothing(client, login, ride_payload):
+    driver = login("batch.driver@example.com", "driver")
+    rider = login("batch.rider@example.com", "rider")
+    login("batch.friend@example.com", "rider")
+    friend_id = client.get("/api/users/?limit=500", headers=rider).json()[-1]["id"]
+    outbound = client.post("/api/rides/", json=ride_payload, headers=driver).json()["id"]
+    back = client.post("/api/rides/", json={**ride_payload, "origin": "Downtown", "destination": "University Campus"},
+                       headers=driver).json()["id"]
+
+    # Nobody books a seat for someone else on another driver's ride
+    response = client.post("/api/bookings/batch", headers=rider, json={"bookings": [
+        {"ride_id": outbound, "seats": 1}, {"ride_id": outbound, "seats": 1, "passenger_id": friend_id},
+    ]})
+    assert response.status_code == 403, response.text
+
+    # A round trip for the rider, and the driver seating a friend on both legs
+    response = client.post("/api/bookings/batch", headers=rider, json={"bookings": [
+        {"ride_id": outbound, "seats": 1}, {"ride_id": back, "seats": 1},
+    ]})
+    assert response.status_code == 200, response.text
+    batch = {"bookings": [
+        {"ride_id": outbound, "seats": 1, "passenger_id": friend_id},
+        {"ride_id": back, "seats": 1, "passenger_id": friend_id},
+    ]}
+    with count_queries() as statements:
+        response = client.post("/api/bookings/batch", json=batch, headers=driver)
+    check("batch booking", statements, response)
+    bookings = response.json()
+    assert [booking["ride"]["available_seats"] for booking in bookings] == [1, 1]
+    assert [booking["passenger"]["id"] for booking in bookings] == [friend_id, friend_id]
+
+    # The return leg can't take two more, so the outbound seat isn't taken either
+    response = client.post("/api/bookings/batch", headers=rider, json={"bookings": [
+        {"ride_id": outbound, "seats": 1}, {"ride_id": back, "seats": 2},
+    ]})
+    assert response.status_code == 400, response.text
+    assert client.get(f"/api/rides/{outbound}").json()["available_seats"] == 1
+    print("✅ batch booking: all or nothing")
+
+
+def test_read_endpoints_within_route_budgets(guarded_client, login, ride_payload):
+    # Each request runs under the guard's @query_budget for its route; a cold
+    # principal cache makes the authenticated ones pay for the user lookup too
+    client = guarded_client
+    driver = login("budgets.driver@example.com", "driver")
+    rider = login("budgets.rider@example.com", "rider")
+    ride_id = client.post("/api/rides/", json=ride_payload, headers=driver).json()["id"]
+    booking_id = client.post("/api/bookings/", json={"ride_id": ride_id, "seats": 1}, headers=rider).json()["id"]
+
+    for path, headers in [
+        ("/api/rides/?limit=100", None),
+        (f"/api/rides/{ride_id}", None),
+        ("/api/rides/search?origin=Campus", None),
+        ("/api/rides/match?origin_lat=31.52&origin_lng=74.35&destination_lat=31.47&destination_lng=74.41"
+         "&departure_time=2030-01-01T08:00:00", None),
+        ("/api/rides/corridor?origin_lat=31.52&origin_lng=74.35&destination_lat=31.47&destination_lng=74.41"
+         "&departure_time=2030-01-01T08:00:00", None),
+        ("/api/bookings/", rider),
+        ("/api/bookings/as-driver", driver),
+        (f"/api/bookings/{booking_id}", rider),
+        ("/api/users/?limit=100", rider),
+        ("/api/sync?since=0", driver),
+        (f"/api/ratings/ride/{ride_id}", None),
+    ]:
+        principal_cache.clear()
+        response = client.get(path, headers=headers)
+        assert response.status_code == 200, f"{path}: {response.status_code} {response.text}"
+        print(f"✅ {path}: within budget")
+
+
+def test_guard_catches_lazy_loads_and_loops(guarded_client, login, ride_payload):
+    client = guarded_client
+    driver = login("guard.driver@example.com", "driver")
+    rider = login("guard.rider@example.com", "rider")
+    ride_id = client.post("/api/rides/", json=ride_payload, headers=driver).json()["id"]
+    client.post("/api/bookings/", json={"ride_id": ride_id, "seats": 1}, headers=rider)
+
+    async def lazy_load():
+        async with AsyncSessionLocal() as db:
+            booking = await db.scalar(select(Booking).limit(1))
+            with track_queries("lazy load"):
+                return booking.ride
+
+    async def loop():
+        async with AsyncSessionLocal() as db:
+            with track_queries("loop"):
+                for booking_id in range(3):
+                    await db.get(Booking, booking_id + 1000)
+
+    # Run on the app's event loop, where the async engine's connections live
+    with client:
+        with pytest.raises(UnintendedLazyLoad, match="Booking.ride"):
+            client.portal.call(lazy_load)
+        with pytest.raises(RepeatedStatement):
+            client.portal.call(loop)
+    print("✅ lazy load and repeated statement caught")
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__]))
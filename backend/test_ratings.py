@@ -0,0 +1,70 @@
+import pytest
+from sqlalchemy import func, select
+
+from app.database import SessionLocal
+from app.models.database_models import Rating, User
+
+
+def test_ratings_update_driver_aggregates(client, login, ride_payload):
+    driver = login("ratings.driver@example.com", "driver")
+    rider = login("ratings.rider@example.com", "rider")
+    other = login("ratings.other@example.com", "rider")
+    friend = login("ratings.friend@example.com", "rider")
+    driver_id = client.get("/api/users/me", headers=driver).json()["id"]
+    rider_id = client.get("/api/users/me", headers=rider).json()["id"]
+
+    ride_id = client.post("/api/rides/", json=ride_payload, headers=driver).json()["id"]
+    for headers in (rider, friend):
+        booking_id = client.post("/api/bookings/", json={"ride_id": ride_id, "seats": 1}, headers=headers).json()["id"]
+        client.put(f"/api/bookings/{booking_id}/approve", headers=driver)
+    to_driver = {"rated_id": driver_id, "ride_id": ride_id, "rating": 4, "comment": "On time"}
+
+    # Not before the ride has happened, and only between people who shared it
+    assert client.post("/api/ratings/", json=to_driver, headers=rider).status_code == 400
+    client.put(f"/api/rides/{ride_id}", json={"status": "completed"}, headers=driver)
+    assert client.post("/api/ratings/", json=to_driver, headers=other).status_code == 403
+
+    response = client.post("/api/ratings/", json=to_driver, headers=rider)
+    assert response.status_code == 200, response.text
+    assert response.json()["rated_as"] == "driver"
+    assert response.json()["rater"]["id"] == rider_id
+    assert client.post("/api/ratings/", json=to_driver, headers=rider).status_code == 400
+    assert client.post("/api/ratings/", json={**to_driver, "rating": 2}, headers=friend).status_code == 200
+    back = client.post("/api/ratings/", json={"rated_id": rider_id, "ride_id": ride_id, "rating": 5}, headers=driver)
+    assert back.json()["rated_as"] == "rider"
+
+    # The driver's average travels with every ride response
+    driver_view = client.get(f"/api/rides/{ride_id}").json()["driver"]
+    assert (driver_view["average_rating"], driver_view["rating_count"]) == (3.0, 2)
+    # The driver's cached principal was dropped too
+    me = client.get("/api/users/me", headers=driver).json()
+    assert (me["average_rating"], me["rating_count"]) == (3.0, 2)
+    assert [rating["rating"] for rating in client.get(f"/api/ratings/user/{driver_id}").json()] == [4, 2]
+    assert len(client.get(f"/api/ratings/ride/{ride_id}").json()) == 3
+    print("✅ ratings update the rated user's aggregates")
+
+
+def test_generated_ratings_match_aggregates(database):
+    from generate_data import generate
+
+    generate(50, 300, rating_rate=0.8, log=lambda message: None)
+    db = SessionLocal()
+    try:
+        expected = dict(
+            (rated_id, (count, total)) for rated_id, count, total in db.execute(
+                select(Rating.rated_id, func.count(), func.sum(Rating.rating)).group_by(Rating.rated_id)
+            )
+        )
+        actual = dict(
+            (user_id, (count, total)) for user_id, count, total in db.execute(
+                select(User.id, User.rating_count, User.rating_sum).filter(User.rating_count > 0)
+            )
+        )
+    finally:
+        db.close()
+    assert expected and actual == expected
+    print("✅ generated ratings are reflected in the aggregates")
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__]))
@@ -0,0 +1,141 @@
+import json
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from app import geo, realtime
+from app.models.database_models import Ride
+from app.realtime import DROPPED, Broadcaster
+
+CAMPUS = (31.4707, 74.4098)
+GULBERG = (31.5204, 74.3487)
+
+
+def payloads(subscription):
+    events = []
+    while subscription.pending:
+        frame = subscription.pending.popleft()
+        events.append(frame if frame is DROPPED else json.loads(frame.split("data: ", 1)[1]))
+    return events
+
+
+def test_routes_by_ride_and_area():
+    broadcaster = Broadcaster(queue_size=4)
+    by_id = broadcaster.subscribe(ride_ids=[1, 2])
+    near_campus = broadcaster.subscribe(cells=geo.covering_cells(*CAMPUS, 2.0))
+    campus_hash = geo.encode_geohash(*CAMPUS)
+    gulberg_hash = geo.encode_geohash(*GULBERG)
+
+    assert broadcaster.publish({"ride_id": 1}, 1, (gulberg_hash, campus_hash)) == 2
+    assert broadcaster.publish({"ride_id": 3}, 3, (gulberg_hash, gulberg_hash)) == 0
+    assert broadcaster.publish({"ride_id": 2}, 2, (None, None)) == 1
+    assert payloads(by_id) == [{"ride_id": 1}, {"ride_id": 2}]
+    assert payloads(near_campus) == [{"ride_id": 1}]
+
+    broadcaster.unsubscribe(by_id)
+    broadcaster.unsubscribe(near_campus)
+    assert broadcaster.publish({"ride_id": 1}, 1, (campus_hash,)) == 0
+    assert broadcaster.subscriber_count == 0
+    print("✅ events reach ride and area subscribers only")
+
+
+def test_slow_subscriber_is_dropped():
+    async def scenario():
+        broadcaster = Broadcaster(queue_size=2)
+        slow = broadcaster.subscribe(ride_ids=[1])
+        fast = broadcaster.subscribe(ride_ids=[1])
+        stream = broadcaster.stream(fast)
+        assert await stream.__anext__() == realtime.SUBSCRIBED
+        for seats in (3, 2, 1):
+            broadcaster.publish({"ride_id": 1, "available_seats": seats}, 1)
+            assert '"available_seats":%d' % seats in await stream.__anext__()
+        # The third event overflowed the slow queue: it gets only the drop notice
+        assert payloads(slow) == [DROPPED]
+        assert broadcaster.subscriber_count == 1
+        broadcaster.heartbeat()
+        assert await stream.__anext__() == realtime.HEARTBEAT
+        # A client disconnect closes the subscription, which ends the stream
+        fast.close()
+        assert [frame async for frame in stream] == []
+        assert broadcaster.subscriber_count == 0
+
+    asyncio.run(scenario())
+    print("✅ slow subscribers are dropped without blocking the others")
+
+
+def test_writes_publish_seat_changes(client, login, ride_payload):
+    headers = {role: login(f"rt.{role}@example.com", role) for role in ("driver", "rider")}
+
+    ride = client.post("/api/rides/", headers=headers["driver"], json={
+        **ride_payload, "origin": "Gulberg", "destination": "Campus", "origin_lat": GULBERG[0],
+        "origin_lng": GULBERG[1], "destination_lat": CAMPUS[0], "destination_lng": CAMPUS[1], "price": 150.0,
+    }).json()
+    by_id = realtime.broadcaster.subscribe(ride_ids=[ride["id"]])
+    near_campus = realtime.broadcaster.subscribe(cells=geo.covering_cells(*CAMPUS, 1.0))
+    try:
+        booking = client.post("/api/bookings/", headers=headers["rider"],
+                              json={"ride_id": ride["id"], "seats": 2}).json()
+        client.put(f"/api/bookings/{booking['id']}/reject", headers=headers["driver"])
+        client.put(f"/api/rides/{ride['id']}", headers=headers["driver"], json={"price": 120.0})
+
+        events = payloads(by_id)
+        assert [event["available_seats"] for event in events] == [1, 3, 3]
+        assert events[-1]["price"] == 120.0
+        assert payloads(near_campus) == events
+    finally:
+        realtime.broadcaster.unsubscribe(by_id)
+        realtime.broadcaster.unsubscribe(near_campus)
+    print("✅ booking, reject and ride updates publish the new seat counts")
+
+
+
+def test_new_rides_reach_area_subscribers(database, client, login, ride_payload):
+    driver = login("rt.new@example.com", "driver")
+    near_campus = realtime.broadcaster.subscribe(cells=geo.covering_cells(*CAMPUS, 1.0))
+    try:
+        ride = client.post("/api/rides/", headers=driver, json={
+            **ride_payload, "origin_lat": GULBERG[0], "origin_lng": GULBERG[1],
+            "destination_lat": CAMPUS[0], "destination_lng": CAMPUS[1],
+        }).json()
+        schedule = client.post("/api/rides/schedules/", headers=driver, json={
+            "origin": "Gulberg", "destination": "Campus", "origin_lat": GULBERG[0], "origin_lng": GULBERG[1],
+            "destination_lat": CAMPUS[0], "destination_lng": CAMPUS[1], "departure_time": "08:00:00",
+            "days": ["mon", "wed", "fri"], "available_seats": 3, "price": 150.0,
+        })
+        assert schedule.status_code == 200, schedule.text
+
+        events = payloads(near_campus)
+        assert events[0] == {**events[0], "ride_id": ride["id"], "status": "scheduled", "available_seats": 3}
+        # Then one event per materialized occurrence
+        with database.connect() as conn:
+            occurrences = conn.scalars(select(Ride.id).where(Ride.schedule_id == schedule.json()["id"])).all()
+        assert occurrences
+        assert sorted(event["ride_id"] for event in events[1:]) == sorted(occurrences)
+    finally:
+        realtime.broadcaster.unsubscribe(near_campus)
+    print("✅ created and materialized rides reach area subscribers")
+
+
+def test_deleting_a_schedule_publishes_cancellations(database, client, login):
+    driver = login("rt.schedule@example.com", "driver")
+    schedule = client.post("/api/rides/schedules/", headers=driver, json={
+        "origin": "Gulberg", "destination": "Campus", "departure_time": "08:00:00",
+        "days": ["mon", "wed", "fri"], "available_seats": 3, "price": 150.0,
+    }).json()
+    with database.connect() as conn:
+        ride_ids = conn.scalars(select(Ride.id).where(Ride.schedule_id == schedule["id"])).all()
+    assert ride_ids
+    by_id = realtime.broadcaster.subscribe(ride_ids=ride_ids)
+    try:
+        assert client.delete(f"/api/rides/schedules/{schedule['id']}", headers=driver).status_code == 204
+        events = payloads(by_id)
+        assert sorted(event["ride_id"] for event in events) == sorted(ride_ids)
+        assert {event["status"] for event in events} == {"cancelled"}
+    finally:
+        realtime.broadcaster.unsubscribe(by_id)
+    print("✅ deleting a schedule publishes its cancelled rides")
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__]))
@@ -0,0 +1,111 @@
+import os
+import asyncio
+import tempfile
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+
+from app import http_cache, replicas
+from app.database import Base
+from app.models.database_models import User
+from main import app
+
+# Only the replicas have this user, and each under its own name
+REPLICA_USER_ID = 999999
+
+
+def make_replicas(*names):
+    """SQLite files with the schema and one user each, standing in for replicas."""
+    directory = tempfile.mkdtemp()
+    urls = []
+    for name in names:
+        url = "sqlite:///" + os.path.join(directory, f"{name}.db")
+        replica_engine = create_engine(url)
+        Base.metadata.create_all(bind=replica_engine)
+        with replica_engine.begin() as connection:
+            connection.execute(User.__table__.insert(), {
+                "id": REPLICA_USER_ID, "name": name, "email": f"{name}@example.com", "phone": "000",
+                "role": "rider", "is_active": True, "created_at": datetime.now(),
+            })
+        replica_engine.dispose()
+        urls.append(url)
+    return urls
+
+
+def read_from(client, headers=None):
+    """Which database served the read: a replica's name, or "primary"."""
+    response = client.get(f"/api/users/{REPLICA_USER_ID}", headers=headers)
+    return response.json()["name"] if response.status_code == 200 else "primary"
+
+
+def test_reads_rotate_over_healthy_replicas(database):
+    client = TestClient(app, raise_server_exceptions=False)
+    # The last one can't be opened, so it's taken out on its first read
+    urls = make_replicas("replica-a", "replica-b") + ["sqlite:////nonexistent/replica-c.db"]
+    replica_set = asyncio.run(replicas.configure(urls))
+    try:
+        assert [read_from(client) for _ in range(2)] == ["replica-a", "replica-b"]
+        assert client.get(f"/api/users/{REPLICA_USER_ID}").status_code == 500
+        assert [read_from(client) for _ in range(4)] == ["replica-a", "replica-b", "replica-a", "replica-b"]
+
+        # With every replica down, reads fall back to the primary
+        for replica in replica_set.replicas:
+            replica_set.mark_down(replica)
+        assert read_from(client) == "primary"
+        # The health check brings back the ones that answer
+        asyncio.run(replica_set.check())
+        assert [replica.healthy for replica in replica_set.replicas] == [True, True, False]
+        assert {read_from(client) for _ in range(2)} == {"replica-a", "replica-b"}
+    finally:
+        asyncio.run(replicas.configure([]))
+    print("✅ reads rotate over the healthy replicas and fall back to the primary")
+
+
+def test_reads_stick_to_primary_after_own_write(client, login, ride_payload):
+    driver = login("replica.driver@example.com", "driver")
+    asyncio.run(replicas.configure(make_replicas("replica-a")))
+    try:
+        assert read_from(client, driver) == "replica-a"
+        response = client.post("/api/rides/", headers=driver, json=ride_payload)
+        assert response.status_code == 200, response.text
+        # Their own reads now see the primary; everyone else's still use the replica
+        assert read_from(client, driver) == "primary"
+        assert read_from(client) == "replica-a"
+        # Once the window passes they're back on the replica
+        replicas.recent_writers.clear()
+        assert read_from(client, driver) == "replica-a"
+    finally:
+        asyncio.run(replicas.configure([]))
+        replicas.recent_writers.clear()
+    print("✅ a user's reads stay on the primary right after their own write")
+
+
+
+def test_ride_cache_never_serves_a_lagging_replica_to_the_writer(client, login, ride_payload, monkeypatch):
+    driver = login("replica.cache@example.com", "driver")
+    # The replica has none of the primary's rides, as if it hadn't caught up yet
+    asyncio.run(replicas.configure(make_replicas("replica-a")))
+    search = "/api/rides/search?origin=Replica%20Lag"
+    try:
+        ride_id = client.post("/api/rides/", headers=driver, json={**ride_payload, "origin": "Replica Lag"}).json()["id"]
+        # The replica's answer right after the write is served but not cached...
+        assert client.get(f"/api/rides/{ride_id}").status_code == 404
+        assert ride_id not in [ride["id"] for ride in client.get(search).json()]
+        assert http_cache.ride_response_cache.get(search) is None
+        # ...and once the window has passed it is, but the writer still reads the primary
+        monkeypatch.setattr(http_cache, "_invalidated_at", float("-inf"))
+        client.get(search)
+        assert http_cache.ride_response_cache.get(search) is not None
+        own = client.get(search, headers=driver).json()
+        assert ride_id in [ride["id"] for ride in own]
+    finally:
+        asyncio.run(replicas.configure([]))
+        replicas.recent_writers.clear()
+        http_cache.invalidate_rides()
+    print("✅ a replica's stale rides are neither cached nor served to the user who wrote")
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__]))
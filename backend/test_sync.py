@@ -0,0 +1,105 @@
+import pytest
+from sqlalchemy import text
+
+from app.routes import sync as sync_routes
+
+
+def sync(client, headers, since, limit=100):
+    response = client.get(f"/api/sync?since={since}&limit={limit}", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_sync_returns_only_changes_since_cursor(client, login, ride_payload):
+    driver = login("sync.driver@example.com", "driver")
+    rider = login("sync.rider@example.com", "rider")
+    stranger = login("sync.stranger@example.com", "rider")
+
+    ride_id = client.post("/api/rides/", json=ride_payload, headers=driver).json()["id"]
+    other_id = client.post("/api/rides/", json={**ride_payload, "origin": "Gulberg"}, headers=driver).json()["id"]
+    booking_id = client.post("/api/bookings/", json={"ride_id": ride_id, "seats": 1}, headers=rider).json()["id"]
+
+    # A full copy: the booking's seat UPDATE changed the ride after it was created
+    full = sync(client, driver, 0)
+    assert [ride["id"] for ride in full["rides"]] == [other_id, ride_id]
+    assert full["rides"][1]["available_seats"] == 2
+    assert [booking["id"] for booking in full["bookings"]] == [booking_id]
+    assert not full["has_more"]
+    rider_cursor = sync(client, rider, 0)["cursor"]
+    assert sync(client, stranger, 0) == {"rides": [], "bookings": [], "cursor": 0, "has_more": False}
+
+    # Nothing changed: nothing comes back and the cursor stays put
+    assert sync(client, driver, full["cursor"]) == {
+        "rides": [], "bookings": [], "cursor": full["cursor"], "has_more": False
+    }
+
+    # A cancellation returns seats with a bulk UPDATE, which is stamped too
+    client.put(f"/api/bookings/{booking_id}", json={"status": "cancelled"}, headers=rider)
+    delta = sync(client, driver, full["cursor"])
+    assert [ride["id"] for ride in delta["rides"]] == [ride_id]
+    assert delta["rides"][0]["available_seats"] == 3
+    assert [booking["status"] for booking in delta["bookings"]] == ["cancelled"]
+    # The rider sees the same changes to the ride they booked, not the driver's other ride
+    rider_delta = sync(client, rider, rider_cursor)
+    assert [ride["id"] for ride in rider_delta["rides"]] == [ride_id]
+    assert [booking["id"] for booking in rider_delta["bookings"]] == [booking_id]
+    print("✅ sync returns only what changed since the cursor")
+
+
+def test_sync_pages_through_changes_in_order(client, login, ride_payload):
+    driver = login("sync.pages@example.com", "driver")
+    ride_ids = [client.post("/api/rides/", json=ride_payload, headers=driver).json()["id"] for _ in range(5)]
+
+    seen, cursor, pages = [], 0, 0
+    while True:
+        page = sync(client, driver, cursor, limit=2)
+        seen.extend(ride["id"] for ride in page["rides"])
+        cursor = page["cursor"]
+        pages += 1
+        if not page["has_more"]:
+            break
+    assert seen == ride_ids
+    assert pages == 3
+    print("✅ sync pages through changes oldest first")
+
+
+
+def test_sync_holds_back_changes_inside_the_visibility_window(client, login, ride_payload, monkeypatch):
+    driver = login("sync.window@example.com", "driver")
+    cursor = sync(client, driver, 0)["cursor"]
+
+    monkeypatch.setattr(sync_routes, "SYNC_VISIBILITY_SECONDS", 60)
+    ride_id = client.post("/api/rides/", json=ride_payload, headers=driver).json()["id"]
+    # Too recent: it doesn't come back, and the cursor doesn't move past it
+    assert sync(client, driver, cursor) == {"rides": [], "bookings": [], "cursor": cursor, "has_more": False}
+
+    monkeypatch.setattr(sync_routes, "SYNC_VISIBILITY_SECONDS", 0)
+    assert [ride["id"] for ride in sync(client, driver, cursor)["rides"]] == [ride_id]
+    print("✅ sync waits out the visibility window before returning a change")
+
+
+
+def test_sync_misses_a_change_committed_after_the_window(database, client, login, ride_payload):
+    # The window bounds how late a transaction may commit; one that commits later is skipped
+    driver = login("sync.late@example.com", "driver")
+    late_id = client.post("/api/rides/", json=ride_payload, headers=driver).json()["id"]
+    client.post("/api/rides/", json=ride_payload, headers=driver)
+    with database.connect() as connection:
+        taken = connection.scalar(text("SELECT change_seq FROM rides WHERE id = :id"), {"id": late_id})
+    cursor = sync(client, driver, 0)["cursor"]
+    assert taken < cursor
+
+    # A change that took its number before the cursor but only commits now, after the window
+    with database.begin() as connection:
+        connection.execute(text("UPDATE rides SET price = 99 WHERE id = :id"), {"id": late_id})
+        connection.execute(text("UPDATE rides SET change_seq = :seq WHERE id = :id"), {"seq": taken, "id": late_id})
+
+    assert sync(client, driver, cursor)["rides"] == []
+    # Only a full copy picks it up
+    rides = {ride["id"]: ride for ride in sync(client, driver, 0)["rides"]}
+    assert rides[late_id]["price"] == 99
+    print("✅ a change committed after the visibility window is missed by later syncs")
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__]))
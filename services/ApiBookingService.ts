@@ -13,6 +13,7 @@ export interface Booking {
   status: string;
   seats: number;
   created_at: string;
+  updated_at?: string;
   passenger: {
     id: number;
     name: string;
@@ -25,6 +26,13 @@ export interface Booking {
   ride: Ride;
 }
 
+export interface SyncResult {
+  rides: Ride[];
+  bookings: Booking[];
+  cursor: number;
+  has_more: boolean;
+}
+
 export interface CreateBookingData {
   ride_id: number;
   seats: number;
@@ -166,4 +174,27 @@ export class ApiBookingService {
       );
     }
   }
+
+  /**
+   * Rides and bookings of the current user changed since `since` (0 for a
+   * full copy). Keep the returned cursor for the next call; while
+   * `has_more` is set, call again right away.
+   */
+  static async sync(since: number = 0): Promise<SyncResult> {
+    try {
+      const response = await axios.get<SyncResult>(
+        `${API_URL}/sync`,
+        { ...this.getAuthHeaders(), params: { since } }
+      );
+      return response.data;
+    } catch (error: any) {
+      console.error(
+        "Sync error:",
+        error.response?.data || error.message
+      );
+      throw new Error(
+        error.response?.data?.detail || "Failed to sync bookings"
+      );
+    }
+  }
 }
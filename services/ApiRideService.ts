@@ -16,6 +16,9 @@ export interface Ride {
   description: string;
   status: string;
   created_at: string;
+  updated_at?: string;
+  // Simplified driver route, encoded polyline (precision 5)
+  route_polyline?: string | null;
   driver: {
     id: number;
     name: string;
@@ -24,6 +27,9 @@ export interface Ride {
     role: string;
     is_active: boolean;
     created_at: string;
+    // null until the driver has been rated
+    average_rating: number | null;
+    rating_count: number;
   };
 }
 
@@ -34,6 +40,8 @@ export interface CreateRideData {
   available_seats: number;
   price: number;
   description?: string;
+  // [lng, lat] pairs, e.g. the coordinates from MapService.getDirections
+  route?: [number, number][];
 }
 
 export interface SearchRideParams {
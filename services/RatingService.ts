@@ -1,89 +1,86 @@
+import axios from "axios"
 import type { Rating, CreateRatingData } from "@/types"
+import { ApiAuthService } from "./ApiAuthService"
 
-export class RatingService {
-  private static STORAGE_KEY = "unipool_ratings"
-
-  static async createRating(data: CreateRatingData): Promise<Rating> {
-    return new Promise((resolve) => {
-      setTimeout(() => {
-        const ratings = this.getAllRatings()
-
-        const rating: Rating = {
-          id: Date.now().toString(),
-          rideId: data.rideId,
-          raterId: data.raterId,
-          raterName: data.raterName,
-          ratedUserId: data.ratedUserId,
-          rating: data.rating,
-          review: data.review,
-          type: data.type,
-          createdAt: new Date().toISOString(),
-        }
-
-        ratings.push(rating)
-        localStorage.setItem(this.STORAGE_KEY, JSON.stringify(ratings))
+const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000/api"
 
-        // Update user's overall rating
-        this.updateUserRating(data.ratedUserId)
+interface ApiRating {
+  id: number
+  rater_id: number
+  rated_id: number
+  ride_id: number | null
+  rating: number
+  comment: string | null
+  rated_as: "driver" | "rider" | null
+  created_at: string
+  rater: { id: number; name: string }
+}
 
-        resolve(rating)
-      }, 100)
-    })
+export class RatingService {
+  private static getAuthHeaders() {
+    const token = ApiAuthService.getToken()
+    return {
+      headers: {
+        Authorization: `Bearer ${token}`,
+      },
+    }
   }
 
-  static async getUserRatings(userId: string): Promise<Rating[]> {
-    return new Promise((resolve) => {
-      setTimeout(() => {
-        const ratings = this.getAllRatings()
-        const userRatings = ratings.filter((rating) => rating.ratedUserId === userId)
-        userRatings.sort((a, b) => new Date(b.createdAt).getTime() - new Date(a.createdAt).getTime())
-        resolve(userRatings)
-      }, 100)
-    })
+  private static toRating(rating: ApiRating): Rating {
+    return {
+      id: String(rating.id),
+      rideId: rating.ride_id === null ? "" : String(rating.ride_id),
+      raterId: String(rating.rater_id),
+      raterName: rating.rater.name,
+      ratedUserId: String(rating.rated_id),
+      rating: rating.rating,
+      review: rating.comment ?? undefined,
+      type: rating.rated_as ?? "driver",
+      createdAt: rating.created_at,
+    }
   }
 
-  static async getRideRatings(rideId: string): Promise<Rating[]> {
-    return new Promise((resolve) => {
-      setTimeout(() => {
-        const ratings = this.getAllRatings()
-        const rideRatings = ratings.filter((rating) => rating.rideId === rideId)
-        resolve(rideRatings)
-      }, 100)
-    })
+  // The server works out whether the rated user drove; raterId and raterName come from the token
+  static async createRating(data: CreateRatingData): Promise<Rating> {
+    try {
+      const response = await axios.post<ApiRating>(
+        `${API_URL}/ratings/`,
+        {
+          rated_id: Number(data.ratedUserId),
+          ride_id: Number(data.rideId),
+          rating: data.rating,
+          comment: data.review,
+        },
+        this.getAuthHeaders()
+      )
+      return this.toRating(response.data)
+    } catch (error: any) {
+      console.error("Create rating error:", error.response?.data || error.message)
+      throw new Error(error.response?.data?.detail || "Failed to create rating")
+    }
   }
 
-  private static updateUserRating(userId: string): void {
-    const ratings = this.getAllRatings()
-    const userRatings = ratings.filter((r) => r.ratedUserId === userId)
-
-    if (userRatings.length >= 3) {
-      const averageRating = userRatings.reduce((sum, r) => sum + r.rating, 0) / userRatings.length
-
-      // Update user in localStorage
-      const users = JSON.parse(localStorage.getItem("unipool_users") || "[]")
-      const userIndex = users.findIndex((u: any) => u.id === userId)
-
-      if (userIndex !== -1) {
-        users[userIndex].rating = averageRating
-        users[userIndex].rideCount = userRatings.length
-        localStorage.setItem("unipool_users", JSON.stringify(users))
-
-        // Update current user if it's the same user
-        const currentUser = JSON.parse(localStorage.getItem("unipool_user") || "null")
-        if (currentUser && currentUser.id === userId) {
-          currentUser.rating = averageRating
-          currentUser.rideCount = userRatings.length
-          localStorage.setItem("unipool_user", JSON.stringify(currentUser))
-        }
-      }
+  // The user's average and count are on the user itself (average_rating, rating_count)
+  static async getUserRatings(userId: string): Promise<Rating[]> {
+    try {
+      const response = await axios.get<ApiRating[]>(`${API_URL}/ratings/user/${userId}`, {
+        params: { limit: 500 },
+      })
+      const ratings = response.data.map((rating) => this.toRating(rating))
+      ratings.sort((a, b) => new Date(b.createdAt).getTime() - new Date(a.createdAt).getTime())
+      return ratings
+    } catch (error: any) {
+      console.error("Get user ratings error:", error.response?.data || error.message)
+      return []
     }
   }
 
-  private static getAllRatings(): Rating[] {
+  static async getRideRatings(rideId: string): Promise<Rating[]> {
     try {
-      const ratingsData = localStorage.getItem(this.STORAGE_KEY)
-      return ratingsData ? JSON.parse(ratingsData) : []
-    } catch {
+      const response = await axios.get<ApiRating[]>(`${API_URL}/ratings/ride/${rideId}`)
+      return response.data.map((rating) => this.toRating(rating))
+    } catch (error: any) {
+      console.error("Get ride ratings error:", error.response?.data || error.message)
       return []
     }
   }
@@ -0,0 +1,70 @@
+// services/RealtimeUpdateService.ts
+
+const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000/api";
+
+export interface RideUpdate {
+  ride_id: number;
+  status: string;
+  available_seats: number;
+  departure_time: string | null;
+  price: number;
+}
+
+export interface RideSubscription {
+  rideIds?: number[];
+  area?: { lat: number; lng: number; radiusKm?: number };
+}
+
+export class RealtimeUpdateService {
+  /**
+   * Follow seat and status changes of rides over server-sent events.
+   * `onResync` runs when the server dropped the stream for falling behind
+   * (and on every reconnect), so the caller can refetch what it shows.
+   * Returns a function that closes the stream.
+   */
+  static subscribeToRides(
+    subscription: RideSubscription,
+    onUpdate: (update: RideUpdate) => void,
+    onResync?: () => void
+  ): () => void {
+    const params = new URLSearchParams();
+    subscription.rideIds?.forEach((id) => params.append("ride_id", String(id)));
+    if (subscription.area) {
+      params.set("lat", String(subscription.area.lat));
+      params.set("lng", String(subscription.area.lng));
+      if (subscription.area.radiusKm) {
+        params.set("radius_km", String(subscription.area.radiusKm));
+      }
+    }
+
+    let source: EventSource | null = null;
+    let closed = false;
+    let connectedOnce = false;
+
+    const connect = () => {
+      source = new EventSource(`${API_URL}/realtime/rides?${params}`);
+      source.onopen = () => {
+        if (connectedOnce) {
+          onResync?.();
+        }
+        connectedOnce = true;
+      };
+      source.addEventListener("ride", (event) => {
+        onUpdate(JSON.parse((event as MessageEvent).data));
+      });
+      source.addEventListener("dropped", () => {
+        // We fell behind: reconnect, and onopen lets the caller refetch
+        source?.close();
+        if (!closed) {
+          setTimeout(connect, 1000);
+        }
+      });
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      source?.close();
+    };
+  }
+}